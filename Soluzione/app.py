@@ -12,6 +12,7 @@ plan is generated.
 from __future__ import annotations
 
 import os
+import time
 from datetime import date, timedelta
 from io import TextIOWrapper, BytesIO
 
@@ -25,8 +26,10 @@ from flask import (
     request,
     send_from_directory,
     jsonify,
+    Response,
 )
 from flask_cors import CORS
+from markupsafe import Markup, escape
 from flask_login import (
     LoginManager,
     login_user,
@@ -37,9 +40,29 @@ from flask_login import (
 from werkzeug.security import generate_password_hash, check_password_hash
 from pypdf import PdfReader
 
+from coalescing import FLIGHTS, find_key, new_key, request_key, store_plan
 from config import Config
+from db_routing import init_app as init_db_routing, read_only
+from exports import cached, export_version, meals_ics, shopping_csv, shopping_pdf
+from history import InvalidCursor, plan_history_page
+from household import MAX_MEMBERS, PROFILES, Household, household_of, rescale_plans
+from instrumentation import init_app as init_instrumentation, span
+from metrics import PLAN_REQUESTS_SHARED, init_app as init_metrics, observe_pdf_extraction
 from models import db, User, Diet, Plan, Preference
-from utils import generate_weekly_plan, send_email, format_weekly_plan
+from nutrition import meal_nutrition
+from profiling import init_app as init_profiling
+from query_stats import init_app as init_query_stats
+from sqlite_tuning import init_app as init_sqlite_tuning
+from plan_parser import parse_plan_content
+from preparation import GENERIC_STEPS, lookup
+from principal import init_app as init_principal, load_principal
+from utils import (
+    generate_weekly_plan,
+    send_email,
+    format_weekly_plan,
+    next_plan_start_date,
+)
+from variety import history_index
 import json
 
 load_dotenv()
@@ -61,12 +84,14 @@ def extract_text_from_file(file) -> str:
         try:
             file_bytes = file.read()
             pdf_file = BytesIO(file_bytes)
+            started = time.perf_counter()
             reader = PdfReader(pdf_file)
             
             text_content = []
             for page in reader.pages:
                 text_content.append(page.extract_text())
             
+            observe_pdf_extraction(len(text_content), time.perf_counter() - started)
             return "\n".join(text_content)
         except Exception as e:
             # Fallback: try to read as text if PDF parsing fails
@@ -77,122 +102,42 @@ def extract_text_from_file(file) -> str:
         return file.read().decode(errors="ignore")
 
 
-def parse_plan_content(content: str) -> dict:
-    """Parse plan content to extract structured meal data."""
-    try:
-        # Try to extract JSON from the original generation if available
-        # This is a simplified parser - in a real app you'd want more robust parsing
-        structured_plan = {}
-        
-        days_map = {
-            "LUNEDÌ": "monday",
-            "MARTEDÌ": "tuesday", 
-            "MERCOLEDÌ": "wednesday",
-            "GIOVEDÌ": "thursday",
-            "VENERDÌ": "friday",
-            "SABATO": "saturday",
-            "DOMENICA": "sunday"
-        }
-        
-        lines = content.split('\n')
-        current_day = None
-        current_meal = None
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if it's a day header
-            for day_it, day_en in days_map.items():
-                if day_it in line.upper():
-                    current_day = day_en
-                    structured_plan[current_day] = {}
-                    break
-            
-            # Check if it's a meal
-            if current_day and ('**Pranzo:**' in line or '🥗 **Pranzo:**' in line):
-                title = line.split('**Pranzo:**')[1].strip() if '**Pranzo:**' in line else line.split('🥗 **Pranzo:**')[1].strip()
-                structured_plan[current_day]['lunch'] = {'title': title, 'description': '', 'focus': '', 'servings': 2}
-                current_meal = 'lunch'
-            elif current_day and ('**Cena:**' in line or '🍽️ **Cena:**' in line):
-                title = line.split('**Cena:**')[1].strip() if '**Cena:**' in line else line.split('🍽️ **Cena:**')[1].strip()
-                structured_plan[current_day]['dinner'] = {'title': title, 'description': '', 'focus': '', 'servings': 3}
-                current_meal = 'dinner'
-            elif current_day and current_meal and line.startswith('📝'):
-                structured_plan[current_day][current_meal]['description'] = line.replace('📝', '').strip()
-            elif current_day and current_meal and line.startswith('🎯'):
-                focus_info = line.replace('🎯', '').strip()
-                if '•' in focus_info:
-                    parts = focus_info.split('•')
-                    structured_plan[current_day][current_meal]['focus'] = parts[0].strip()
-                    if len(parts) > 1:
-                        servings_text = parts[1].strip()
-                        if 'porzioni' in servings_text:
-                            try:
-                                servings = int(servings_text.split()[0])
-                                structured_plan[current_day][current_meal]['servings'] = servings
-                            except:
-                                pass
-                else:
-                    structured_plan[current_day][current_meal]['focus'] = focus_info
-        
-        return structured_plan
-    except Exception as e:
-        print(f"Error parsing plan content: {e}")
-        return {}
+def load_structured_plan(plan: Plan) -> dict:
+    """Return the ``weekly_plan`` of a plan, parsing its text only for legacy rows.
 
+    Plans written before structured storage have ``json_content == "{}"``;
+    ``backfill_plan_json.py`` converts them so this fallback is not hit.
+    """
+    if plan.json_content:
+        try:
+            data = json.loads(plan.json_content)
+        except json.JSONDecodeError:
+            data = {}
+        if "weekly_plan" in data:
+            return data["weekly_plan"] or {}
+    return parse_plan_content(plan.content)
 
-def generate_preparation_instructions(title: str, description: str) -> str:
-    """Generate basic preparation instructions for a meal."""
-    # This is a simple implementation - in a real app you might use AI or a database
-    instructions = []
-    
-    if "salmone" in title.lower():
-        instructions.extend([
-            "1. Preriscalda il forno a 180°C",
-            "2. Condisci il salmone con olio, sale e limone", 
-            "3. Cuoci per 15-20 minuti",
-            "4. Prepara le verdure di contorno"
-        ])
-    elif "pasta" in title.lower():
-        instructions.extend([
-            "1. Porta a ebollizione abbondante acqua salata",
-            "2. Cuoci la pasta secondo i tempi di cottura",
-            "3. Prepara il condimento in padella",
-            "4. Manteca la pasta con il condimento"
-        ])
-    elif "pollo" in title.lower():
-        instructions.extend([
-            "1. Taglia il pollo a pezzi regolari",
-            "2. Marinalo con erbe e spezie per 30 minuti",
-            "3. Cuoci in padella o al forno",
-            "4. Controlla la cottura interna"
-        ])
-    elif "insalata" in title.lower():
-        instructions.extend([
-            "1. Lava e asciuga bene le verdure",
-            "2. Taglia gli ingredienti a pezzi uniformi",
-            "3. Prepara il condimento a parte",
-            "4. Condisci solo prima di servire"
-        ])
-    else:
-        # Generic instructions
-        instructions.extend([
-            "1. Prepara tutti gli ingredienti necessari",
-            "2. Segui la ricetta tradizionale per questo piatto",
-            "3. Cuoci rispettando i tempi indicati",
-            "4. Servi caldo e gustoso"
-        ])
-    
-    return "\n".join(instructions)
 
+def create_app(config: dict | None = None) -> Flask:
+    """Factory to create and configure the Flask application.
 
-def create_app() -> Flask:
-    """Factory to create and configure the Flask application."""
+    Args:
+        config: Optional mapping of settings applied on top of ``Config``,
+            mainly used by tests and offline jobs to point at another database.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)
     db.init_app(app)
+    init_db_routing(app)
+    init_sqlite_tuning(app)
+    # Profiling first, so the other request hooks run inside the profile.
+    init_profiling(app)
+    init_instrumentation(app)
+    init_metrics(app)
+    init_query_stats(app)
+    init_principal(app)
     
     # Enable CORS for frontend deployment
     CORS(app, origins=["https://rkomi98.github.io", "http://localhost:3000", "http://localhost:5000", "https://fame-jre3.onrender.com"])
@@ -200,23 +145,35 @@ def create_app() -> Flask:
     # Add custom template filter for newlines to br tags
     @app.template_filter('nl2br')
     def nl2br(text):
-        """Convert newlines to HTML br tags."""
+        """Escape text and convert newlines to HTML br tags."""
         if not text:
             return text
-        return text.replace('\n', '<br>\n')
+        return escape(text).replace('\n', Markup('<br>\n'))
+
+    # Each rendered plan form gets its own key, so a double submit of the
+    # same form generates once (see coalescing.py).
+    app.jinja_env.globals["new_idempotency_key"] = new_key
 
     # Setup Flask-Login
     login_manager = LoginManager(app)
     login_manager.login_view = "login"
 
     @login_manager.user_loader
-    def load_user(user_id: str) -> User | None:
-        return User.query.get(int(user_id))
+    def load_user(user_id: str):
+        # A cached snapshot of a few columns; ``current_user.load()`` gives
+        # the full row to the views that need it.
+        return load_principal(int(user_id))
+
+    # Create database tables on the first request if they don't exist. This
+    # used to run on every request, costing a round of schema queries each.
+    tables_ready = False
 
-    # Create database tables at startup if they don't exist
     @app.before_request
     def create_tables() -> None:
-        db.create_all()
+        nonlocal tables_ready
+        if not tables_ready:
+            db.create_all()
+            tables_ready = True
 
     # Home page: shows summary or login/register prompts
     @app.route("/")
@@ -308,13 +265,16 @@ def create_app() -> Flask:
             else:
                 try:
                     # Extract text from file (supports PDF and text files)
-                    text = extract_text_from_file(file)
+                    with span("upload_extract", filename=file.filename) as info:
+                        text = extract_text_from_file(file)
+                        info["chars"] = len(text)
                     if not text.strip():
                         flash("The uploaded file appears to be empty or could not be read.")
                     else:
                         diet = Diet(user_id=current_user.id, content=text)
                         db.session.add(diet)
-                        db.session.commit()
+                        with span("db_write", table="diet"):
+                            db.session.commit()
                         flash(f"Diet uploaded successfully from {file.filename}!")
                         return redirect(url_for("view_diet"))
                 except Exception as e:
@@ -323,6 +283,7 @@ def create_app() -> Flask:
 
     # View diet
     @app.route("/diet")
+    @read_only
     @login_required
     def view_diet() -> str:
         diet = (
@@ -345,18 +306,45 @@ def create_app() -> Flask:
                 pref = Preference(user_id=current_user.id, disliked=disliked)
                 db.session.add(pref)
 
-            current_user.trains = 'trains' in request.form
-            if current_user.trains:
-                current_user.training_frequency = request.form.get('training_frequency')
+            user = current_user.load()
+            user.trains = 'trains' in request.form
+            if user.trains:
+                user.training_frequency = request.form.get('training_frequency')
                 training_days = request.form.getlist('training_days')
-                current_user.training_days = ','.join(training_days)
+                user.training_days = ','.join(training_days)
             else:
-                current_user.training_frequency = None
-                current_user.training_days = None
-            
+                user.training_frequency = None
+                user.training_days = None
+
+            # Forms without the household fields leave it as it is.
+            if any(f"household_{key}" in request.form for key in PROFILES):
+                counts = {}
+                for key in PROFILES:
+                    try:
+                        counts[key] = min(max(int(request.form.get(f"household_{key}") or 0), 0), MAX_MEMBERS)
+                    except ValueError:
+                        counts[key] = 0
+                household = Household.from_counts(counts)
+                if household != household_of(user):
+                    user.household_size = household.people if household else None
+                    user.household_members = household.to_json() if household else None
+                    # Refit this week's and upcoming plans (or restore them
+                    # when the household is cleared): no new generation needed.
+                    today = date.today()
+                    rescale_plans(user.id, household, today - timedelta(days=today.weekday()))
+
             db.session.commit()
             flash("Preferences updated.")
-        return render_template("preferences.html", preference=pref, user=current_user)
+            return render_template(
+                "preferences.html", preference=pref, user=user, household=household_of(user), profiles=PROFILES
+            )
+        return render_template(
+            "preferences.html",
+            preference=pref,
+            user=current_user,
+            household=household_of(current_user),
+            profiles=PROFILES,
+        )
 
     # Generate plan
     @app.route("/generate_plan", methods=["POST"])
@@ -371,58 +359,65 @@ def create_app() -> Flask:
         if not diet:
             flash("Please upload your diet before generating a plan.")
             return redirect(url_for("index"))
+        # A retry of a request that already produced a plan gets it back
+        key = request_key(request)
+        if key is not None and find_key(current_user.id, key) is not None:
+            PLAN_REQUESTS_SHARED.labels("idempotency_key").inc()
+            flash("This plan was already generated.")
+            return redirect(url_for("view_plan"))
         # Determine start date: next Monday
-        today = date.today()
-        days_ahead = -today.weekday() + 7
-        if days_ahead <= 0:
-            days_ahead += 7
-        start_date = today + timedelta(days=days_ahead)
-        # Check if a plan already exists for that week
-        existing = Plan.query.filter_by(
-            user_id=current_user.id, start_date=start_date
-        ).first()
-        if existing:
-            # Overwrite existing plan
-            db.session.delete(existing)
-            db.session.commit()
-        # Preferences
-        pref_record = Preference.query.filter_by(user_id=current_user.id).first()
-        preferences_list = []
-        if pref_record and pref_record.disliked:
-            preferences_list = [p.strip() for p in pref_record.disliked.split(",") if p.strip()]
-        # Generate plan via util
-        plan_text, shopping_list, raw_json = generate_weekly_plan(
-            diet.content,
-            preferences_list,
-            current_user.region,
-            start_date,
-            current_user.trains,
-            current_user.training_frequency,
-            current_user.training_days,
-            current_user.api_provider,
-            current_user.api_key,
-        )
-        # Save plan
-        plan = Plan(
-            user_id=current_user.id,
-            start_date=start_date,
-            content=plan_text,
-            json_content=raw_json,
-            shopping_list=shopping_list,
-        )
-        db.session.add(plan)
-        db.session.commit()
-        # Send shopping list via email to user's own email
-        send_email(
-            current_user.email,
-            subject=f"Your Shopping List for week starting {start_date.isoformat()}",
-            body=f"Hello {current_user.username},\n\nHere is your meal plan:\n\n{plan_text}\n\nShopping List:\n{shopping_list}\n\nEnjoy your meals!",
-        )
+        start_date = next_plan_start_date()
+
+        def generate() -> None:
+            # Preferences
+            pref_record = Preference.query.filter_by(user_id=current_user.id).first()
+            preferences_list = []
+            if pref_record and pref_record.disliked:
+                preferences_list = [p.strip() for p in pref_record.disliked.split(",") if p.strip()]
+            # Recent meals, so the new plan does not repeat them
+            history = history_index(current_user.id, start_date)
+            # Generate plan via util
+            result = generate_weekly_plan(
+                diet.content,
+                preferences_list,
+                current_user.region,
+                start_date,
+                current_user.trains,
+                current_user.training_frequency,
+                current_user.training_days,
+                current_user.api_provider,
+                current_user.load().api_key,
+                app.config["RECIPE_CATALOG"],
+                history,
+                household_of(current_user),
+            )
+            email, username = current_user.email, current_user.username
+            # Replace any plan for that week and save the new one in a single
+            # transaction, opened only once the provider has answered.
+            with span("db_write", table="plan"):
+                plan = store_plan(current_user.id, start_date, result, key)
+            if plan is None:
+                return
+            # Send shopping list via email to user's own email
+            plan_text, shopping_list, _ = result
+            send_email(
+                email,
+                subject=f"Your Shopping List for week starting {start_date.isoformat()}",
+                body=f"Hello {username},\n\nHere is your meal plan:\n\n{plan_text}\n\nShopping List:\n{shopping_list}\n\nEnjoy your meals!",
+            )
+
+        # Concurrent requests for the same week wait for one generation
+        _, shared = FLIGHTS.run((current_user.id, start_date), generate)
+        if shared:
+            PLAN_REQUESTS_SHARED.labels("in_flight").inc()
+            flash("Weekly plan generated by your previous request.")
+            return redirect(url_for("view_plan"))
         flash("Weekly plan generated and shopping list sent to your email!")
         return redirect(url_for("view_plan"))
 
     # View plan
     @app.route("/plan")
+    @read_only
     @login_required
     def view_plan() -> str:
         plan = (
@@ -432,19 +427,119 @@ def create_app() -> Flask:
         )
         
         # Parse plan content to extract structured data
-        structured_plan = None
-        if plan and plan.json_content:
-            try:
-                structured_plan = json.loads(plan.json_content).get("weekly_plan")
-            except json.JSONDecodeError:
-                structured_plan = parse_plan_content(plan.content)
-        elif plan and plan.content:
-            structured_plan = parse_plan_content(plan.content)
+        structured_plan = load_structured_plan(plan) if plan else None
         
-        return render_template("plan.html", plan=plan, structured_plan=structured_plan, timedelta=timedelta)
+        with span("render", template="plan.html"):
+            return render_template("plan.html", plan=plan, structured_plan=structured_plan, timedelta=timedelta)
     
+    # Plan history, newest first, one keyset-paginated page at a time
+    def history_page_size() -> int:
+        default = app.config["PLAN_HISTORY_PAGE_SIZE"]
+        return max(1, min(request.args.get("limit", default, type=int), 100))
+
+    @app.route("/plans/history")
+    @read_only
+    @login_required
+    def plan_history() -> str:
+        try:
+            plans, next_cursor = plan_history_page(
+                current_user.id, history_page_size(), request.args.get("cursor")
+            )
+        except InvalidCursor:
+            return redirect(url_for("plan_history"))
+        return render_template("plan_history.html", plans=plans, next_cursor=next_cursor)
+
+    @app.route("/api/plans")
+    @read_only
+    @login_required
+    def api_plan_history():
+        try:
+            plans, next_cursor = plan_history_page(
+                current_user.id, history_page_size(), request.args.get("cursor")
+            )
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+        return jsonify(
+            {
+                "plans": [
+                    {
+                        "id": plan.id,
+                        "start_date": plan.start_date.isoformat(),
+                        "created_at": plan.created_at.isoformat(),
+                        "url": url_for("view_past_plan", plan_id=plan.id),
+                    }
+                    for plan in plans
+                ],
+                "next_cursor": next_cursor,
+            }
+        )
+
+    @app.route("/plans/<int:plan_id>")
+    @read_only
+    @login_required
+    def view_past_plan(plan_id: int) -> str:
+        plan = Plan.query.filter_by(id=plan_id, user_id=current_user.id).first()
+        if not plan:
+            flash("Plan not found.")
+            return redirect(url_for("plan_history"))
+        return render_template("plan_detail.html", plan=plan)
+
+    # Downloads of a plan, streamed and cached per plan version (exports.py)
+    def _export(plan: Plan, kind: str, data, build, mimetype: str, filename: str) -> Response:
+        version = export_version(kind, data, plan.id, plan.start_date.isoformat())
+        response = Response(cached(kind, version, build), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response.set_etag(version)
+        return response.make_conditional(request)
+
+    @app.route("/plans/<int:plan_id>/shopping_list.<fmt>")
+    @read_only
+    @login_required
+    def export_shopping_list(plan_id: int, fmt: str):
+        plan = Plan.query.filter_by(id=plan_id, user_id=current_user.id).first()
+        if not plan:
+            flash("Plan not found.")
+            return redirect(url_for("plan_history"))
+        try:
+            shopping_list = json.loads(plan.json_content or "{}").get("shopping_list")
+        except json.JSONDecodeError:
+            shopping_list = None
+        if fmt not in ("csv", "pdf") or not isinstance(shopping_list, dict):
+            flash("Export not available for this plan.")
+            return redirect(url_for("view_past_plan", plan_id=plan_id))
+        filename = f"lista-spesa-{plan.start_date.isoformat()}.{fmt}"
+        if fmt == "csv":
+            return _export(
+                plan, "csv", shopping_list, lambda: shopping_csv(shopping_list), "text/csv", filename
+            )
+        title = f"Lista della spesa - settimana dal {plan.start_date.strftime('%d/%m/%Y')}"
+        return _export(
+            plan, "pdf", shopping_list, lambda: shopping_pdf(title, shopping_list), "application/pdf", filename
+        )
+
+    @app.route("/plans/<int:plan_id>/meals.ics")
+    @read_only
+    @login_required
+    def export_meals_calendar(plan_id: int):
+        plan = Plan.query.filter_by(id=plan_id, user_id=current_user.id).first()
+        if not plan:
+            flash("Plan not found.")
+            return redirect(url_for("plan_history"))
+        weekly_plan = load_structured_plan(plan)
+        # The body is produced after the view returns: no ORM access there.
+        start_date, created_at = plan.start_date, plan.created_at
+        return _export(
+            plan,
+            "ics",
+            weekly_plan,
+            lambda: meals_ics(plan_id, weekly_plan, start_date, created_at),
+            "text/calendar",
+            f"piano-{plan.start_date.isoformat()}.ics",
+        )
+
     # API endpoint for meal details
     @app.route("/api/meal_details/<day>/<meal_type>")
+    @read_only
     @login_required
     def get_meal_details(day: str, meal_type: str) -> dict:
         plan = (
@@ -456,15 +551,7 @@ def create_app() -> Flask:
         if not plan:
             return {"error": "No plan found"}, 404
             
-        structured_plan = {}
-        if plan.json_content:
-            try:
-                structured_plan = json.loads(plan.json_content).get("weekly_plan", {})
-            except json.JSONDecodeError:
-                pass # Fallback to parsing content below
-
-        if not structured_plan:
-             structured_plan = parse_plan_content(plan.content)
+        structured_plan = load_structured_plan(plan)
 
         if not structured_plan or day not in structured_plan:
             return {"error": "Day not found"}, 404
@@ -474,8 +561,14 @@ def create_app() -> Flask:
             
         meal = structured_plan[day][meal_type]
         
-        # Add preparation instructions (dummy for now, could be enhanced)
-        meal["preparation"] = generate_preparation_instructions(meal.get("title", ""), meal.get("description", ""))
+        # Steps are added when the plan is generated (see attach_preparation);
+        # older plans get the catalog recipe's, if any, without a write.
+        if not meal.get("preparation") and app.config["RECIPE_CATALOG"] != "off":
+            meal["preparation"] = lookup(meal)
+        meal["preparation"] = meal.get("preparation") or GENERIC_STEPS
+        # Plans generated before nutrition was computed get it on the fly.
+        if "nutrition" not in meal:
+            meal["nutrition"] = meal_nutrition(meal)
         
         return meal
 
@@ -501,7 +594,7 @@ def create_app() -> Flask:
                 plan_data["weekly_plan"] = weekly_plan
                 
                 # Update json_content and regenerate text content
-                plan.json_content = json.dumps(plan_data, ensure_ascii=False, indent=2)
+                plan.json_content = json.dumps(plan_data, ensure_ascii=False)
                 plan.content = format_weekly_plan(weekly_plan)
                 
                 # We will tackle shopping list regeneration later.
@@ -538,7 +631,7 @@ def create_app() -> Flask:
             return redirect(url_for("view_plan"))
         
         # Add email to favorites
-        current_user.add_favorite_email(email_address)
+        current_user.load().add_favorite_email(email_address)
         db.session.commit()
         
         # Send email
@@ -553,9 +646,10 @@ def create_app() -> Flask:
 
     # API endpoint to get favorite emails
     @app.route("/api/favorite_emails")
+    @read_only
     @login_required
     def get_favorite_emails():
-        return jsonify({"emails": current_user.get_favorite_emails()})
+        return jsonify({"emails": current_user.load().get_favorite_emails()})
 
     return app
 
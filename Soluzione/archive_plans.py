@@ -0,0 +1,159 @@
+"""
+Retention job moving old plans to the compressed archive table.
+
+``generate_plan`` only replaces the plan of the same week, so every user's
+history grows by one plan a week forever. This job applies the retention
+policy of the deployment:
+
+* plans created more than ``PLAN_RETENTION_DAYS`` ago are moved to
+  ``archived_plan`` (one compressed JSON payload per plan), except the
+  ``PLAN_RETENTION_KEEP_LATEST`` most recent plans of each user, and their
+  delivery records are deleted;
+* archived plans created more than ``PLAN_ARCHIVE_RETENTION_DAYS`` ago are
+  deleted for good.
+
+A setting of 0 skips the step. Plans are moved in batches, one transaction
+per batch, so an interrupted run loses nothing and the next run picks up
+the remaining plans.
+
+Usage:
+    python archive_plans.py [--batch-size 500] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, ArchivedPlan, EmailDelivery, Plan
+
+
+@dataclass
+class ArchiveReport:
+    """Statistics of an archival run."""
+
+    archived: int = 0
+    purged: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+
+def _expired_plans(cutoff: datetime, keep_latest: int):
+    ranked = select(
+        Plan.id,
+        Plan.created_at,
+        func.row_number()
+        .over(partition_by=Plan.user_id, order_by=(Plan.created_at.desc(), Plan.id.desc()))
+        .label("rank"),
+    ).subquery()
+    return (
+        select(ranked.c.id)
+        .where(ranked.c.rank > keep_latest, ranked.c.created_at < cutoff)
+        .order_by(ranked.c.id)
+    )
+
+
+def _archive_row(plan: Plan) -> dict:
+    return {
+        "id": plan.id,
+        "user_id": plan.user_id,
+        "start_date": plan.start_date,
+        "created_at": plan.created_at,
+        "payload": json.dumps(
+            {
+                "content": plan._content,
+                "json_content": plan.json_content,
+                "shopping_list": plan._shopping_list,
+            },
+            ensure_ascii=False,
+        ),
+    }
+
+
+def count_expired(retention_days: int, keep_latest: int, now: datetime | None = None) -> int:
+    """Return how many plans the retention policy would archive."""
+    if retention_days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    expired = _expired_plans(cutoff, keep_latest).subquery()
+    return db.session.execute(select(func.count()).select_from(expired)).scalar()
+
+
+def run_archive(
+    retention_days: int,
+    keep_latest: int,
+    archive_retention_days: int = 0,
+    batch_size: int = 500,
+    now: datetime | None = None,
+) -> ArchiveReport:
+    """Apply the retention policy and return the run statistics.
+
+    Must be called inside an application context.
+    """
+    now = now or datetime.utcnow()
+    report = ArchiveReport()
+    started = time.perf_counter()
+    if retention_days > 0:
+        query = _expired_plans(now - timedelta(days=retention_days), keep_latest)
+        while True:
+            ids = db.session.scalars(query.limit(batch_size)).all()
+            if not ids:
+                break
+            plans = db.session.scalars(select(Plan).where(Plan.id.in_(ids))).all()
+            db.session.execute(insert(ArchivedPlan), [_archive_row(plan) for plan in plans])
+            db.session.execute(delete(EmailDelivery).where(EmailDelivery.plan_id.in_(ids)))
+            db.session.execute(delete(Plan).where(Plan.id.in_(ids)))
+            db.session.commit()
+            db.session.expunge_all()
+            report.archived += len(ids)
+            report.batches += 1
+    if archive_retention_days > 0:
+        result = db.session.execute(
+            delete(ArchivedPlan).where(
+                ArchivedPlan.created_at < now - timedelta(days=archive_retention_days)
+            )
+        )
+        db.session.commit()
+        report.purged = result.rowcount
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Archive plans past the retention period.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only count the plans that would be archived"
+    )
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    app = create_app()
+    config = app.config
+    with app.app_context():
+        if args.dry_run:
+            count = count_expired(
+                config["PLAN_RETENTION_DAYS"], config["PLAN_RETENTION_KEEP_LATEST"]
+            )
+            print(f"🔎 Piani da archiviare: {count}")
+            return
+        report = run_archive(
+            config["PLAN_RETENTION_DAYS"],
+            config["PLAN_RETENTION_KEEP_LATEST"],
+            config["PLAN_ARCHIVE_RETENTION_DAYS"],
+            args.batch_size,
+        )
+    print(
+        f"🗃️ Piani archiviati: {report.archived} • archiviati eliminati: {report.purged} • "
+        f"batch: {report.batches} • {report.elapsed:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+One-off backfill converting legacy text-only plans to structured JSON.
+
+Plans saved when the AI response was not valid JSON have
+``json_content == "{}"`` and used to be re-parsed from their text on every
+view. This job parses each of them once with ``parse_plan_content`` and
+stores the result as ``{"weekly_plan": ...}``, after which the views read
+the structured data directly.
+
+Rows are processed in primary-key order and in batches, one transaction per
+batch. On databases with server-side cursors (PostgreSQL) the legacy rows
+are streamed through a dedicated read connection; elsewhere each batch is
+fetched with a keyset query. The last converted id is checkpointed after
+every batch so the job can be interrupted and restarted.
+
+Usage:
+    python backfill_plan_json.py [--batch-size 500] [--checkpoint backfill.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from typing import Iterator, Sequence
+
+from sqlalchemy import func, or_, select, update
+
+from checkpoint import Checkpoint
+from models import db, Plan
+from plan_parser import parse_plan_content
+
+CHECKPOINT_KEY = "backfill-plan-json"
+
+
+@dataclass
+class BackfillReport:
+    """Statistics of a backfill run."""
+
+    scanned: int = 0
+    converted: int = 0
+    empty: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed else 0.0
+
+
+def _legacy_plans(after_id: int):
+    return (
+        select(Plan.id, Plan.content)
+        .where(
+            Plan.id > after_id,
+            # Matches "" and "{}" whether the row predates the binary
+            # storage (text) or not (bytes), which compare unequal in SQLite.
+            or_(Plan.json_content.is_(None), func.length(Plan.json_content) <= 2),
+        )
+        .order_by(Plan.id)
+    )
+
+
+def iter_legacy_batches(batch_size: int, after_id: int = 0) -> Iterator[Sequence]:
+    """Yield batches of ``(id, content)`` rows of plans without structured JSON."""
+    if db.engine.dialect.supports_server_side_cursors:
+        # Stream over a separate connection so that committing the updates
+        # does not close the server-side cursor.
+        with db.engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, yield_per=batch_size
+            ).execute(_legacy_plans(after_id))
+            yield from result.partitions()
+        return
+    while True:
+        rows = db.session.execute(_legacy_plans(after_id).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
+
+
+def run_backfill(batch_size: int = 500, checkpoint_path: str | None = None) -> BackfillReport:
+    """Convert every legacy plan and return the run statistics.
+
+    Must be called inside an application context.
+    """
+    checkpoint = Checkpoint(checkpoint_path, key=CHECKPOINT_KEY)
+    report = BackfillReport()
+    started = time.perf_counter()
+    for rows in iter_legacy_batches(batch_size, checkpoint.state.get("last_id", 0)):
+        updates = []
+        for plan_id, content in rows:
+            weekly_plan = parse_plan_content(content)
+            if weekly_plan:
+                report.converted += 1
+            else:
+                report.empty += 1
+            updates.append(
+                {
+                    "id": plan_id,
+                    "json_content": json.dumps(
+                        {"weekly_plan": weekly_plan}, ensure_ascii=False
+                    ),
+                }
+            )
+        db.session.execute(update(Plan), updates)
+        db.session.commit()
+        report.scanned += len(rows)
+        report.batches += 1
+        checkpoint.mark_done((), last_id=rows[-1].id)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Backfill structured JSON for legacy plans.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--checkpoint", default="backfill_plan_json.checkpoint.json")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        report = run_backfill(args.batch_size, args.checkpoint)
+    print(
+        f"📊 Piani analizzati: {report.scanned} • convertiti: {report.converted} • "
+        f"senza pasti riconosciuti: {report.empty} • batch: {report.batches} • "
+        f"{report.elapsed:.2f}s ({report.rate:.0f} piani/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
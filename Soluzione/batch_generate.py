@@ -0,0 +1,284 @@
+"""
+Offline batch generation of weekly plans.
+
+The ``generate_plan`` route builds one plan per web request. This script is
+meant to run from cron (e.g. on Sunday night) and pre-generates next week's
+plan for every user that has uploaded a diet. Prompts are built with the
+same logic as ``generate_weekly_plan``; provider calls are executed in a
+bounded thread pool, each user with their own provider and API key. Plans
+are written in bulk, one transaction per chunk, and progress is checkpointed
+after every chunk so an interrupted run can simply be restarted.
+
+Usage:
+    python batch_generate.py [--start-date 2025-01-06] [--workers 4]
+                             [--chunk-size 50] [--checkpoint batch.json]
+                             [--stub]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterable, Iterator
+
+from sqlalchemy import delete, func, select, update
+
+from checkpoint import Checkpoint
+from household import Household, household_of
+from instrumentation import log_event, span
+from models import db, User, Diet, EmailDelivery, IdempotencyKey, Plan, Preference
+from utils import (
+    ask_provider,
+    attach_nutrition,
+    attach_preparation,
+    build_plan_prompt,
+    call_ai_api,
+    check_seasonality,
+    check_variety,
+    get_dummy_response,
+    merge_shopping_list,
+    next_plan_start_date,
+    parse_plan_response,
+    scale_to_household,
+    screen_plan,
+)
+from variety import HistoryIndex, history_indexes
+
+# Signature shared by ``call_ai_api`` and the stub provider below.
+ProviderFn = Callable[[str, str, str], str]
+
+
+@dataclass(frozen=True)
+class PlanJob:
+    """Everything needed to generate one user's plan outside a request."""
+
+    user_id: int
+    prompt: str
+    api_provider: str
+    api_key: str | None
+    # Used to check the shopping list against the seasonal-produce index.
+    region: str | None = None
+    start_date: date | None = None
+    # Disliked foods the generated plan is screened against.
+    preferences: tuple[str, ...] = ()
+    # Recent meals, checked for repetitions in the generated plan.
+    history: HistoryIndex | None = None
+    # People the servings and shopping quantities are scaled to.
+    household: Household | None = None
+
+
+@dataclass
+class BatchReport:
+    """Summary of a batch run."""
+
+    selected: int = 0
+    skipped: int = 0
+    generated: int = 0
+    failed: int = 0
+
+
+def stub_provider(prompt: str, provider: str, api_key: str) -> str:
+    """Local provider returning the built-in sample plan without network I/O."""
+    return get_dummy_response()
+
+
+def iter_plan_jobs(start_date: date) -> Iterator[PlanJob]:
+    """Yield a ``PlanJob`` for every user with at least one uploaded diet.
+
+    Diets, preferences and recent plans are loaded with one query each
+    instead of one query per user. The latest diet is the one with the highest id, which
+    matches ``uploaded_at`` ordering since uploads are append-only.
+    """
+    latest_diet_ids = select(func.max(Diet.id)).group_by(Diet.user_id)
+    rows = (
+        db.session.query(User, Diet.content)
+        .join(Diet, Diet.user_id == User.id)
+        .filter(Diet.id.in_(latest_diet_ids))
+        .order_by(User.id)
+        .all()
+    )
+    preferences = {
+        pref.user_id: pref.disliked
+        for pref in Preference.query.filter(
+            Preference.user_id.in_([user.id for user, _ in rows])
+        )
+    }
+    histories = history_indexes([user.id for user, _ in rows], start_date)
+    for user, diet_text in rows:
+        disliked = preferences.get(user.id) or ""
+        preferences_list = [p.strip() for p in disliked.split(",") if p.strip()]
+        household = household_of(user)
+        prompt = build_plan_prompt(
+            diet_text,
+            preferences_list,
+            user.region,
+            start_date,
+            user.trains,
+            user.training_frequency,
+            user.training_days,
+            histories[user.id],
+            household,
+        )
+        yield PlanJob(
+            user.id,
+            prompt,
+            user.api_provider or "gemini",
+            user.api_key,
+            user.region,
+            start_date,
+            tuple(preferences_list),
+            histories[user.id],
+            household,
+        )
+
+
+def _chunks(items: list[PlanJob], size: int) -> Iterable[list[PlanJob]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _generate(job: PlanJob, provider_fn: ProviderFn) -> tuple[str, str, str]:
+    response_text = provider_fn(job.prompt, job.api_provider, job.api_key)
+    result = parse_plan_response(response_text)
+    # Meal rewrites must not be filled from the dummy plan when the provider fails.
+    ask_fn = ask_provider if provider_fn is call_ai_api else provider_fn
+    result = screen_plan(
+        result,
+        list(job.preferences),
+        lambda prompt: ask_fn(prompt, job.api_provider, job.api_key),
+    )
+    result = merge_shopping_list(result)
+    result = scale_to_household(result, job.household)
+    result = attach_nutrition(result)
+    # Workers run outside the application context, which the catalog needs.
+    result = attach_preparation(
+        result, lambda prompt: ask_fn(prompt, job.api_provider, job.api_key), use_catalog=False
+    )
+    if job.start_date is not None:
+        check_seasonality(result[2], job.region, job.start_date)
+    check_variety(result[2], job.history)
+    return result
+
+
+def write_plans(start_date: date, results: dict[int, tuple[str, str, str]]) -> None:
+    """Replace the plans of ``start_date`` for the given users in one transaction.
+
+    The bulk delete skips the ORM cascades, so the delivery records of the
+    replaced plans are deleted and their idempotency keys unlinked first.
+    """
+    if not results:
+        return
+    replaced = select(Plan.id).where(Plan.user_id.in_(list(results)), Plan.start_date == start_date)
+    db.session.execute(delete(EmailDelivery).where(EmailDelivery.plan_id.in_(replaced)))
+    db.session.execute(
+        update(IdempotencyKey).where(IdempotencyKey.plan_id.in_(replaced)).values(plan_id=None)
+    )
+    db.session.execute(delete(Plan).where(Plan.id.in_(replaced)))
+    db.session.add_all(
+        Plan(
+            user_id=user_id,
+            start_date=start_date,
+            content=plan_text,
+            json_content=raw_json,
+            shopping_list=shopping_list,
+        )
+        for user_id, (plan_text, shopping_list, raw_json) in results.items()
+    )
+    db.session.commit()
+
+
+def run_batch(
+    start_date: date | None = None,
+    provider_fn: ProviderFn = call_ai_api,
+    workers: int = 4,
+    chunk_size: int = 50,
+    checkpoint_path: str | None = None,
+) -> BatchReport:
+    """Generate and store plans for every user with a diet.
+
+    Must be called inside an application context.
+
+    Args:
+        start_date: Monday of the target week, next Monday by default.
+        provider_fn: Callable used to reach the AI provider.
+        workers: Maximum number of concurrent provider calls.
+        chunk_size: Number of users written (and checkpointed) per transaction.
+        checkpoint_path: Optional JSON file used to resume an interrupted run.
+
+    Returns:
+        A ``BatchReport`` with the counts of the run.
+    """
+    start_date = start_date or next_plan_start_date()
+    checkpoint = Checkpoint(checkpoint_path, key=start_date.isoformat())
+    report = BatchReport()
+
+    jobs = []
+    for job in iter_plan_jobs(start_date):
+        report.selected += 1
+        if checkpoint.is_done(job.user_id):
+            report.skipped += 1
+        else:
+            jobs.append(job)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for chunk in _chunks(jobs, max(1, chunk_size)):
+            futures = {
+                job.user_id: pool.submit(_generate, job, provider_fn) for job in chunk
+            }
+            results = {}
+            for user_id, future in futures.items():
+                try:
+                    results[user_id] = future.result()
+                except Exception as exc:
+                    # Leave the user out of the checkpoint so a rerun retries it.
+                    log_event(
+                        "batch_generation_failed",
+                        level=logging.ERROR,
+                        user_id=user_id,
+                        error=str(exc),
+                    )
+                    report.failed += 1
+            with span("db_write", table="plan", rows=len(results)):
+                write_plans(start_date, results)
+            checkpoint.mark_done(results)
+            report.generated += len(results)
+            print(
+                f"✅ {report.generated + report.skipped}/{report.selected} piani pronti"
+            )
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-generate weekly plans.")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--checkpoint", default="batch_generate.checkpoint.json")
+    parser.add_argument(
+        "--stub", action="store_true", help="Use the local stub provider."
+    )
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        report = run_batch(
+            start_date=args.start_date,
+            provider_fn=stub_provider if args.stub else call_ai_api,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            checkpoint_path=args.checkpoint,
+        )
+    print(
+        f"📊 Utenti: {report.selected} • generati: {report.generated} • "
+        f"saltati: {report.skipped} • falliti: {report.failed}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Offline benchmarks for the Fame application.
+
+Each module can be executed with ``python -m benchmarks.<name>`` from the
+application directory and prints its measurements to stdout.
+"""
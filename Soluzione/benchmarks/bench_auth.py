@@ -0,0 +1,100 @@
+"""
+Benchmark: authenticated GET requests with and without the principal cache.
+
+Seeds a SQLite file with synthetic users, diets and plans, then sends the
+same mix of authenticated GET requests through the Flask test client from
+several threads, once with ``PRINCIPAL_CACHE_TTL=0`` (the user is loaded on
+every request) and once with the cache on. Reports requests per second and
+the average number of SQL statements per request.
+
+Usage:
+    python -m benchmarks.bench_auth [--users 200] [--requests 3000] [--threads 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from app import create_app
+from benchmarks.fixtures import seed_database
+from models import db
+from query_stats import count_queries
+
+PATHS = ("/", "/diet", "/preferences", "/plans/history", "/api/favorite_emails")
+
+
+def run(ttl: float, args: argparse.Namespace, db_path: str) -> dict:
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+            "PRINCIPAL_CACHE_TTL": ttl,
+            "LOG_LEVEL": "ERROR",
+        }
+    )
+    user_ids = list(range(1, args.users + 1))
+    statements = 0
+    lock = threading.Lock()
+
+    def worker(index: int, count: int) -> None:
+        nonlocal statements
+        rng = random.Random(f"{args.seed}-{index}")
+        # One client per user, like one browser session each.
+        clients = {}
+        local = 0
+        for _ in range(count):
+            user_id = rng.choice(user_ids)
+            client = clients.get(user_id)
+            if client is None:
+                client = clients[user_id] = app.test_client()
+                with client.session_transaction() as session:
+                    session["_user_id"] = str(user_id)
+            with count_queries() as stats:
+                response = client.get(rng.choice(PATHS))
+            assert response.status_code == 200, response.status_code
+            local += stats.count
+        with lock:
+            statements += local
+
+    app.test_client().get("/login")  # creates the tables outside the timing
+    shares = [args.requests // args.threads + (i < args.requests % args.threads) for i in range(args.threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for future in [pool.submit(worker, i, n) for i, n in enumerate(shares)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    with app.app_context():
+        db.engine.dispose()
+    return {"rps": args.requests / elapsed, "queries": statements / args.requests}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "bench.db")
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}", "LOG_LEVEL": "ERROR"})
+        with app.app_context():
+            db.create_all()
+            seed_database(args.users, 4, random.Random(args.seed), date(2025, 1, 6))
+            db.engine.dispose()
+
+        print(f"{'mode':<10} {'req/s':>8} {'queries/req':>12}")
+        for label, ttl in (("uncached", 0), ("cached", 60)):
+            row = run(ttl, args, db_path)
+            print(f"{label:<10} {row['rps']:>8.1f} {row['queries']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
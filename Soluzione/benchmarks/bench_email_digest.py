@@ -0,0 +1,95 @@
+"""
+Benchmark: weekly digest vs. one ``send_email`` call per user.
+
+Seeds a temporary SQLite database with N plans, starts a local SMTP sink and
+measures how long it takes to deliver every shopping list, first through
+``send_email`` (one connection per message, like ``generate_plan`` does
+today) and then through ``email_digest.send_digest``.
+
+Usage:
+    python -m benchmarks.bench_email_digest [--users 2000] [--connections 2]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+from app import create_app
+from benchmarks.smtp_sink import SMTPSink
+from email_digest import iter_digest_messages, send_digest
+from models import db, Plan, User
+from utils import get_dummy_response, parse_plan_response, send_email
+
+
+def seed(users: int, start_date: date) -> None:
+    plan_text, shopping_list, raw_json = parse_plan_response(get_dummy_response())
+    db.session.add_all(
+        User(id=i, username=f"user{i}", email=f"user{i}@example.com", password="x")
+        for i in range(1, users + 1)
+    )
+    db.session.add_all(
+        Plan(
+            user_id=i,
+            start_date=start_date,
+            content=plan_text,
+            json_content=raw_json,
+            shopping_list=shopping_list,
+        )
+        for i in range(1, users + 1)
+    )
+    db.session.commit()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=2)
+    args = parser.parse_args(argv)
+    start_date = date(2025, 1, 6)
+
+    with tempfile.TemporaryDirectory() as tmpdir, SMTPSink() as sink:
+        host, port = sink.address
+        app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+                "MAIL_SERVER": host,
+                "MAIL_PORT": port,
+            }
+        )
+        with app.app_context():
+            db.create_all()
+            seed(args.users, start_date)
+            messages = list(iter_digest_messages(start_date))
+
+            os.environ["MAIL_SERVER"], os.environ["MAIL_PORT"] = host, str(port)
+            try:
+                started = time.perf_counter()
+                for message in messages:
+                    send_email(message.recipient, message.subject, message.text_body)
+                per_message = time.perf_counter() - started
+            finally:
+                del os.environ["MAIL_SERVER"], os.environ["MAIL_PORT"]
+            connections_before = sink.connections
+
+            started = time.perf_counter()
+            report = send_digest(start_date, args.connections)
+            digest = time.perf_counter() - started
+
+    print(f"messages:                 {len(messages)}")
+    print(
+        f"send_email per message:   {per_message:8.3f}s "
+        f"({len(messages) / per_message:8.1f} msg/s, {connections_before} connections)"
+    )
+    print(
+        f"send_digest:              {digest:8.3f}s "
+        f"({len(report.sent) / digest:8.1f} msg/s, "
+        f"{sink.connections - connections_before} connections)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: single-pass ``parse_plan_content`` vs. the previous line/day loop.
+
+Usage:
+    python -m benchmarks.bench_plan_parser [--weeks 1 10 100] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+
+from plan_parser import parse_plan_content
+from utils import format_weekly_plan, get_dummy_response
+
+
+def legacy_parse_plan_content(content: str) -> dict:
+    """The O(lines x days) parser this benchmark replaces (lunch/dinner only)."""
+    structured_plan = {}
+    days_map = {
+        "LUNEDÌ": "monday",
+        "MARTEDÌ": "tuesday",
+        "MERCOLEDÌ": "wednesday",
+        "GIOVEDÌ": "thursday",
+        "VENERDÌ": "friday",
+        "SABATO": "saturday",
+        "DOMENICA": "sunday",
+    }
+    current_day = None
+    current_meal = None
+    for line in content.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        for day_it, day_en in days_map.items():
+            if day_it in line.upper():
+                current_day = day_en
+                structured_plan[current_day] = {}
+                break
+        if current_day and ("**Pranzo:**" in line or "🥗 **Pranzo:**" in line):
+            title = line.split("**Pranzo:**")[1].strip()
+            structured_plan[current_day]["lunch"] = {"title": title, "description": "", "focus": "", "servings": 2}
+            current_meal = "lunch"
+        elif current_day and ("**Cena:**" in line or "🍽️ **Cena:**" in line):
+            title = line.split("**Cena:**")[1].strip()
+            structured_plan[current_day]["dinner"] = {"title": title, "description": "", "focus": "", "servings": 3}
+            current_meal = "dinner"
+        elif current_day and current_meal and line.startswith("📝"):
+            structured_plan[current_day][current_meal]["description"] = line.replace("📝", "").strip()
+        elif current_day and current_meal and line.startswith("🎯"):
+            focus_info = line.replace("🎯", "").strip()
+            if "•" in focus_info:
+                parts = focus_info.split("•")
+                structured_plan[current_day][current_meal]["focus"] = parts[0].strip()
+                try:
+                    structured_plan[current_day][current_meal]["servings"] = int(parts[1].split()[0])
+                except (IndexError, ValueError):
+                    pass
+            else:
+                structured_plan[current_day][current_meal]["focus"] = focus_info
+    return structured_plan
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--weeks", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+    week = format_weekly_plan(json.loads(get_dummy_response())["weekly_plan"])
+
+    print(f"{'weeks':>6} {'lines':>7} {'legacy ms':>10} {'single-pass ms':>15} {'speedup':>8}")
+    for weeks in args.weeks:
+        text = "\n".join([week] * weeks)
+        legacy = min(timeit.repeat(lambda: legacy_parse_plan_content(text), number=1, repeat=args.repeat))
+        current = min(timeit.repeat(lambda: parse_plan_content(text), number=1, repeat=args.repeat))
+        print(
+            f"{weeks:>6} {text.count(chr(10)) + 1:>7} {legacy * 1000:>10.3f} "
+            f"{current * 1000:>15.3f} {legacy / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
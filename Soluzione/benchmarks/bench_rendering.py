@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: plan text and shopping-list rendering at large plan sizes.
+
+Compares the previous string-concatenation renderer with the compiled Jinja
+fragments, both cold (cache cleared before each call) and warm (same plan
+version rendered again, as ``delete_meal`` and batch runs do).
+
+Usage:
+    python -m benchmarks.bench_rendering [--items 2000] [--repeat 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+
+import rendering
+from utils import get_dummy_response
+
+
+def legacy_format_shopping_list(shopping_list: dict) -> str:
+    """The concatenation-based renderer this benchmark replaces."""
+    formatted_sections = []
+    for category, items in shopping_list.items():
+        if category in rendering.SHOPPING_CATEGORIES and items:
+            cat_info = rendering.SHOPPING_CATEGORIES[category]
+            section_html = f"""<div class="shopping-category mb-4">
+                <h6 class="category-header" style="color: {cat_info['color']};">
+                    <span class="category-icon">{cat_info['icon']}</span>
+                    {cat_info['name']}
+                    <span class="badge bg-light text-dark ms-2">{len(items)}</span>
+                </h6>
+                <div class="category-items">"""
+            for item in items:
+                section_html += f"""
+                    <div class="shopping-item">
+                        <span class="item-bullet" style="color: {cat_info['color']};">•</span>
+                        <span class="item-text">{item}</span>
+                    </div>"""
+            section_html += """
+                </div>
+            </div>"""
+            formatted_sections.append(section_html)
+    return "".join(formatted_sections)
+
+
+def large_plan(items: int) -> dict:
+    data = json.loads(get_dummy_response())
+    per_category = max(1, items // len(data["shopping_list"]))
+    data["shopping_list"] = {
+        category: [f"{name} #{i} 500g" for i in range(per_category) for name in values[:1]]
+        for category, values in data["shopping_list"].items()
+    }
+    for day in data["weekly_plan"].values():
+        for meal in day.values():
+            meal["description"] = meal["description"] * 20
+    return data
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+    data = large_plan(args.items)
+    shopping, weekly = data["shopping_list"], data["weekly_plan"]
+
+    def cold(fn, arg):
+        rendering.clear_cache()
+        return fn(arg)
+
+    cases = {
+        "shopping legacy concat": lambda: legacy_format_shopping_list(shopping),
+        "shopping jinja (cold)": lambda: cold(rendering.render_shopping_list, shopping),
+        "shopping jinja (cached)": lambda: rendering.render_shopping_list(shopping),
+        "weekly plan jinja (cold)": lambda: cold(rendering.render_weekly_plan, weekly),
+        "weekly plan jinja (cached)": lambda: rendering.render_weekly_plan(weekly),
+    }
+    print(f"shopping items: {sum(len(v) for v in shopping.values())}")
+    for name, fn in cases.items():
+        fn()
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"{name:28s} {best * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
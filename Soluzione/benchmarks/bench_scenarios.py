@@ -0,0 +1,252 @@
+"""
+Benchmark: end-to-end latency of the main user flows, fully offline.
+
+Seeds a temporary SQLite database with synthetic users, diets and plans,
+points every AI provider at the local fake LLM server (and email at the
+SMTP sink), then drives the Flask app through its test client from several
+threads. For each scenario it reports p50/p95/p99 latency and throughput:
+
+* ``generate``     POST /generate_plan (prompt, provider call, parse, save, email)
+* ``view``         GET /plan
+* ``meal-detail``  GET /api/meal_details/<day>/<meal_type>
+* ``upload``       POST /upload_diet with a multi-page PDF diet
+
+Results can be saved with ``--json`` and compared with a previous run with
+``--baseline``; the command exits with status 1 when a scenario's p95 is
+more than ``--tolerance`` slower than in the baseline.
+
+Usage:
+    python -m benchmarks.bench_scenarios [--requests 200] [--concurrency 4]
+        [--latency 0.05 --jitter 0.05 --error-rate 0.05] [--json out.json]
+        [--baseline previous.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Callable
+
+from app import create_app
+from benchmarks.fake_llm_server import FakeLLMServer
+from benchmarks.fixtures import seed_database, synthetic_diet_text, synthetic_pdf
+from benchmarks.smtp_sink import SMTPSink
+from models import db
+from rendering import DAYS
+from utils import next_plan_start_date
+
+
+def _generate(client, rng: random.Random, pdf: bytes):
+    return client.post("/generate_plan")
+
+
+def _view(client, rng: random.Random, pdf: bytes):
+    return client.get("/plan")
+
+
+def _meal_detail(client, rng: random.Random, pdf: bytes):
+    day = rng.choice(DAYS)[0]
+    # Lunch and dinner exist in every plan, including the dummy fallback.
+    meal_type = rng.choice(["lunch", "dinner"])
+    return client.get(f"/api/meal_details/{day}/{meal_type}")
+
+
+def _upload(client, rng: random.Random, pdf: bytes):
+    return client.post(
+        "/upload_diet",
+        data={"diet_file": (BytesIO(pdf), "dieta.pdf")},
+        content_type="multipart/form-data",
+    )
+
+
+# Scenario name -> (request function, expected status code).
+SCENARIOS: dict[str, tuple[Callable, int]] = {
+    "generate": (_generate, 302),
+    "view": (_view, 200),
+    "meal-detail": (_meal_detail, 200),
+    "upload": (_upload, 302),
+}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list (0 when it is empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+@dataclass
+class ScenarioResult:
+    """Latencies (seconds) and failures of one scenario run."""
+
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "throughput": round(self.throughput, 2),
+        }
+
+
+def run_scenario(
+    app,
+    name: str,
+    user_ids: list[int],
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+    seed: int = 0,
+) -> ScenarioResult:
+    """Send ``requests`` requests of scenario ``name`` from ``concurrency`` threads.
+
+    Each thread has its own test client and cycles through its share of the
+    users, logging in by writing the Flask-Login session directly.
+    """
+    send, expected_status = SCENARIOS[name]
+    result = ScenarioResult(name)
+    lock = threading.Lock()
+    pdf = synthetic_pdf(synthetic_diet_text(random.Random(seed), lines=180))
+
+    def worker(index: int, count: int, record: bool) -> None:
+        rng = random.Random(f"{seed}-{name}-{index}-{record}")
+        users = user_ids[index::concurrency] or user_ids
+        client = app.test_client()
+        latencies, errors = [], 0
+        for i in range(count):
+            with client.session_transaction() as session:
+                session["_user_id"] = str(users[i % len(users)])
+                session["_fresh"] = True
+            started = time.perf_counter()
+            response = send(client, rng, pdf)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != expected_status:
+                errors += 1
+        if record:
+            with lock:
+                result.latencies.extend(latencies)
+                result.errors += errors
+
+    def run(total: int, record: bool) -> None:
+        shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker, i, n, record) for i, n in enumerate(shares) if n]:
+                future.result()
+
+    if warmup:
+        run(warmup, record=False)
+    started = time.perf_counter()
+    run(requests, record=True)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe every scenario whose p95 grew by more than ``tolerance``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("p95_ms"):
+            continue
+        ratio = current["p95_ms"] / previous["p95_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms "
+                f"(+{(ratio - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--plans-per-user", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake provider delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    start_date = next_plan_start_date()
+    fake = FakeLLMServer(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir, fake, SMTPSink() as sink:
+        host, port = sink.address
+        saved_env = {key: os.environ.get(key) for key in [*fake.environ(), "MAIL_SERVER", "MAIL_PORT"]}
+        os.environ.update(fake.environ(), MAIL_SERVER=host, MAIL_PORT=str(port))
+        try:
+            app = create_app(
+                {
+                    "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+                    "LOG_LEVEL": "ERROR",
+                }
+            )
+            with app.app_context():
+                db.create_all()
+                user_ids = seed_database(
+                    args.users, args.plans_per_user, random.Random(args.seed), start_date
+                )
+            for name in args.scenarios:
+                result = run_scenario(
+                    app, name, user_ids, args.requests, args.concurrency, args.warmup, args.seed
+                )
+                results[name] = result.summary()
+        finally:
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    print(f"{'scenario':<12} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for name, row in results.items():
+        print(
+            f"{name:<12} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>9.2f} "
+            f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['throughput']:>8.1f}"
+        )
+    print(f"fake provider: {fake.requests} requests, {fake.errors} injected errors")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = find_regressions(results, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: mixed concurrent reads and writes on SQLite, default vs. tuned.
+
+Seeds a SQLite file with synthetic users and plans, then runs the same
+workload twice from several threads: once with SQLite's defaults
+(``SQLITE_TUNING=False``) and once with the WAL/pragmas/writer-queue mode of
+``sqlite_tuning``. Reads load a user's latest plan like ``view_plan``;
+writes replace a plan in one transaction like ``generate_plan``. Reports
+throughput, read/write p50 and p95 latency and "database is locked" errors.
+
+Usage:
+    python -m benchmarks.bench_sqlite_concurrency [--threads 8] [--ops 2000]
+        [--write-ratio 0.2] [--busy-timeout-ms 5000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from benchmarks.bench_scenarios import percentile
+from benchmarks.fixtures import seed_database, synthetic_response
+from coalescing import store_plan
+from models import db, Plan
+from utils import parse_plan_response
+
+
+def _read(user_id: int, rng: random.Random) -> None:
+    plan = (
+        Plan.query.filter_by(user_id=user_id).order_by(Plan.created_at.desc()).first()
+    )
+    if plan is not None:
+        plan.json_content
+
+
+def _write(user_id: int, rng: random.Random, start_date: date) -> None:
+    store_plan(user_id, start_date, parse_plan_response(synthetic_response(rng)))
+
+
+def run(tuned: bool, args: argparse.Namespace) -> dict:
+    start_date = date(2025, 1, 6)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+                "SQLITE_TUNING": tuned,
+                "SQLITE_BUSY_TIMEOUT_MS": args.busy_timeout_ms,
+                # pysqlite's own busy timeout, so both modes wait as long.
+                "SQLALCHEMY_ENGINE_OPTIONS": {
+                    "connect_args": {"timeout": args.busy_timeout_ms / 1000}
+                },
+                "LOG_LEVEL": "ERROR",
+            }
+        )
+        with app.app_context():
+            db.create_all()
+            user_ids = seed_database(args.users, 2, random.Random(args.seed), start_date)
+
+        latencies: dict[str, list[float]] = {"read": [], "write": []}
+        errors = {"read": 0, "write": 0}
+        lock = threading.Lock()
+
+        def worker(index: int, count: int) -> None:
+            rng = random.Random(f"{args.seed}-{index}")
+            # Each thread writes its own users' plans, as concurrent requests
+            # of different users do; reads go anywhere.
+            own_users = user_ids[index :: args.threads] or user_ids
+            local = {"read": [], "write": []}
+            local_errors = {"read": 0, "write": 0}
+            for _ in range(count):
+                kind = "write" if rng.random() < args.write_ratio else "read"
+                user_id = rng.choice(own_users if kind == "write" else user_ids)
+                started = time.perf_counter()
+                with app.app_context():
+                    try:
+                        if kind == "write":
+                            _write(user_id, rng, start_date)
+                        else:
+                            _read(user_id, rng)
+                    except OperationalError:
+                        db.session.rollback()
+                        local_errors[kind] += 1
+                local[kind].append(time.perf_counter() - started)
+            with lock:
+                for kind in local:
+                    latencies[kind].extend(local[kind])
+                    errors[kind] += local_errors[kind]
+
+        shares = [args.ops // args.threads + (i < args.ops % args.threads) for i in range(args.threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            for future in [pool.submit(worker, i, n) for i, n in enumerate(shares)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            db.engine.dispose()
+
+    row = {"ops_per_s": args.ops / elapsed}
+    for kind in ("read", "write"):
+        ordered = sorted(latencies[kind])
+        row[f"{kind}_p50_ms"] = percentile(ordered, 50) * 1000
+        row[f"{kind}_p95_ms"] = percentile(ordered, 95) * 1000
+        row[f"{kind}_errors"] = errors[kind]
+    return row
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--busy-timeout-ms", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'mode':<8} {'ops/s':>8} {'read p50':>9} {'read p95':>9} "
+        f"{'write p50':>10} {'write p95':>10} {'errors r/w':>11}"
+    )
+    for label, tuned in (("default", False), ("tuned", True)):
+        row = run(tuned, args)
+        print(
+            f"{label:<8} {row['ops_per_s']:>8.1f} {row['read_p50_ms']:>9.2f} "
+            f"{row['read_p95_ms']:>9.2f} {row['write_p50_ms']:>10.2f} "
+            f"{row['write_p95_ms']:>10.2f} {row['read_errors']:>5}/{row['write_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
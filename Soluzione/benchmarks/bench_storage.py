@@ -0,0 +1,136 @@
+"""
+Benchmark: database size of the legacy text layout vs. compact storage.
+
+Seeds a SQLite file with synthetic diets and plans laid out the old way
+(pretty-printed JSON next to the rendered plan text and shopping-list HTML,
+all as plain text), measures it, rewrites it with ``compress_storage`` and
+measures again. Reports the bytes per column, the file size after
+``VACUUM`` and the time to load every plan and read its text and shopping
+list.
+
+Usage:
+    python -m benchmarks.bench_storage [--users 500] [--plans-per-user 8]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import column, func, insert, select, table
+
+import rendering
+from app import create_app
+from benchmarks.fixtures import synthetic_diet_text, synthetic_response
+from compress_storage import database_size, run_compress, vacuum
+from models import db, Plan, User
+from utils import parse_plan_response
+
+# Untyped table clauses, so values are written as plain text like before.
+_legacy_diet = table("diet", column("user_id"), column("content"), column("uploaded_at"))
+_legacy_plan = table(
+    "plan",
+    column("user_id"),
+    column("start_date"),
+    column("content"),
+    column("json_content"),
+    column("shopping_list"),
+    column("created_at"),
+)
+COLUMNS = {"diet": ("content",), "plan": ("content", "json_content", "shopping_list")}
+
+
+def seed_legacy(users: int, plans_per_user: int, rng: random.Random) -> None:
+    now = date(2025, 1, 6)
+    db.session.add_all(
+        User(id=i, username=f"user{i}", email=f"user{i}@example.com", password="x")
+        for i in range(1, users + 1)
+    )
+    db.session.flush()
+    diets, plans = [], []
+    for i in range(1, users + 1):
+        diets.append({"user_id": i, "content": synthetic_diet_text(rng), "uploaded_at": now})
+        for week in range(plans_per_user):
+            plan_text, shopping_list, raw_json = parse_plan_response(synthetic_response(rng))
+            plans.append(
+                {
+                    "user_id": i,
+                    "start_date": now - timedelta(weeks=week),
+                    "content": plan_text,
+                    "json_content": json.dumps(json.loads(raw_json), ensure_ascii=False, indent=2),
+                    "shopping_list": shopping_list,
+                    "created_at": now,
+                }
+            )
+    db.session.execute(insert(_legacy_diet), diets)
+    db.session.execute(insert(_legacy_plan), plans)
+    db.session.commit()
+
+
+def column_bytes() -> dict[str, int]:
+    sizes = {}
+    for name, columns in COLUMNS.items():
+        for col in columns:
+            # length() of a text value counts characters; cast to a blob first.
+            expr = func.sum(func.length(func.cast(column(col), db.LargeBinary)))
+            sizes[f"{name}.{col}"] = db.session.execute(select(expr).select_from(table(name))).scalar() or 0
+    return sizes
+
+
+def read_all_plans() -> float:
+    rendering.clear_cache()
+    db.session.expunge_all()
+    started = time.perf_counter()
+    for plan in Plan.query.all():
+        plan.content, plan.shopping_list
+    return time.perf_counter() - started
+
+
+def measure() -> dict:
+    vacuum()
+    return {"columns": column_bytes(), "file": database_size(), "read_s": read_all_plans()}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--plans-per-user", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+                "LOG_LEVEL": "ERROR",
+            }
+        )
+        with app.app_context():
+            db.create_all()
+            seed_legacy(args.users, args.plans_per_user, random.Random(args.seed))
+            before = measure()
+            report = run_compress()
+            after = measure()
+            db.session.remove()
+            db.engine.dispose()
+
+    print(f"{'':<22} {'legacy':>12} {'compact':>12} {'saved':>7}")
+    rows = list(before["columns"]) + ["file", "read_s"]
+    for key in rows:
+        old = before["columns"].get(key, before.get(key))
+        new = after["columns"].get(key, after.get(key))
+        saved = 1 - new / old if old else 0.0
+        if key == "read_s":
+            print(f"{'read all plans (ms)':<22} {old * 1000:>12.1f} {new * 1000:>12.1f} {saved:>7.0%}")
+        else:
+            print(f"{key + ' (KB)':<22} {old / 1024:>12.1f} {new / 1024:>12.1f} {saved:>7.0%}")
+    print(f"rewrote {report.diets} diets and {report.plans} plans in {report.elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
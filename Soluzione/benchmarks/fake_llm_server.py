@@ -0,0 +1,214 @@
+"""
+Local fake of the Gemini, OpenAI and Claude HTTP APIs.
+
+The server answers the three endpoints called by ``utils`` with a synthetic
+weekly plan in the JSON format requested by ``prompt.txt``, so the whole
+generation path can be exercised and timed without network access or API
+keys. Latency (a fixed delay plus uniform jitter), the share of requests
+failing with an HTTP error and streaming are configurable:
+
+* Gemini: ``POST /v1beta/models/<model>:generateContent`` and
+  ``:streamGenerateContent?alt=sse``
+* OpenAI: ``POST /v1/chat/completions`` (``"stream": true`` for SSE)
+* Claude: ``POST /v1/messages`` (``"stream": true`` for SSE)
+
+Point ``utils`` at it with the variables returned by ``environ()``.
+"""
+
+from __future__ import annotations
+
+import http.server
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable
+
+from benchmarks.fixtures import synthetic_response
+
+_GEMINI_RE = re.compile(r"^/v1beta/models/[^/:]+:(generateContent|streamGenerateContent)$")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle's
+    # algorithm and delayed ACKs add ~40ms to every response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events) -> None:
+        server: FakeLLMServer = self.server.fake  # type: ignore[attr-defined]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for event, payload in events:
+            if event:
+                self.wfile.write(f"event: {event}\n".encode())
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if server.chunk_delay:
+                time.sleep(server.chunk_delay)
+
+    def do_POST(self) -> None:
+        server: FakeLLMServer = self.server.fake  # type: ignore[attr-defined]
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = {}
+        path = self.path.partition("?")[0]
+
+        gemini = _GEMINI_RE.match(path)
+        if gemini:
+            provider = "gemini"
+            stream = gemini.group(1) == "streamGenerateContent"
+        elif path == "/v1/chat/completions":
+            provider, stream = "openai", bool(payload.get("stream"))
+        elif path == "/v1/messages":
+            provider, stream = "claude", bool(payload.get("stream"))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {path}"}})
+            return
+
+        failed, delay, text = server._next_reply()
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self._send_json(server.error_status, {"error": {"message": "Injected failure"}})
+            return
+        if not stream:
+            self._send_json(200, _complete(provider, text))
+            return
+        self._send_events(_stream(provider, server._split(text)))
+
+
+def _complete(provider: str, text: str) -> dict:
+    if provider == "gemini":
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+    if provider == "openai":
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}
+    return {"content": [{"type": "text", "text": text}], "role": "assistant"}
+
+
+def _stream(provider: str, chunks: list[str]):
+    if provider == "gemini":
+        for chunk in chunks:
+            yield None, {"candidates": [{"content": {"parts": [{"text": chunk}], "role": "model"}}]}
+    elif provider == "openai":
+        for chunk in chunks:
+            yield None, {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+        yield None, "[DONE]"
+    else:
+        yield "message_start", {"type": "message_start"}
+        for chunk in chunks:
+            yield "content_block_delta", {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": chunk},
+            }
+        yield "message_stop", {"type": "message_stop"}
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeLLMServer:
+    """Threaded HTTP server on localhost imitating the AI provider APIs.
+
+    Args:
+        latency: Seconds waited before answering each request.
+        jitter: Upper bound of an extra uniform random delay, in seconds.
+        error_rate: Probability (0-1) of answering with ``error_status``.
+        error_status: HTTP status of injected failures.
+        stream_chunks: Number of events a streamed answer is split into.
+        chunk_delay: Seconds waited after each streamed event.
+        seed: Seed of the generator driving latency, failures and plans.
+        responder: Optional callable returning the answer text from the
+            random generator (defaults to a synthetic weekly plan).
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        stream_chunks: int = 8,
+        chunk_delay: float = 0.0,
+        seed: int = 0,
+        responder: Callable[[random.Random], str] | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stream_chunks = max(1, stream_chunks)
+        self.chunk_delay = chunk_delay
+        self.responder = responder or synthetic_response
+        self._rng = random.Random(seed)
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self  # type: ignore[attr-defined]
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def environ(self) -> dict[str, str]:
+        """Environment variables pointing every provider of ``utils`` here."""
+        return {
+            "GEMINI_API_BASE": self.base_url,
+            "OPENAI_API_BASE": self.base_url,
+            "ANTHROPIC_API_BASE": self.base_url,
+        }
+
+    def _next_reply(self) -> tuple[bool, float, str]:
+        # One lock-protected draw per request keeps runs reproducible for a
+        # given seed and request order.
+        with self._lock:
+            self.requests += 1
+            failed = self._rng.random() < self.error_rate
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            text = "" if failed else self.responder(self._rng)
+            if failed:
+                self.errors += 1
+        return failed, delay, text
+
+    def _split(self, text: str) -> list[str]:
+        size = max(1, -(-len(text) // self.stream_chunks))
+        return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+    def __enter__(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
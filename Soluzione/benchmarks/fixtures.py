@@ -0,0 +1,183 @@
+"""
+Synthetic users, diets and plans for benchmarks and tests.
+
+Everything is drawn from a ``random.Random`` so a given seed always
+produces the same data set. Plans follow the JSON format requested by
+``prompt.txt``; diets can be rendered as plain text or as a small text PDF
+that ``pypdf`` can extract, so uploads exercise the real PDF path.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from datetime import date, timedelta
+
+from models import db, Diet, Plan, Preference, User
+from rendering import DAYS, MEAL_TYPES, SHOPPING_CATEGORIES
+from utils import parse_plan_response
+
+PROVIDERS = ("gemini", "openai", "claude")
+
+_BASES = [
+    "Pasta integrale", "Risotto", "Insalata di farro", "Zuppa di legumi", "Orata",
+    "Petto di pollo", "Frittata", "Salmone", "Tacchino", "Couscous", "Vellutata",
+    "Polpette di ceci", "Merluzzo", "Yogurt greco", "Porridge", "Tofu",
+]
+_SIDES = [
+    "zucchine", "spinaci", "pomodorini", "carote", "funghi", "zucca", "piselli",
+    "broccoli", "melanzane", "peperoni", "finocchi", "rucola", "lenticchie", "noci",
+]
+_FOCUS = [
+    "Proteico e saziante", "Fibre e proteine vegetali", "Omega-3", "Leggero e digeribile",
+    "Carboidrati complessi", "Ricco di vitamine", "Energia a lungo rilascio",
+]
+_ITEMS = {
+    "vegetables_fruits": _SIDES + ["limoni", "mele", "arance", "basilico"],
+    "meat_fish_eggs": ["petto di pollo", "salmone", "uova", "orata", "tacchino", "merluzzo"],
+    "dairy_cheese": ["yogurt greco", "ricotta", "parmigiano", "mozzarella", "feta"],
+    "grains_legumes": ["pasta integrale", "riso", "farro", "ceci", "lenticchie", "couscous"],
+    "pantry_condiments": ["olio extravergine", "aceto balsamico", "spezie", "sale", "pepe"],
+}
+
+
+def synthetic_meal(rng: random.Random, servings: int) -> dict:
+    base = rng.choice(_BASES)
+    first, second = rng.sample(_SIDES, 2)
+    return {
+        "title": f"{base} con {first}",
+        "description": f"{base} preparato con {first}, {second} e olio extravergine",
+        "focus": rng.choice(_FOCUS),
+        "servings": servings,
+    }
+
+
+def synthetic_weekly_plan(rng: random.Random) -> dict:
+    """Return a ``weekly_plan`` with every meal of every day."""
+    return {
+        day: {meal_type: synthetic_meal(rng, servings) for meal_type, _, _, servings in MEAL_TYPES}
+        for day, _ in DAYS
+    }
+
+
+def synthetic_shopping_list(rng: random.Random) -> dict:
+    return {
+        category: [f"{item} {rng.randint(1, 9) * 100}g" for item in rng.sample(_ITEMS[category], 4)]
+        for category in SHOPPING_CATEGORIES
+    }
+
+
+def synthetic_response(rng: random.Random) -> str:
+    """Return a provider answer in the format requested by ``prompt.txt``."""
+    return json.dumps(
+        {
+            "weekly_plan": synthetic_weekly_plan(rng),
+            "shopping_list": synthetic_shopping_list(rng),
+        },
+        ensure_ascii=False,
+    )
+
+
+def synthetic_diet_text(rng: random.Random, lines: int = 60) -> str:
+    """Return a dietitian-style plan listing foods and portions per meal."""
+    rows = ["Piano alimentare personalizzato", ""]
+    for i in range(lines):
+        label = MEAL_TYPES[i % len(MEAL_TYPES)][1]
+        foods = ", ".join(
+            f"{food} {rng.randint(1, 20) * 10}g" for food in rng.sample(_SIDES + _BASES, 3)
+        )
+        rows.append(f"{label} opzione {i // len(MEAL_TYPES) + 1}: {foods}")
+    return "\n".join(rows)
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def synthetic_pdf(text: str, lines_per_page: int = 45) -> bytes:
+    """Lay ``text`` out on Helvetica pages of a minimal, valid PDF."""
+    lines = text.splitlines() or [""]
+    pages = [lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+    objects: list[bytes] = []
+    page_ids = []
+    for page_lines in pages:
+        body = "BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page_lines
+        ) + " ET"
+        stream = body.encode("latin-1", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects) + 3
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects) + 3)
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ] + objects
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+def seed_database(
+    users: int,
+    plans_per_user: int,
+    rng: random.Random,
+    start_date: date,
+) -> list[int]:
+    """Create users with a diet, preferences and past weekly plans.
+
+    Users rotate through the three providers and all have an API key, so
+    generating a plan for them goes to the (fake) provider endpoints. Plans
+    cover the ``plans_per_user`` weeks before ``start_date``. Must be called
+    inside an application context; returns the user ids.
+    """
+    user_ids = list(range(1, users + 1))
+    db.session.add_all(
+        User(
+            id=i,
+            username=f"user{i}",
+            email=f"user{i}@example.com",
+            password="x",
+            region=rng.choice(["Lombardia, Italy", "Campania, Italy", "Sicilia, Italy"]),
+            trains=i % 3 == 0,
+            training_frequency=3 if i % 3 == 0 else None,
+            training_days="Monday,Wednesday,Friday" if i % 3 == 0 else None,
+            api_provider=PROVIDERS[i % len(PROVIDERS)],
+            api_key="bench-key",
+        )
+        for i in user_ids
+    )
+    db.session.add_all(Diet(user_id=i, content=synthetic_diet_text(rng)) for i in user_ids)
+    db.session.add_all(
+        Preference(user_id=i, disliked=", ".join(rng.sample(_SIDES, 2))) for i in user_ids
+    )
+    for i in user_ids:
+        for week in range(plans_per_user, 0, -1):
+            plan_text, shopping_list, raw_json = parse_plan_response(synthetic_response(rng))
+            db.session.add(
+                Plan(
+                    user_id=i,
+                    start_date=start_date - timedelta(weeks=week),
+                    content=plan_text,
+                    json_content=raw_json,
+                    shopping_list=shopping_list,
+                )
+            )
+    db.session.commit()
+    return user_ids
@@ -0,0 +1,96 @@
+"""
+Minimal SMTP sink used by benchmarks and tests.
+
+The sink speaks just enough SMTP for ``smtplib`` (EHLO/HELO, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT), accepts every message and throws it away after
+counting it. Recipients starting with ``reject`` are refused so tests can
+exercise per-recipient failures.
+"""
+
+from __future__ import annotations
+
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        sink: SMTPSink = self.server.sink  # type: ignore[attr-defined]
+        sink._count("connections")
+        self._reply("220 sink ESMTP")
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="ignore").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self._reply("250-sink")
+                self._reply("250 8BITMIME")
+            elif verb == "HELO":
+                self._reply("250 sink")
+            elif verb == "MAIL":
+                recipients = 0
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                address = command.partition(":")[2].strip(" <>")
+                if address.lower().startswith("reject"):
+                    self._reply("550 No such user")
+                else:
+                    recipients += 1
+                    self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b".\r\n":
+                        break
+                sink._count("messages", recipients)
+                self._reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Threaded SMTP server on localhost that counts and discards messages."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self  # type: ignore[attr-defined]
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.connections = 0
+        self.messages = 0
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def __enter__(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
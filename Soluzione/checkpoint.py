@@ -0,0 +1,61 @@
+"""
+Checkpoint files for resumable offline jobs.
+
+Long running jobs such as the weekly batch generation process their work in
+chunks. After each chunk the identifiers of the completed items are written
+to a small JSON file so that an interrupted run can be restarted and will
+skip everything that was already done. A checkpoint is bound to a run key
+(for example the plan start date); a file written for a different key is
+ignored so that last week's progress never leaks into this week's run.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterable
+
+
+class Checkpoint:
+    """Persist the identifiers of completed work items to a JSON file."""
+
+    def __init__(self, path: str | None, key: str) -> None:
+        self.path = path
+        self.key = key
+        self.done: set[int] = set()
+        self.state: dict = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                data = {}
+            if data.get("key") == key:
+                self.done = set(data.get("done", []))
+                self.state = data.get("state", {})
+
+    def is_done(self, item_id: int) -> bool:
+        """Return True if ``item_id`` was completed by a previous run."""
+        return item_id in self.done
+
+    def mark_done(self, item_ids: Iterable[int], **state) -> None:
+        """Record ``item_ids`` as completed and flush the file to disk.
+
+        Any keyword arguments are stored alongside the ids (e.g. the last
+        processed primary key) and exposed again through ``state``.
+        """
+        self.done.update(item_ids)
+        self.state.update(state)
+        self.save()
+
+    def save(self) -> None:
+        """Atomically write the checkpoint file, if a path was configured."""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"key": self.key, "done": sorted(self.done), "state": self.state},
+                f,
+            )
+        os.replace(tmp_path, self.path)
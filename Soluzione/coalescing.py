@@ -0,0 +1,158 @@
+"""
+Single-flight coalescing and idempotency of plan generations.
+
+POST /generate_plan used to delete the week's plan and start a full
+provider call on every request: a double click or a client retry paid for
+two generations, and two concurrent requests raced on the delete and the
+insert, storing two plans for the week or losing one.
+
+``FLIGHTS`` now runs at most one generation per ``(user_id, start_date)`` at
+a time in the process; requests arriving meanwhile wait for it and share its
+outcome. Across processes the unique index on ``plan (user_id, start_date)``
+orders the writes: ``store_plan`` replaces the week's plan and, when a
+concurrent request committed one first, retries once over it, so the week
+always keeps exactly one plan, the latest.
+
+A request sent with an ``Idempotency-Key`` (the header, or the
+``idempotency_key`` field of the plan forms) records the key with the plan
+it produced, and a retry with the same key within ``KEY_TTL_HOURS`` is
+answered from it without a provider call.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Hashable, TypeVar
+
+from flask import Request
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey, Plan
+
+KEY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+MAX_KEY_LENGTH = 255
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: object = None
+    error: BaseException | None = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile share its outcome."""
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        """Return the result of ``fn()`` and whether another caller's call produced it.
+
+        An exception raised by ``fn`` is raised to every caller waiting for it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+FLIGHTS = SingleFlight()
+
+
+def new_key() -> str:
+    """Return a fresh idempotency key, rendered into the plan forms."""
+    return uuid.uuid4().hex
+
+
+def request_key(request: Request) -> str | None:
+    """Return the idempotency key of ``request``, None when it has none or it is too long."""
+    key = (request.headers.get("Idempotency-Key") or request.form.get("idempotency_key") or "").strip()
+    return key if 0 < len(key) <= MAX_KEY_LENGTH else None
+
+
+def _expiry() -> datetime:
+    return datetime.utcnow() - timedelta(hours=KEY_TTL_HOURS)
+
+
+def find_key(user_id: int, key: str) -> IdempotencyKey | None:
+    """Return the unexpired record of ``key`` for the user, if a generation stored one."""
+    return IdempotencyKey.query.filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key,
+        IdempotencyKey.created_at >= _expiry(),
+    ).first()
+
+
+def replace_plan(
+    user_id: int, start_date: date, plan_text: str, shopping_list: str, raw_json: str
+) -> Plan:
+    """Replace the user's plan of ``start_date`` in the session; the caller commits."""
+    existing = Plan.query.filter_by(user_id=user_id, start_date=start_date).first()
+    if existing:
+        db.session.delete(existing)
+        # The unit of work runs inserts before deletes, which the unique
+        # index would reject: delete the old plan first.
+        db.session.flush()
+    plan = Plan(
+        user_id=user_id,
+        start_date=start_date,
+        content=plan_text,
+        json_content=raw_json,
+        shopping_list=shopping_list,
+    )
+    db.session.add(plan)
+    return plan
+
+
+def store_plan(
+    user_id: int, start_date: date, result: tuple[str, str, str], key: str | None = None
+) -> Plan | None:
+    """Replace the week's plan with ``result`` and commit, recording ``key`` if given.
+
+    Returns the stored plan, or None when a concurrent request with the same
+    key stored its plan first (it is kept).
+    """
+    plan_text, shopping_list, raw_json = result
+    for attempt in range(2):
+        try:
+            plan = replace_plan(user_id, start_date, plan_text, shopping_list, raw_json)
+            if key is not None:
+                # Expired records of the user go, so a key can be reused.
+                IdempotencyKey.query.filter(
+                    IdempotencyKey.user_id == user_id, IdempotencyKey.created_at < _expiry()
+                ).delete(synchronize_session=False)
+                db.session.flush()
+                db.session.add(IdempotencyKey(user_id=user_id, key=key, plan_id=plan.id))
+            db.session.commit()
+            return plan
+        except IntegrityError:
+            db.session.rollback()
+            if key is not None and find_key(user_id, key) is not None:
+                return None
+            if attempt:
+                raise
+    return None
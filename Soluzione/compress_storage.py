@@ -0,0 +1,140 @@
+"""
+One-off rewrite of existing diets and plans into the compact storage format.
+
+Rows written before ``storage.CompressedText`` keep working as they are, but
+only rows saved again benefit from it. This job rewrites every diet and
+plan in primary-key batches: the JSON is stored compact and large values
+are compressed. Plans whose text or shopping list was stored empty are
+given it back, rendered from the JSON, so reading them renders nothing.
+Running it is optional: no column changes type (on PostgreSQL they stay
+``TEXT`` and only the JSON is compacted). The last rewritten ids are
+checkpointed after every batch so the job can be interrupted and restarted.
+
+SQLite only returns the freed pages to the file system on ``VACUUM``; pass
+``--vacuum`` to run it at the end.
+
+Usage:
+    python compress_storage.py [--batch-size 500] [--checkpoint compress.json] [--vacuum]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select, text
+from sqlalchemy.orm.attributes import flag_modified
+
+from checkpoint import Checkpoint
+from models import db, Diet, Plan
+
+CHECKPOINT_KEY = "compress-storage"
+
+# Model -> mapped attributes rewritten through the storage types.
+REWRITTEN = (
+    (Diet, ("content",)),
+    (Plan, ("_content", "json_content", "_shopping_list")),
+)
+
+
+@dataclass
+class CompressReport:
+    """Statistics of a rewrite run."""
+
+    diets: int = 0
+    plans: int = 0
+    size_before: int = 0
+    size_after: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def saved_ratio(self) -> float:
+        if not self.size_before:
+            return 0.0
+        return 1 - self.size_after / self.size_before
+
+
+def database_size() -> int:
+    """Return the bytes used by the diet and plan data (the whole file on SQLite)."""
+    if db.engine.dialect.name == "sqlite":
+        page_count = db.session.execute(text("PRAGMA page_count")).scalar()
+        page_size = db.session.execute(text("PRAGMA page_size")).scalar()
+        freelist = db.session.execute(text("PRAGMA freelist_count")).scalar()
+        return (page_count - freelist) * page_size
+    if db.engine.dialect.name == "postgresql":
+        return db.session.execute(
+            text("SELECT pg_total_relation_size('diet') + pg_total_relation_size('plan')")
+        ).scalar()
+    return 0
+
+
+def vacuum() -> None:
+    """Give the pages freed by the rewrite back to the file system (SQLite)."""
+    if db.engine.dialect.name != "sqlite":
+        return
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("VACUUM")
+
+
+def run_compress(batch_size: int = 500, checkpoint_path: str | None = None) -> CompressReport:
+    """Rewrite every diet and plan and return the run statistics.
+
+    Must be called inside an application context.
+    """
+    checkpoint = Checkpoint(checkpoint_path, key=CHECKPOINT_KEY)
+    report = CompressReport(size_before=database_size())
+    started = time.perf_counter()
+    for model, attributes in REWRITTEN:
+        state_key = f"last_{model.__tablename__}_id"
+        last_id = checkpoint.state.get(state_key, 0)
+        while True:
+            rows = db.session.scalars(
+                select(model).where(model.id > last_id).order_by(model.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                if model is Plan:
+                    # Text stored empty is rendered from the JSON and stored.
+                    row.content, row.shopping_list = row.content, row.shopping_list
+                for attribute in attributes:
+                    flag_modified(row, attribute)
+            db.session.commit()
+            last_id = rows[-1].id
+            if model is Diet:
+                report.diets += len(rows)
+            else:
+                report.plans += len(rows)
+            checkpoint.mark_done((), **{state_key: last_id})
+            db.session.expunge_all()
+    report.elapsed = time.perf_counter() - started
+    report.size_after = database_size()
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Rewrite diets and plans in compact storage.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--checkpoint", default="compress_storage.checkpoint.json")
+    parser.add_argument("--vacuum", action="store_true", help="run VACUUM afterwards (SQLite)")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        report = run_compress(args.batch_size, args.checkpoint)
+        if args.vacuum:
+            vacuum()
+            report.size_after = database_size()
+    print(
+        f"📦 Diete riscritte: {report.diets} • piani riscritti: {report.plans} • "
+        f"{report.size_before / 1e6:.1f} MB → {report.size_after / 1e6:.1f} MB "
+        f"(-{report.saved_ratio:.0%}) • {report.elapsed:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,64 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
 
+    # Connection pool. Pre-ping discards connections closed by the server and
+    # recycling avoids reusing connections older than the server's idle
+    # timeout; size, overflow and timeout are only passed when set, so the
+    # SQLAlchemy defaults of each dialect apply otherwise.
+    SQLALCHEMY_ENGINE_OPTIONS: dict = {
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() in ["true", "1", "t"],
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        **{
+            option: int(os.environ[env_var])
+            for option, env_var in [
+                ("pool_size", "DB_POOL_SIZE"),
+                ("max_overflow", "DB_MAX_OVERFLOW"),
+                ("pool_timeout", "DB_POOL_TIMEOUT"),
+            ]
+            if os.environ.get(env_var)
+        },
+    }
+
+    # Optional read replica used by the read-only views (see db_routing.py).
+    replica_url = os.environ.get("REPLICA_DATABASE_URL")
+    if replica_url and replica_url.startswith("postgres://"):
+        replica_url = replica_url.replace("postgres://", "postgresql://")
+    REPLICA_DATABASE_URI: str | None = replica_url
+    # Seconds after a write during which the user's reads stay on the
+    # primary, so they never see a replica that has not caught up yet.
+    REPLICA_STICKY_SECONDS: float = float(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+    # SQLite production mode (see sqlite_tuning.py): WAL, synchronous=NORMAL,
+    # memory-mapped I/O, a larger page cache, a busy timeout and serialized
+    # writers. Ignored for other databases.
+    SQLITE_TUNING: bool = os.environ.get("SQLITE_TUNING", "true").lower() in ["true", "1", "t"]
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE: int = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KIB: int = int(os.environ.get("SQLITE_CACHE_SIZE_KIB", 32 * 1024))
+    # Seconds a writer waits in the in-process writer queue.
+    SQLITE_WRITE_QUEUE_TIMEOUT: float = float(os.environ.get("SQLITE_WRITE_QUEUE_TIMEOUT", 30))
+
+    # Plan history (see history.py) and retention (see archive_plans.py).
+    # Plans older than PLAN_RETENTION_DAYS are moved to the archive table,
+    # except the PLAN_RETENTION_KEEP_LATEST most recent ones of each user;
+    # archived plans older than PLAN_ARCHIVE_RETENTION_DAYS are deleted. A
+    # value of 0 disables the corresponding step.
+    PLAN_HISTORY_PAGE_SIZE: int = int(os.environ.get("PLAN_HISTORY_PAGE_SIZE", 20))
+    PLAN_RETENTION_DAYS: int = int(os.environ.get("PLAN_RETENTION_DAYS", 365))
+    PLAN_RETENTION_KEEP_LATEST: int = int(os.environ.get("PLAN_RETENTION_KEEP_LATEST", 8))
+    PLAN_ARCHIVE_RETENTION_DAYS: int = int(os.environ.get("PLAN_ARCHIVE_RETENTION_DAYS", 0))
+
+    # Logged-in user snapshots cached per process (see principal.py). The TTL
+    # bounds how long another worker may serve a profile that was just
+    # changed; 0 loads the user on every request.
+    PRINCIPAL_CACHE_TTL: float = float(os.environ.get("PRINCIPAL_CACHE_TTL", 60))
+    PRINCIPAL_CACHE_SIZE: int = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 4096))
+
+    # Local recipe catalog (see recipes.py): "fallback" builds the plan from
+    # it when the AI provider fails, "primary" always builds plans locally
+    # without calling the provider, "off" falls back to the sample plan.
+    RECIPE_CATALOG: str = os.environ.get("RECIPE_CATALOG", "fallback").lower()
+
     # Mail configuration. These settings are optional – if MAIL_SERVER is not
     # provided then the send_email function will simply print email contents
     # to stdout instead of attempting to send a real email. To enable real
@@ -44,6 +102,42 @@ class Config:
     ]
     MAIL_USERNAME: str | None = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD: str | None = os.environ.get("MAIL_PASSWORD")
+    # Optional per-domain SMTP routing used by the weekly digest job, written
+    # as "domain=host:port" pairs separated by semicolons. Recipients whose
+    # domain is not listed go through MAIL_SERVER.
+    MAIL_ROUTES: dict[str, str] = dict(
+        route.strip().split("=", 1)
+        for route in os.environ.get("MAIL_ROUTES", "").split(";")
+        if "=" in route
+    )
+    # Number of persistent SMTP connections the digest job opens per server.
+    MAIL_DIGEST_CONNECTIONS: int = int(os.environ.get("MAIL_DIGEST_CONNECTIONS", 2))
+    # Plans the digest job renders, sends and records per batch.
+    MAIL_DIGEST_BATCH_SIZE: int = int(os.environ.get("MAIL_DIGEST_BATCH_SIZE", 500))
+    # Level of the structured JSON logs written by instrumentation.py.
+    LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+    # Optional bearer token required to scrape /metrics.
+    METRICS_TOKEN: str | None = os.environ.get("METRICS_TOKEN")
+
+    # Per-request profiling (see profiling.py). Requests sending the token in
+    # the X-Profile header are profiled, plus a random PROFILING_SAMPLE_RATE
+    # share (0-1) of all requests. The token also protects /admin/profiles.
+    PROFILING_TOKEN: str | None = os.environ.get("PROFILING_TOKEN")
+    PROFILING_SAMPLE_RATE: float = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+    # "auto" uses pyinstrument when installed, "cprofile" forces cProfile.
+    PROFILING_ENGINE: str = os.environ.get("PROFILING_ENGINE", "auto")
+    PROFILING_DIR: str = os.environ.get("PROFILING_DIR") or os.path.join(BASE_DIR, "profiles")
+    # Number of stored profiles kept; older ones are deleted.
+    PROFILING_KEEP: int = int(os.environ.get("PROFILING_KEEP", 200))
+
+    # Count SQL statements per request (see query_stats.py) and report them in
+    # X-DB-* response headers and a toolbar on every page. Meant for
+    # development; statements repeated QUERY_STATS_N_PLUS_ONE times in one
+    # request are logged as suspected N+1 queries.
+    QUERY_STATS: bool = os.environ.get("QUERY_STATS", "false").lower() in ["true", "1", "t"]
+    QUERY_STATS_N_PLUS_ONE: int = int(os.environ.get("QUERY_STATS_N_PLUS_ONE", 3))
+
     # Administrative email address used for notifications. Not currently used
     # but left here for future expansion.
     ADMINS: list[str] = (
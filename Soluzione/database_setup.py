@@ -4,8 +4,49 @@ This script can be used to initialize the database with tables.
 """
 
 import os
+from sqlalchemy import func, inspect, select, text
+
 from app import create_app
-from models import db
+from models import db, Plan
+from recipes import sync_catalog
+
+def add_missing_columns() -> list[str]:
+    """Add the nullable columns defined on the models but missing from existing tables.
+
+    create_all does not alter tables, so columns added to a model later (e.g.
+    the household of ``User``) would be missing from an older database.
+    Returns the columns added, as "table.column".
+    """
+    inspector = inspect(db.engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            added.append(f"{table.name}.{column.name}")
+    db.session.commit()
+    return added
+
+
+def drop_duplicate_plans() -> int:
+    """Delete all but the latest plan of each user and week; return how many went.
+
+    Concurrent generations could store two plans for a week before the
+    unique index on ``plan (user_id, start_date)``, which cannot be created
+    over them.
+    """
+    latest = select(func.max(Plan.id)).group_by(Plan.user_id, Plan.start_date)
+    duplicates = Plan.query.filter(Plan.id.not_in(latest)).all()
+    for plan in duplicates:
+        db.session.delete(plan)
+    db.session.commit()
+    return len(duplicates)
+
 
 def setup_database():
     """Create all database tables."""
@@ -14,7 +55,16 @@ def setup_database():
     with app.app_context():
         # Create all tables
         db.create_all()
+        for column in add_missing_columns():
+            print(f"➕ Column added: {column}")
+        print(f"🧹 Duplicate plans removed: {drop_duplicate_plans()}")
+        # create_all skips existing tables, including indexes added to them
+        # later (e.g. the plan history index).
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
         print("✅ Database tables created successfully!")
+        print(f"📚 Recipe catalog loaded: {sync_catalog()} recipes")
         
         # Print some info
         print(f"📊 Database URL: {app.config['SQLALCHEMY_DATABASE_URI']}")
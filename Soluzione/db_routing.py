@@ -0,0 +1,82 @@
+"""
+Read-replica routing for the SQLAlchemy session.
+
+When a replica is configured (``REPLICA_DATABASE_URI``), views decorated
+with ``read_only`` run their queries against it, taking load off the
+primary database. Everything else, including every flush and any query
+issued while the session has pending writes, keeps using the primary. The
+replica engine uses the same pool options (``SQLALCHEMY_ENGINE_OPTIONS``)
+as the primary.
+
+Replicas lag behind the primary, so a user who has just written (e.g.
+generated a plan and got redirected to ``/plan``) must not be served stale
+data: every flush marks the user's session as "sticky" for
+``REPLICA_STICKY_SECONDS``, during which read-only views stay on the
+primary too. Without a replica, ``read_only`` changes nothing.
+"""
+
+from __future__ import annotations
+
+import time
+from functools import wraps
+from typing import Any, Callable
+
+from flask import Flask, current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+_EXTENSION = "fame_replica_engine"
+_STICKY_KEY = "_db_primary_until"
+
+
+class RoutingSession(Session):
+    """Session sending the reads of ``read_only`` views to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs: Any):
+        if bind is None and not self._flushing and _use_replica():
+            engine = current_app.extensions.get(_EXTENSION)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica() -> bool:
+    if not (has_request_context() and g.get("db_read_only")):
+        return False
+    return session.get(_STICKY_KEY, 0) < time.time()
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _stick_to_primary(db_session, flush_context) -> None:
+    if has_request_context():
+        sticky = current_app.config.get("REPLICA_STICKY_SECONDS", 5)
+        session[_STICKY_KEY] = time.time() + sticky
+
+
+def read_only(view: Callable) -> Callable:
+    """Run ``view`` against the replica bind when one is configured."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = g.get("db_read_only", False)
+        g.db_read_only = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.db_read_only = previous
+
+    return wrapper
+
+
+def init_app(app: Flask) -> None:
+    """Create the replica engine when ``REPLICA_DATABASE_URI`` is set."""
+    url = app.config.get("REPLICA_DATABASE_URI")
+    if url:
+        app.extensions[_EXTENSION] = create_engine(
+            url, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        )
+
+
+def replica_engine(app: Flask):
+    """Return the replica engine of ``app``, or ``None``."""
+    return app.extensions.get(_EXTENSION)
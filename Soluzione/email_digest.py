@@ -0,0 +1,303 @@
+"""
+Weekly shopping-list digest sender.
+
+``send_email`` opens a new SMTP connection (and TLS handshake and login) for
+every message, which is fine for the occasional "send to a friend" but not
+for mailing thousands of plans after the Sunday batch run. This job renders
+one message per plan of the target week, groups recipients by the SMTP
+server that handles their domain and delivers each group over a small number
+of persistent connections. Plans are rendered, sent and recorded in batches
+of ``MAIL_DIGEST_BATCH_SIZE``: the outcome for every recipient is stored in
+``EmailDelivery`` and committed after each batch, so a rerun, even after a
+crash, only retries what failed or was not sent yet.
+
+Usage:
+    python email_digest.py [--start-date 2025-01-06] [--connections 2]
+"""
+
+from __future__ import annotations
+
+import argparse
+import html
+import re
+import smtplib
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Iterable, Iterator
+
+from flask import current_app
+
+from instrumentation import span
+from metrics import EMAIL_QUEUE_DEPTH
+from models import db, EmailDelivery, Plan, User
+from rendering import render_digest_html
+from utils import next_plan_start_date
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+@dataclass(frozen=True)
+class DigestMessage:
+    """A rendered digest email for a single recipient."""
+
+    plan_id: int
+    recipient: str
+    subject: str
+    text_body: str
+    html_body: str
+
+    def as_mime(self, sender: str) -> MIMEMultipart:
+        message = MIMEMultipart("alternative")
+        message["Subject"] = self.subject
+        message["From"] = sender
+        message["To"] = self.recipient
+        message.attach(MIMEText(self.text_body, "plain", "utf-8"))
+        message.attach(MIMEText(self.html_body, "html", "utf-8"))
+        return message
+
+
+@dataclass
+class DigestReport:
+    """Per-recipient outcome of a digest run."""
+
+    sent: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+
+
+def html_to_text(fragment: str) -> str:
+    """Strip the markup of a shopping-list fragment, keeping one item per line."""
+    text = html.unescape(_TAG_RE.sub("\n", fragment))
+    lines = (line.strip() for line in text.splitlines())
+    return _BLANK_LINES_RE.sub("\n", "\n".join(line for line in lines if line))
+
+
+def render_message(plan: Plan, username: str, recipient: str) -> DigestMessage:
+    """Render the digest email of ``plan`` for ``recipient``."""
+    subject = f"Your Shopping List for week starting {plan.start_date.isoformat()}"
+    text_body = (
+        f"Hello {username},\n\nHere is your meal plan:\n\n{plan.content}\n\n"
+        f"Shopping List:\n{html_to_text(plan.shopping_list)}\n\nEnjoy your meals!"
+    )
+    html_body = render_digest_html(username, plan.content, plan.shopping_list)
+    return DigestMessage(plan.id, recipient, subject, text_body, html_body)
+
+
+def iter_digest_batches(start_date: date, batch_size: int = 500) -> Iterator[list[DigestMessage]]:
+    """Yield the messages for the plans of ``start_date`` not yet delivered, a page of plans at a time.
+
+    Pages are read by plan id, so the caller can commit between them.
+    """
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(Plan, User.username, User.email)
+            .join(User, User.id == Plan.user_id)
+            .filter(Plan.start_date == start_date, Plan.id > last_id)
+            .order_by(Plan.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0].id
+        delivered = set(
+            db.session.query(EmailDelivery.plan_id, EmailDelivery.recipient).filter(
+                EmailDelivery.plan_id.in_([plan.id for plan, _, _ in rows]),
+                EmailDelivery.status == "sent",
+            )
+        )
+        messages = [
+            render_message(plan, username, email)
+            for plan, username, email in rows
+            if (plan.id, email) not in delivered
+        ]
+        if messages:
+            yield messages
+
+
+def iter_digest_messages(start_date: date) -> Iterable[DigestMessage]:
+    """Yield a message for every plan of ``start_date`` not yet delivered."""
+    for messages in iter_digest_batches(start_date):
+        yield from messages
+
+
+def smtp_route(recipient: str, routes: dict[str, str], default: tuple[str, int]) -> tuple[str, int]:
+    """Return the ``(host, port)`` of the SMTP server handling ``recipient``."""
+    domain = recipient.rpartition("@")[2].lower()
+    target = routes.get(domain)
+    if not target:
+        return default
+    host, _, port = target.partition(":")
+    return host, int(port or default[1])
+
+
+class SMTPConnection:
+    """A lazily (re)opened SMTP connection reused across many messages."""
+
+    def __init__(self, host: str, port: int, settings: dict) -> None:
+        self.host = host
+        self.port = port
+        self.settings = settings
+        self.server: smtplib.SMTP | None = None
+
+    def _open(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.settings.get("MAIL_USE_TLS"):
+            server.starttls(context=ssl.create_default_context())
+        username = self.settings.get("MAIL_USERNAME")
+        password = self.settings.get("MAIL_PASSWORD")
+        if username and password:
+            server.login(username, password)
+        return server
+
+    def send(self, sender: str, message: DigestMessage) -> None:
+        payload = message.as_mime(sender).as_string()
+        for attempt in range(2):
+            if self.server is None:
+                self.server = self._open()
+            try:
+                self.server.sendmail(sender, [message.recipient], payload)
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped an idle connection: reopen once and retry.
+                self.server = None
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                pass
+            self.server = None
+
+
+def _deliver(
+    connection: SMTPConnection, sender: str, messages: list[DigestMessage]
+) -> list[tuple[DigestMessage, str | None]]:
+    outcomes = []
+    with span("email_send", server=connection.host, messages=len(messages)):
+        for message in messages:
+            try:
+                connection.send(sender, message)
+                outcomes.append((message, None))
+            except (smtplib.SMTPException, OSError) as exc:
+                outcomes.append((message, str(exc) or exc.__class__.__name__))
+                if not isinstance(exc, smtplib.SMTPRecipientsRefused):
+                    connection.close()
+            finally:
+                EMAIL_QUEUE_DEPTH.dec()
+    return outcomes
+
+
+def record_outcomes(outcomes: list[tuple[DigestMessage, str | None]]) -> None:
+    """Upsert the ``EmailDelivery`` rows of a digest batch in one transaction."""
+    plan_ids = {message.plan_id for message, _ in outcomes}
+    existing = {
+        (row.plan_id, row.recipient): row
+        for row in EmailDelivery.query.filter(EmailDelivery.plan_id.in_(plan_ids))
+    }
+    for message, error in outcomes:
+        row = existing.get((message.plan_id, message.recipient))
+        if row is None:
+            row = EmailDelivery(plan_id=message.plan_id, recipient=message.recipient, attempts=0)
+            db.session.add(row)
+        row.status = "failed" if error else "sent"
+        row.error = error
+        row.attempts += 1
+    db.session.commit()
+
+
+def send_digest(
+    start_date: date | None = None, connections: int | None = None, batch_size: int | None = None
+) -> DigestReport:
+    """Send the weekly digest for ``start_date`` and record delivery status.
+
+    Must be called inside an application context with ``MAIL_SERVER`` set.
+
+    Args:
+        start_date: Monday of the week whose plans are mailed, next Monday by default.
+        connections: Persistent connections per SMTP server, defaults to
+            ``MAIL_DIGEST_CONNECTIONS``.
+        batch_size: Plans sent and recorded per batch, defaults to
+            ``MAIL_DIGEST_BATCH_SIZE``.
+
+    Returns:
+        A ``DigestReport`` listing sent and failed recipients.
+    """
+    settings = current_app.config
+    if not settings.get("MAIL_SERVER"):
+        raise RuntimeError("MAIL_SERVER must be configured to send the digest")
+    start_date = start_date or next_plan_start_date()
+    connections = max(1, connections or settings.get("MAIL_DIGEST_CONNECTIONS", 2))
+    batch_size = max(1, batch_size or settings.get("MAIL_DIGEST_BATCH_SIZE", 500))
+    default_route = (settings["MAIL_SERVER"], int(settings.get("MAIL_PORT", 25)))
+    routes = settings.get("MAIL_ROUTES") or {}
+    sender = settings.get("MAIL_USERNAME") or "no-reply@example.com"
+
+    report = DigestReport()
+    # Connections stay open across batches: (host, port, slot) -> connection.
+    pool_connections: dict[tuple[str, int, int], SMTPConnection] = {}
+    workers = connections * (len(set(routes.values())) + 1)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for batch in iter_digest_batches(start_date, batch_size):
+                groups: dict[tuple[str, int], list[DigestMessage]] = {}
+                for message in batch:
+                    groups.setdefault(smtp_route(message.recipient, routes, default_route), []).append(message)
+                EMAIL_QUEUE_DEPTH.inc(len(batch))
+                futures = []
+                for (host, port), messages in groups.items():
+                    for i in range(connections):
+                        if not messages[i::connections]:
+                            continue
+                        connection = pool_connections.get((host, port, i))
+                        if connection is None:
+                            connection = pool_connections[host, port, i] = SMTPConnection(host, port, settings)
+                        futures.append(pool.submit(_deliver, connection, sender, messages[i::connections]))
+                outcomes, error = [], None
+                for future in futures:
+                    try:
+                        outcomes.extend(future.result())
+                    except Exception as exc:
+                        error = error or exc
+                # What was sent is recorded even if a worker crashed.
+                record_outcomes(outcomes)
+                if error is not None:
+                    raise error
+                for message, error in outcomes:
+                    if error:
+                        report.failed[message.recipient] = error
+                    else:
+                        report.sent.append(message.recipient)
+    finally:
+        for connection in pool_connections.values():
+            connection.close()
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Send the weekly shopping-list digest.")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None)
+    parser.add_argument("--connections", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        report = send_digest(args.start_date, args.connections)
+    print(f"📧 Inviate: {len(report.sent)} • fallite: {len(report.failed)}")
+    for recipient, error in report.failed.items():
+        print(f"❌ {recipient}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Streamed exports of a plan: shopping list as CSV and PDF, meals as ICS.
+
+The shopping list used to exist only as the HTML fragment stored on the
+plan. These generators build the exports from the structured plan data and
+yield them in chunks, so a long list is never held as one document while it
+is produced: CSV rows are flushed every ``_CSV_ROWS`` rows, the PDF is
+written one page at a time (objects first, the page tree and cross-reference
+table at the end) and the calendar one event at a time.
+
+``cached`` wraps a generator with an LRU cache keyed by the export kind and
+the plan version (a digest of the data it is built from): a repeated
+download of an unchanged plan is served from memory. Exports larger than
+``CACHE_MAX_BYTES`` are streamed every time instead of being kept.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+from ingredients import FOODS, parse_item
+from instrumentation import span
+from rendering import DAYS, MEAL_TYPES, SHOPPING_CATEGORIES, plan_version
+
+CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", 256 * 1024))
+_CACHE_SIZE = 128
+_CSV_ROWS = 100
+
+# Local start time and duration in minutes of each meal in the calendar.
+MEAL_TIMES = {
+    "breakfast": ((8, 0), 30),
+    "lunch": ((13, 0), 60),
+    "snack": ((16, 30), 15),
+    "dinner": ((20, 0), 60),
+}
+
+_cache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def export_version(kind: str, *data) -> str:
+    """Return the version of an export built from ``data``, used as ETag."""
+    return plan_version([kind, *data])
+
+
+def cached(kind: str, version: str, build: Callable[[], Iterable[bytes]]) -> Iterator[bytes]:
+    """Yield the chunks of an export, from the cache when already built."""
+    key = (kind, version)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            body = _cache[key]
+        else:
+            body = None
+    if body is not None:
+        yield body
+        return
+    chunks, size = [], 0
+    with span("export", kind=kind):
+        for chunk in build():
+            size += len(chunk)
+            if size <= CACHE_MAX_BYTES:
+                chunks.append(chunk)
+            yield chunk
+    if size <= CACHE_MAX_BYTES:
+        with _cache_lock:
+            _cache[key] = b"".join(chunks)
+            if len(_cache) > _CACHE_SIZE:
+                _cache.popitem(last=False)
+
+
+def clear_cache() -> None:
+    """Drop every cached export (used by tests)."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _sections(shopping_list: dict) -> Iterator[tuple[str, list[str]]]:
+    for category, info in SHOPPING_CATEGORIES.items():
+        items = shopping_list.get(category)
+        if isinstance(items, list) and items:
+            yield info["name"], [str(item) for item in items]
+
+
+def _amount(quantity: float | None) -> str:
+    return "" if quantity is None else f"{quantity:.1f}".rstrip("0").rstrip(".")
+
+
+def shopping_csv(shopping_list: dict) -> Iterator[bytes]:
+    """Yield the shopping list as CSV: category, item, quantity, unit, food."""
+    buffer = io.StringIO()
+    # The BOM lets spreadsheet programs detect UTF-8.
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\r\n")
+    writer.writerow(["categoria", "articolo", "quantita", "unita", "alimento"])
+    rows = 0
+    for section, items in _sections(shopping_list):
+        for text in items:
+            item = parse_item(text)
+            food = FOODS[item.id] if item.id is not None else ""
+            writer.writerow([section, item.name, _amount(item.quantity), item.unit or "", food])
+            rows += 1
+            if rows % _CSV_ROWS == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+# PDF layout, in points (A4 page).
+_PAGE_WIDTH, _PAGE_HEIGHT = 595, 842
+_MARGIN = 56
+_LEADING = 16
+_LINE_CHARS = 88
+_LINES_PER_PAGE = (_PAGE_HEIGHT - 2 * _MARGIN) // _LEADING
+
+
+def _pdf_text(text: str) -> str:
+    encoded = text.encode("cp1252", errors="replace").decode("latin-1")
+    return encoded.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_lines(title: str, shopping_list: dict) -> Iterator[tuple[str, str]]:
+    yield "F2", title
+    yield "F1", ""
+    for section, items in _sections(shopping_list):
+        yield "F2", section
+        for item in items:
+            text = f"[  ] {item}"
+            while len(text) > _LINE_CHARS:
+                yield "F1", text[:_LINE_CHARS]
+                text = "     " + text[_LINE_CHARS:]
+            yield "F1", text
+        yield "F1", ""
+
+
+def shopping_pdf(title: str, shopping_list: dict) -> Iterator[bytes]:
+    """Yield the shopping list as a PDF with a checkbox per item.
+
+    Only the standard Helvetica fonts are used, so nothing is embedded;
+    characters they lack (such as emoji) are replaced.
+    """
+    offsets: dict[int, int] = {}
+    position = 0
+
+    def write(number: int, body: bytes) -> bytes:
+        nonlocal position
+        offsets[number] = position
+        data = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        position += len(data)
+        return data
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    # 1: catalog, 2: page tree, 3-4: fonts; pages follow in pairs.
+    yield write(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    yield write(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+    pages: list[int] = []
+    lines = _pdf_lines(title, shopping_list)
+    while True:
+        page = list(islice(lines, _LINES_PER_PAGE))
+        if not page:
+            break
+        number = 5 + 2 * len(pages)
+        commands = [f"BT {_LEADING} TL {_MARGIN} {_PAGE_HEIGHT - _MARGIN} Td"]
+        for font, text in page:
+            commands.append(f"/{font} {14 if font == 'F2' else 11} Tf ({_pdf_text(text)}) Tj T*")
+        commands.append("ET")
+        content = "\n".join(commands).encode("latin-1")
+        yield write(number, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        yield write(
+            number + 1,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (_PAGE_WIDTH, _PAGE_HEIGHT, number),
+        )
+        pages.append(number + 1)
+    kids = " ".join(f"{page} 0 R" for page in pages).encode("ascii")
+    yield write(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(pages)))
+    yield write(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    count = max(offsets) + 1
+    xref = [b"xref\n0 %d\n" % count, b"0000000000 65535 f \n"]
+    xref.extend(b"%010d 00000 n \n" % offsets[number] for number in range(1, count))
+    yield b"".join(xref) + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, position)
+
+
+def _ics_text(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> bytes:
+    """Return ``line`` folded at 75 octets, as RFC 5545 requires."""
+    data = line.encode("utf-8")
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        # Do not split a multi-byte character.
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+    parts.append(data)
+    return b"\r\n ".join(parts) + b"\r\n"
+
+
+def meals_ics(plan_id: int, weekly_plan: dict, start_date: date, created_at: datetime | None) -> Iterator[bytes]:
+    """Yield the meals of ``weekly_plan`` as an iCalendar feed, one event each.
+
+    Times are floating (the user's local time), so no time zone is needed.
+    """
+    stamp = (created_at or datetime.combine(start_date, datetime.min.time())).strftime("%Y%m%dT%H%M%SZ")
+    name = f"Piano FAME dal {start_date.strftime('%d/%m/%Y')}"
+    yield b"".join(
+        _fold(line)
+        for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//FAME//Piano settimanale//IT",
+            "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{_ics_text(name)}",
+        )
+    )
+    for offset, (day, _) in enumerate(DAYS):
+        meals = weekly_plan.get(day)
+        if not isinstance(meals, dict):
+            continue
+        for meal_type, label, _, _ in MEAL_TYPES:
+            meal = meals.get(meal_type)
+            if not isinstance(meal, dict):
+                continue
+            (hour, minute), duration = MEAL_TIMES[meal_type]
+            begin = datetime.combine(start_date + timedelta(days=offset), datetime.min.time()).replace(
+                hour=hour, minute=minute
+            )
+            summary = f"{label}: {meal.get('title') or ''}"
+            description = "\n".join(
+                part for part in (meal.get("description"), meal.get("focus")) if part
+            )
+            yield b"".join(
+                _fold(line)
+                for line in (
+                    "BEGIN:VEVENT",
+                    f"UID:plan-{plan_id}-{day}-{meal_type}@fame",
+                    f"DTSTAMP:{stamp}",
+                    f"DTSTART:{begin.strftime('%Y%m%dT%H%M%S')}",
+                    f"DTEND:{(begin + timedelta(minutes=duration)).strftime('%Y%m%dT%H%M%S')}",
+                    f"SUMMARY:{_ics_text(summary)}",
+                    f"DESCRIPTION:{_ics_text(description)}",
+                    "END:VEVENT",
+                )
+            )
+    yield b"END:VCALENDAR\r\n"
@@ -0,0 +1,71 @@
+"""
+Keyset pagination over a user's plan history.
+
+Pages are ordered from the newest plan to the oldest by ``(created_at, id)``
+and served by the ``(user_id, created_at)`` index: the next page starts
+right after the last row of the previous one, so every page costs one index
+range scan no matter how deep into the history it is (``OFFSET`` would
+scan and discard every earlier row). The position is handed to clients as
+an opaque cursor. Only the small columns are loaded; the plan text and JSON
+stay on disk until a single plan is opened.
+"""
+
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import load_only
+
+from models import db, Plan
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(plan: Plan) -> str:
+    """Return the cursor of the page starting after ``plan``."""
+    raw = f"{plan.created_at.isoformat()}|{plan.id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Return the ``(created_at, id)`` position encoded in ``cursor``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        created_at, plan_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(plan_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def plan_history_page(
+    user_id: int, limit: int, cursor: str | None = None
+) -> tuple[list[Plan], str | None]:
+    """Return one page of ``user_id``'s plans and the cursor of the next page.
+
+    Raises:
+        InvalidCursor: if ``cursor`` was not produced by ``encode_cursor``.
+    """
+    query = (
+        select(Plan)
+        .options(load_only(Plan.id, Plan.user_id, Plan.start_date, Plan.created_at))
+        .where(Plan.user_id == user_id)
+        .order_by(Plan.created_at.desc(), Plan.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, plan_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Plan.created_at < created_at,
+                and_(Plan.created_at == created_at, Plan.id < plan_id),
+            )
+        )
+    plans = list(db.session.scalars(query))
+    if len(plans) <= limit:
+        return plans, None
+    plans = plans[:limit]
+    return plans, encode_cursor(plans[-1])
@@ -0,0 +1,212 @@
+"""
+Household size and member profiles, and local rescaling of plans to them.
+
+Servings used to be whatever the provider wrote (``MEAL_TYPES`` gives 2 at
+lunch and 3 at dinner when it wrote none) and the shopping quantities
+ignored who actually eats. A user now stores the members of the household
+by profile (``User.household_members``, a JSON list of ``PROFILES`` keys,
+with their number in ``User.household_size``). Each profile eats a share of
+an adult portion, so two adults and a child eat 2.6 portions per meal.
+
+``scale_plan`` fits an existing plan to a household without asking the
+provider: every meal gets one serving per member and each shopping quantity
+is multiplied by the portions the household eats per meal over those the
+list was written for. The list and servings as first written are kept in
+``plan_data["household"]`` and every rescale starts from them, so changing
+the household back and forth does not pile up rounding, and clearing it
+restores them.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass
+from datetime import date
+from typing import Mapping
+
+from ingredients import format_item, parse_item
+from models import Plan
+from rendering import MEAL_TYPES, render_shopping_list, render_weekly_plan
+
+# Profile key -> (form label, singular, plural, share of an adult portion).
+PROFILES = {
+    "adult": ("Adulti", "adulto", "adulti", 1.0),
+    "teen": ("Ragazzi (12-17 anni)", "ragazzo", "ragazzi", 1.0),
+    "child": ("Bambini (4-11 anni)", "bambino", "bambini", 0.6),
+    "senior": ("Anziani (oltre 75 anni)", "anziano", "anziani", 0.8),
+}
+MAX_MEMBERS = 12
+
+_DEFAULT_SERVINGS = {meal_type: servings for meal_type, _, _, servings in MEAL_TYPES}
+
+
+@dataclass(frozen=True)
+class Household:
+    """The members of a household, one profile key each, in ``PROFILES`` order."""
+
+    members: tuple[str, ...]
+
+    @classmethod
+    def from_counts(cls, counts: Mapping[str, int]) -> Household | None:
+        """Return the household with ``counts[key]`` members of each profile, None when empty."""
+        members: list[str] = []
+        for key in PROFILES:
+            members.extend([key] * max(0, int(counts.get(key) or 0)))
+        return cls(tuple(members[:MAX_MEMBERS])) if members else None
+
+    @property
+    def people(self) -> int:
+        return len(self.members)
+
+    @property
+    def portions(self) -> float:
+        """Adult portions eaten per meal."""
+        return round(sum(PROFILES[key][3] for key in self.members), 2)
+
+    def counts(self) -> dict[str, int]:
+        return {key: self.members.count(key) for key in PROFILES}
+
+    def describe(self) -> str:
+        """Return the household in Italian, e.g. "3 persone (2 adulti, 1 bambino)"."""
+        parts = [
+            f"{count} {PROFILES[key][1] if count == 1 else PROFILES[key][2]}"
+            for key, count in self.counts().items()
+            if count
+        ]
+        people = "1 persona" if self.people == 1 else f"{self.people} persone"
+        return f"{people} ({', '.join(parts)})"
+
+    def to_json(self) -> str:
+        return json.dumps(list(self.members))
+
+
+def household_of(user) -> Household | None:
+    """Return the household of ``user`` (a ``User`` or its principal), None when not set.
+
+    A size without member profiles counts as that many adults.
+    """
+    try:
+        members = json.loads(user.household_members or "[]")
+    except (json.JSONDecodeError, TypeError):
+        members = []
+    if not isinstance(members, list):
+        members = []
+    counts = {key: members.count(key) for key in PROFILES}
+    if not any(counts.values()) and user.household_size:
+        counts["adult"] = user.household_size
+    return Household.from_counts(counts)
+
+
+def prompt_section(household: Household | None) -> str:
+    """Return the household lines for the prompt, or "" when it is not set."""
+    if household is None:
+        return ""
+    return (
+        f"NUCLEO FAMILIARE:\n{household.describe()}. Indica \"servings\": {household.people} "
+        f"in ogni pasto e calcola le quantità della lista della spesa per {household.people} "
+        "porzioni da adulto a pasto.\n\n"
+    )
+
+
+def _round(quantity: float, unit: str | None) -> float:
+    if unit in ("g", "ml"):
+        step = 5 if quantity < 100 else 10 if quantity < 1000 else 50
+        return max(step, round(quantity / step) * step)
+    # Pieces, cans and the like: round up, ignoring a small excess.
+    return max(1, math.ceil(quantity - 0.25))
+
+
+def scale_item(text: str, factor: float) -> str:
+    """Return the shopping item ``text`` with its quantity multiplied by ``factor``.
+
+    Items without a quantity ("basilico fresco", "sale q.b.") are kept as they are.
+    """
+    item = parse_item(text)
+    if item.quantity is None or factor == 1:
+        return text
+    return format_item(item._replace(quantity=_round(item.quantity * factor, item.unit)))
+
+
+def _servings(meal_type: str, meal: dict) -> int:
+    servings = meal.get("servings")
+    if isinstance(servings, int) and not isinstance(servings, bool) and servings > 0:
+        return servings
+    return _DEFAULT_SERVINGS.get(meal_type, 1)
+
+
+def scale_plan(plan_data: dict, household: Household | None) -> bool:
+    """Fit ``plan_data`` to ``household`` in place; return whether anything changed.
+
+    With ``household`` None the plan gets back the shopping list and
+    servings it was first written with.
+    """
+    weekly_plan = plan_data.get("weekly_plan")
+    meals = [
+        (meal_type, meal)
+        for day_meals in (weekly_plan.values() if isinstance(weekly_plan, dict) else ())
+        if isinstance(day_meals, dict)
+        for meal_type, meal in day_meals.items()
+        if isinstance(meal, dict)
+    ]
+    if not meals:
+        return False
+    base = plan_data.get("household")
+    if household is None:
+        if not isinstance(base, dict):
+            return False
+        if isinstance(base.get("shopping_list"), dict) and base["shopping_list"]:
+            plan_data["shopping_list"] = base["shopping_list"]
+        servings = base.get("servings")
+        if not isinstance(servings, list) or len(servings) != len(meals):
+            # Scaled before the servings were kept: the defaults apply.
+            servings = [None] * len(meals)
+        for (_, meal), meal_servings in zip(meals, servings):
+            if meal_servings is None:
+                meal.pop("servings", None)
+            else:
+                meal["servings"] = meal_servings
+        del plan_data["household"]
+        return True
+    if not isinstance(base, dict) or not isinstance(base.get("shopping_list"), dict) or not base.get("portions"):
+        shopping_list = plan_data.get("shopping_list")
+        base = {
+            # Portions per meal the list was written for.
+            "portions": sum(_servings(meal_type, meal) for meal_type, meal in meals) / len(meals),
+            "servings": [meal.get("servings") for _, meal in meals],
+            "shopping_list": shopping_list if isinstance(shopping_list, dict) else {},
+        }
+    before = json.dumps([plan_data.get("shopping_list"), [meal.get("servings") for _, meal in meals]])
+    for _, meal in meals:
+        meal["servings"] = household.people
+    factor = household.portions / base["portions"]
+    if base["shopping_list"]:
+        plan_data["shopping_list"] = {
+            category: [scale_item(text, factor) if isinstance(text, str) else text for text in items]
+            if isinstance(items, list)
+            else items
+            for category, items in base["shopping_list"].items()
+        }
+    plan_data["household"] = {**base, "members": list(household.members)}
+    return before != json.dumps([plan_data.get("shopping_list"), [meal.get("servings") for _, meal in meals]])
+
+
+def rescale_plans(user_id: int, household: Household | None, since: date) -> int:
+    """Fit the user's plans starting on or after ``since`` to ``household``.
+
+    With ``household`` None the plans are restored as first written (see
+    ``scale_plan``). Returns the number of plans changed; the caller commits.
+    """
+    changed = 0
+    for plan in Plan.query.filter(Plan.user_id == user_id, Plan.start_date >= since):
+        try:
+            plan_data = json.loads(plan.json_content or "{}")
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(plan_data, dict) or not scale_plan(plan_data, household):
+            continue
+        plan.json_content = json.dumps(plan_data, ensure_ascii=False)
+        plan.content = render_weekly_plan(plan_data.get("weekly_plan") or {})
+        plan.shopping_list = render_shopping_list(plan_data.get("shopping_list") or {})
+        changed += 1
+    return changed
@@ -0,0 +1,194 @@
+"""
+Ingredient lexicon and parser for shopping items and meal ingredients.
+
+Shopping items such as "pomodorini 500g", "limoni 4 pz" or "tonno in scatola
+2 pz" used to be opaque strings. The lexicon is compiled at import from the
+foods of ``data/food_composition.json`` (names and aliases, with the last
+word also in the other number, e.g. "limone"/"limoni") into a word trie, and
+an ingredient id is the food's row in that table, shared with nutrition.py.
+``find_foods`` returns the longest names found in a text.
+
+``parse_item`` turns one string into an ``Item``: ingredient id (None when
+unknown), quantity and canonical unit (grams and millilitres for weights and
+volumes, "pz" for pieces, the container name for cans, jars and the like).
+Results are cached per distinct string, so the same item in many plans is
+parsed once. ``merge_items`` uses them to add up repeated items of a
+shopping list.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+from seasonality import normalize
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "food_composition.json"
+)
+_CACHE_SIZE = 8192
+
+# Unit word -> (canonical unit, factor to it).
+UNITS: dict[str, tuple[str, float]] = {
+    "g": ("g", 1), "gr": ("g", 1), "grammi": ("g", 1), "grammo": ("g", 1),
+    "hg": ("g", 100), "etto": ("g", 100), "etti": ("g", 100),
+    "kg": ("g", 1000), "chilo": ("g", 1000), "chili": ("g", 1000),
+    "ml": ("ml", 1), "cl": ("ml", 10), "dl": ("ml", 100),
+    "l": ("ml", 1000), "lt": ("ml", 1000), "litro": ("ml", 1000), "litri": ("ml", 1000),
+    "pz": ("pz", 1), "pezzo": ("pz", 1), "pezzi": ("pz", 1), "n": ("pz", 1),
+    "spicchio": ("spicchi", 1), "spicchi": ("spicchi", 1),
+    "mazzo": ("mazzi", 1), "mazzi": ("mazzi", 1), "mazzetto": ("mazzi", 1),
+    "cespo": ("cespi", 1), "cespi": ("cespi", 1),
+    "scatola": ("scatole", 1), "scatole": ("scatole", 1),
+    "scatoletta": ("scatole", 1), "scatolette": ("scatole", 1),
+    "barattolo": ("barattoli", 1), "barattoli": ("barattoli", 1),
+    "vasetto": ("vasetti", 1), "vasetti": ("vasetti", 1),
+    "confezione": ("confezioni", 1), "confezioni": ("confezioni", 1),
+    "bottiglia": ("bottiglie", 1), "bottiglie": ("bottiglie", 1),
+    "busta": ("buste", 1), "buste": ("buste", 1), "bustina": ("buste", 1), "bustine": ("buste", 1),
+    "vaschetta": ("vaschette", 1), "vaschette": ("vaschette", 1),
+}
+_QUANTITY_RE = re.compile(r"(?<![\w.,])(\d+(?:[.,]\d+)?)(?:\s*/\s*(\d+))?\s*([a-z]+\b)?\.?", re.IGNORECASE)
+_AS_NEEDED_RE = re.compile(r"\bq\.?\s?b\.?(?!\w)|\bquanto basta\b", re.IGNORECASE)
+# Endings of the other grammatical number of the last word of a name.
+_NUMBER = {"o": "i", "a": "e", "e": "i", "i": "oe"}
+
+
+def _forms(name: str) -> list[str]:
+    head, _, last = name.rpartition(" ")
+    forms = [name]
+    if len(last) > 3 and "'" not in last:
+        stem = last[:-2] if last.endswith("io") else last[:-1]
+        endings = "i" if last.endswith("io") else _NUMBER.get(last[-1], "")
+        forms.extend(f"{head} {stem}{ending}".strip() for ending in endings)
+    return forms
+
+
+def _compile(path: str) -> tuple[list[str], tuple[str, ...], dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        foods = json.load(f)["foods"]
+    names = list(foods)
+    categories = tuple(foods[name]["category"] for name in names)
+    trie: dict = {}
+    # Names and aliases first, so the generated forms never replace them.
+    for generated in (False, True):
+        for index, name in enumerate(names):
+            for alias in (name, *foods[name]["aliases"]):
+                alias = normalize(alias)
+                for form in _forms(alias)[1:] if generated else [alias]:
+                    node = trie
+                    for word in form.split():
+                        node = node.setdefault(word, {})
+                    node.setdefault(None, index)
+    return names, categories, trie
+
+
+# ``FOODS[i]`` and ``CATEGORIES[i]`` are the name and shopping-list category
+# of ingredient id ``i``.
+FOODS, CATEGORIES, _TRIE = _compile(DATA_PATH)
+
+
+def _matches(words: list[str]):
+    """Yield ``(start, end, id)`` of the longest names in ``words``, left to right."""
+    start = 0
+    while start < len(words):
+        node, found = _TRIE, None
+        for end in range(start, len(words)):
+            node = node.get(words[end])
+            if node is None:
+                break
+            if None in node:
+                found = (end + 1, node[None])
+        if found is None:
+            start += 1
+        else:
+            yield start, found[0], found[1]
+            start = found[0]
+
+
+def find_foods(text: str) -> list[int]:
+    """Return the ingredient ids of the foods named in ``text``, longest names first."""
+    found: dict[int, None] = {}
+    for _, _, index in _matches(normalize(text or "").split()):
+        found.setdefault(index, None)
+    return list(found)
+
+
+class Item(NamedTuple):
+    """A parsed shopping item or ingredient."""
+
+    id: int | None
+    quantity: float | None
+    unit: str | None
+    # The text without the quantity, e.g. "pomodorini".
+    name: str
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def parse_item(text: str) -> Item:
+    """Return the ingredient, quantity and unit of ``text``.
+
+    A number without a unit counts pieces; "q.b." and similar give no
+    quantity.
+    """
+    quantity = unit = None
+    name = _AS_NEEDED_RE.sub(" ", text)
+    for match in _QUANTITY_RE.finditer(name):
+        value = float(match.group(1).replace(",", "."))
+        if match.group(2):
+            value /= float(match.group(2) or 1) or 1
+        if not value:
+            continue
+        word = (match.group(3) or "").lower()
+        # "2 cavolfiori": the word after the number is the food, not a unit.
+        end = match.end() if word in UNITS else match.end(2 if match.group(2) else 1)
+        unit, factor = UNITS.get(word, ("pz", 1))
+        quantity = value * factor
+        name = name[: match.start()] + name[end:]
+        break
+    name = " ".join(name.replace("()", " ").split()).strip(" -,:;")
+    ids = find_foods(name)
+    return Item(ids[0] if ids else None, quantity, unit, name)
+
+
+def format_item(item: Item) -> str:
+    """Return ``item`` as shopping-list text, e.g. "riso 1.2kg"."""
+    if item.quantity is None:
+        return item.name
+    quantity, unit = item.quantity, item.unit
+    if unit in ("g", "ml") and quantity >= 1000:
+        quantity, unit = quantity / 1000, "kg" if unit == "g" else "l"
+    amount = f"{quantity:.1f}".rstrip("0").rstrip(".")
+    if unit in ("g", "kg", "ml", "l"):
+        return f"{item.name} {amount}{unit}"
+    return f"{item.name} {amount} {unit}"
+
+
+def merge_items(shopping_list: dict) -> int:
+    """Add up, in place, items of ``shopping_list`` with the same ingredient and unit.
+
+    The merged item keeps the category and wording of its first occurrence.
+    Returns the number of items removed.
+    """
+    lists = [items for items in shopping_list.values() if isinstance(items, list)]
+    groups: dict[tuple[int, str | None], list[tuple[list, int, Item]]] = {}
+    for items in lists:
+        for position, text in enumerate(items):
+            item = parse_item(text) if isinstance(text, str) else None
+            if item is not None and item.id is not None:
+                groups.setdefault((item.id, item.unit), []).append((items, position, item))
+    dropped: set[tuple[int, int]] = set()
+    for entries in groups.values():
+        if len(entries) < 2:
+            continue
+        items, position, item = entries[0]
+        if item.unit is not None:
+            total = sum(entry[2].quantity or 0 for entry in entries)
+            items[position] = format_item(item._replace(quantity=total))
+        dropped.update((id(entry[0]), entry[1]) for entry in entries[1:])
+    for items in lists:
+        items[:] = [text for position, text in enumerate(items) if (id(items), position) not in dropped]
+    return len(dropped)
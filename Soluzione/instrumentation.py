@@ -0,0 +1,183 @@
+"""
+Structured logging, correlation ids and timing spans.
+
+Everything the application reports goes through the ``fame`` logger. Records
+are put on an in-memory queue by a ``QueueHandler`` and written as one JSON
+object per line by a ``QueueListener`` thread, so logging never blocks the
+request path on stdout. Each request gets a correlation id (taken from the
+``X-Request-ID`` header when the client sends one) that is attached to every
+record logged while serving it and echoed back in the response.
+
+``span()`` times a block of work (prompt build, provider call, JSON parse,
+DB write, email send, ...) and logs its duration. When the optional
+``opentelemetry-sdk`` and ``opentelemetry-exporter-otlp-proto-http``
+packages are installed and ``OTEL_EXPORTER_OTLP_ENDPOINT`` is set, the same
+spans are exported as OpenTelemetry traces to that collector.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from flask import Flask, g, request
+
+logger = logging.getLogger("fame")
+
+correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "correlation_id", default=None
+)
+
+_listener: logging.handlers.QueueListener | None = None
+_tracer = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            payload["correlation_id"] = record.correlation_id
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _CorrelationIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs on the calling thread, before the record crosses the queue.
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+def configure_logging(level: str | int = "INFO", stream=None) -> None:
+    """Route the ``fame`` logger through a queue to a JSON stream handler.
+
+    Calling it again only updates the level.
+    """
+    global _listener
+    logger.setLevel(level)
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_CorrelationIdFilter())
+    stream_handler = logging.StreamHandler(stream or sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    _configure_tracing()
+
+
+def _configure_tracing() -> None:
+    global _tracer
+    endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        log_event("tracing_disabled", level=logging.WARNING, reason="opentelemetry not installed")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": "fame"}))
+    provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces"))
+    )
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("fame")
+
+
+def log_event(event: str, level: int = logging.INFO, exc_info=None, **fields: Any) -> None:
+    """Log ``event`` with structured ``fields``."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict]:
+    """Time the enclosed block and log it as a ``span`` event.
+
+    The yielded dict can be filled with attributes only known at the end of
+    the block (e.g. a status code); they are logged with the duration.
+    """
+    extra: dict[str, Any] = {}
+    otel_span = _tracer.start_as_current_span(name, attributes=attributes) if _tracer else None
+    current = otel_span.__enter__() if otel_span else None
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield extra
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        if current is not None:
+            for key, value in extra.items():
+                current.set_attribute(key, value if isinstance(value, (str, int, float, bool)) else str(value))
+            otel_span.__exit__(None, None, None)
+        log_event(
+            "span", name=name, duration_ms=duration_ms, status=status, **attributes, **extra
+        )
+
+
+def init_app(app: Flask) -> None:
+    """Assign correlation ids and log one structured line per request."""
+    configure_logging(app.config.get("LOG_LEVEL", "INFO"))
+
+    @app.before_request
+    def _start_request() -> None:
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.correlation_token = correlation_id.set(request_id)
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_request(response):
+        request_id = correlation_id.get()
+        if request_id:
+            response.headers["X-Request-ID"] = request_id
+        started = g.get("request_started")
+        if started is not None:
+            log_event(
+                "request",
+                method=request.method,
+                path=request.path,
+                endpoint=request.endpoint,
+                status=response.status_code,
+                duration_ms=round((time.perf_counter() - started) * 1000, 3),
+            )
+        return response
+
+    @app.teardown_request
+    def _reset_correlation_id(exc) -> None:
+        token = g.pop("correlation_token", None)
+        if token is not None:
+            try:
+                correlation_id.reset(token)
+            except ValueError:
+                # The token belongs to another context (e.g. a copied one).
+                correlation_id.set(None)
@@ -0,0 +1,177 @@
+"""
+Prometheus metrics for the generation, parsing and database hot paths.
+
+The collectors below are updated in place by ``utils``, ``app`` and the
+offline jobs, and exposed in the Prometheus text format on ``/metrics``.
+Updating a collector is a lock-protected addition, so instrumentation stays
+cheap on the request path. When ``PROMETHEUS_MULTIPROC_DIR`` is set (e.g.
+under gunicorn with several workers) the endpoint aggregates the values of
+all worker processes. Access can be restricted by setting ``METRICS_TOKEN``,
+which must then be sent as a bearer token.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from flask import Flask, Response, abort, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROVIDER_LATENCY = Histogram(
+    "fame_provider_request_seconds",
+    "Latency of AI provider HTTP calls.",
+    ["provider", "model", "status"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+PROVIDER_FALLBACK_DEPTH = Histogram(
+    "fame_provider_fallback_depth",
+    "Models tried before one answered (equal to the model count when all failed).",
+    ["provider"],
+    buckets=(0, 1, 2, 3, 4),
+)
+DUMMY_RESPONSES = Counter(
+    "fame_dummy_responses_total",
+    "Plans served from get_dummy_response() instead of a provider.",
+    ["provider", "reason"],
+)
+CATALOG_PLANS = Counter(
+    "fame_catalog_plans_total",
+    "Plans assembled from the local recipe catalog, by reason (primary or the provider failure).",
+    ["reason"],
+)
+PREPARATION_STEPS = Counter(
+    "fame_preparation_steps_total",
+    "Meals given preparation steps, by source (catalog or provider) or missing.",
+    ["source"],
+)
+PLAN_PARSE = Counter(
+    "fame_plan_parse_total",
+    "Provider responses by parse outcome (json or text_fallback).",
+    ["outcome"],
+)
+OUT_OF_SEASON_ITEMS = Counter(
+    "fame_out_of_season_items_total",
+    "Shopping-list produce out of season for the plan's region and week.",
+)
+SCREENING_VIOLATIONS = Counter(
+    "fame_screening_violations_total",
+    "Disliked foods found in generated plans, by outcome (regenerated, removed or unresolved).",
+    ["outcome"],
+)
+VARIETY_DUPLICATES = Counter(
+    "fame_variety_duplicates_total",
+    "Near-duplicate meals in generated plans, by what they repeat (plan or history).",
+    ["scope"],
+)
+PLAN_REQUESTS_SHARED = Counter(
+    "fame_plan_requests_shared_total",
+    "Plan generation requests served without a generation of their own, by reason (in_flight or idempotency_key).",
+    ["reason"],
+)
+PDF_PAGES = Counter("fame_pdf_pages_total", "PDF pages extracted from uploaded diets.")
+PDF_PAGES_PER_SECOND = Histogram(
+    "fame_pdf_pages_per_second",
+    "Text extraction throughput of uploaded PDF diets.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500),
+)
+DB_QUERY_SECONDS = Histogram(
+    "fame_db_query_seconds",
+    "Duration of individual SQL statements by route.",
+    ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+)
+EMAIL_QUEUE_DEPTH = Gauge(
+    "fame_email_queue_depth",
+    "Digest emails rendered but not yet handed to an SMTP server.",
+    multiprocess_mode="livesum",
+)
+
+_db_listeners_installed = False
+
+
+@contextmanager
+def track_provider_call(provider: str, model: str) -> Iterator[dict]:
+    """Time a provider call; set ``status`` on the yielded dict before exiting."""
+    call = {"status": "exception"}
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        PROVIDER_LATENCY.labels(provider, model, str(call["status"])).observe(
+            time.perf_counter() - started
+        )
+
+
+def observe_pdf_extraction(pages: int, seconds: float) -> None:
+    """Record the size and throughput of one PDF text extraction."""
+    PDF_PAGES.inc(pages)
+    if seconds > 0:
+        PDF_PAGES_PER_SECOND.observe(pages / seconds)
+
+
+def _route_label() -> str:
+    if has_request_context():
+        return request.endpoint or "unmatched"
+    return "offline"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("fame_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["fame_query_started"].pop()
+    DB_QUERY_SECONDS.labels(_route_label()).observe(time.perf_counter() - started)
+
+
+def _handle_error(exception_context) -> None:
+    # after_cursor_execute is skipped for failing statements.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("fame_query_started"):
+        connection.info["fame_query_started"].pop()
+
+
+def install_db_listeners() -> None:
+    """Time every SQL statement of every engine (installed once per process)."""
+    global _db_listeners_installed
+    if _db_listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _db_listeners_installed = True
+
+
+def _registry() -> CollectorRegistry:
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def init_app(app: Flask) -> None:
+    """Install the database listeners and register the ``/metrics`` route."""
+    install_db_listeners()
+
+    @app.route("/metrics")
+    def metrics() -> Response:
+        token = app.config.get("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            abort(401)
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
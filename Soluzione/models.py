@@ -7,15 +7,21 @@ include a weekly meal schedule as well as a shopping list. Each model is
 associated with a user via a foreign key.
 """
 
+import json
 from datetime import datetime, date
 
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.hybrid import hybrid_property
+
+from db_routing import RoutingSession
+from storage import CompactJSONText, CompressedText
 
 # The SQLAlchemy database instance is created in this module so that it can
 # be imported by any other modules without causing a circular import. The
-# actual application will initialise the database in app.py.
-db = SQLAlchemy()
+# actual application will initialise the database in app.py. Its session
+# sends the reads of read-only views to the replica bind, if any.
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class User(UserMixin, db.Model):
@@ -35,12 +41,18 @@ class User(UserMixin, db.Model):
     # API configuration for personal AI service usage
     api_provider = db.Column(db.String(50), default='gemini') # 'gemini', 'openai', 'claude'
     api_key = db.Column(db.String(500), nullable=True) # Encrypted API key
+    # Household the plans are written for (see household.py): the number of
+    # members and a JSON list of their profiles, e.g. ["adult", "child"].
+    household_size = db.Column(db.Integer, nullable=True)
+    household_members = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Relationships: a user may have many preferences, diets and plans.
+    # Relationships: a user may have many preferences, diets and plans. The
+    # diet and plan histories grow without bound, so they are queries rather
+    # than lists loaded in full on first access.
     preferences = db.relationship("Preference", backref="user", lazy=True)
-    diets = db.relationship("Diet", backref="user", lazy=True)
-    plans = db.relationship("Plan", backref="user", lazy=True)
+    diets = db.relationship("Diet", backref="user", lazy="dynamic")
+    plans = db.relationship("Plan", backref="user", lazy="dynamic")
 
     def get_favorite_emails(self) -> list[str]:
         """Get the list of favorite email addresses."""
@@ -81,10 +93,13 @@ class Preference(db.Model):
 class Diet(db.Model):
     """Represents a diet plan provided by a nutritionist."""
 
+    # Serves the "latest diet of a user" lookups.
+    __table_args__ = (db.Index("ix_diet_user_id_uploaded_at", "user_id", "uploaded_at"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     # Raw content of the diet, typically uploaded as plain text.
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(CompressedText, nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self) -> str:
@@ -92,21 +107,168 @@ class Diet(db.Model):
 
 
 class Plan(db.Model):
-    """Represents a weekly meal plan generated for a user."""
+    """Represents a weekly meal plan generated for a user.
+
+    ``json_content`` is the canonical copy of the plan. The plan text and the
+    shopping-list HTML are stored with it (compressed), so loading plans
+    renders nothing; rows whose ``content`` or ``shopping_list`` was stored
+    empty (by an earlier ``compress_storage.py`` run) are rendered from the
+    JSON on first access and cached on the instance.
+    """
+
+    # The first index serves the latest-plan lookups and the keyset-paginated
+    # history; the second keeps concurrent generations from storing two plans
+    # for the same week.
+    __table_args__ = (
+        db.Index("ix_plan_user_id_created_at", "user_id", "created_at"),
+        db.Index("ux_plan_user_id_start_date", "user_id", "start_date", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     # Start date of the plan (Monday). Only one plan per week per user.
     start_date = db.Column(db.Date, nullable=False)
     # Textual representation of the meals for the week.
-    content = db.Column(db.Text, nullable=False)
-    # JSON representation of the meals for the week.
-    json_content = db.Column(db.Text, nullable=True)
-    # Shopping list text generated for the week.
-    shopping_list = db.Column(db.Text, nullable=False)
+    _content = db.Column("content", CompressedText, nullable=False)
+    # JSON representation of the meals for the week, stored compact.
+    json_content = db.Column(CompactJSONText, nullable=True)
+    # Shopping list HTML generated for the week.
+    _shopping_list = db.Column("shopping_list", CompressedText, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    deliveries = db.relationship(
+        "EmailDelivery", backref="plan", lazy=True, cascade="all, delete-orphan"
+    )
+
+    def derived_text(self) -> tuple[str, str]:
+        """Return the plan text and shopping list rendered from the JSON."""
+        cached = self.__dict__.get("_derived")
+        if cached is not None and cached[0] == self.json_content:
+            return cached[1]
+        from rendering import render_shopping_list, render_weekly_plan
+
+        try:
+            data = json.loads(self.json_content or "{}")
+        except json.JSONDecodeError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        derived = (
+            render_weekly_plan(data.get("weekly_plan") or {}),
+            render_shopping_list(data.get("shopping_list") or {}),
+        )
+        self.__dict__["_derived"] = (self.json_content, derived)
+        return derived
+
+    @hybrid_property
+    def content(self) -> str:
+        return self._content or self.derived_text()[0]
+
+    @content.inplace.setter
+    def _content_setter(self, value: str) -> None:
+        self._content = value
+
+    @content.inplace.expression
+    @classmethod
+    def _content_expression(cls):
+        return cls._content
+
+    @hybrid_property
+    def shopping_list(self) -> str:
+        return self._shopping_list or self.derived_text()[1]
+
+    @shopping_list.inplace.setter
+    def _shopping_list_setter(self, value: str) -> None:
+        self._shopping_list = value
+
+    @shopping_list.inplace.expression
+    @classmethod
+    def _shopping_list_expression(cls):
+        return cls._shopping_list
+
     def __repr__(self) -> str:
         return (
             f"<Plan for User {self.user_id} starting {self.start_date.isoformat()}>"
-        )
\ No newline at end of file
+        )
+
+
+class ArchivedPlan(db.Model):
+    """A plan moved out of ``plan`` by ``archive_plans.py``.
+
+    The id is the one the plan had. ``payload`` holds the stored columns of
+    the plan as compressed JSON: ``json_content`` plus ``content`` and
+    ``shopping_list`` when they were not derived from it.
+    """
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    start_date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    payload = db.Column(CompactJSONText, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ArchivedPlan {self.id} for User {self.user_id}>"
+
+
+class Recipe(db.Model):
+    """A recipe of the local catalog, loaded from ``data/recipes.json``.
+
+    ``ingredients`` holds ``{"name", "grams"}`` pairs for one portion and
+    ``steps`` the preparation steps, both as JSON. ``search_text`` gathers
+    the title, description, ingredient names and tags indexed for full-text
+    search (see recipes.py).
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(100), unique=True, nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    meal_types = db.Column(db.String(50), nullable=False)  # e.g. "lunch,dinner"
+    focus = db.Column(db.String(200), nullable=True)
+    tags = db.Column(db.String(200), nullable=True)  # comma separated
+    ingredients = db.Column(CompactJSONText, nullable=False)
+    steps = db.Column(CompactJSONText, nullable=False)
+    search_text = db.Column(db.Text, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<Recipe {self.slug}>"
+
+
+class IdempotencyKey(db.Model):
+    """An ``Idempotency-Key`` sent with a plan generation and the plan it produced.
+
+    The plan may have been replaced or deleted since; a retry with the key
+    still gets no second generation.
+    """
+
+    __table_args__ = (db.UniqueConstraint("user_id", "key"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    plan_id = db.Column(db.Integer, db.ForeignKey("plan.id", ondelete="SET NULL"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<IdempotencyKey {self.key} for User {self.user_id}>"
+
+
+class EmailDelivery(db.Model):
+    """Delivery status of a weekly digest email for one recipient."""
+
+    __table_args__ = (db.UniqueConstraint("plan_id", "recipient"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    plan_id = db.Column(
+        db.Integer, db.ForeignKey("plan.id", ondelete="CASCADE"), nullable=False
+    )
+    recipient = db.Column(db.String(150), nullable=False)
+    # One of "sent" or "failed"; failed deliveries are retried on the next run.
+    status = db.Column(db.String(20), nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"<EmailDelivery {self.recipient} for Plan {self.plan_id}: {self.status}>"
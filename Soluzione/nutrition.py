@@ -0,0 +1,144 @@
+"""
+Nutritional values of weekly plans from a bundled food-composition table.
+
+Meals used to carry only a free-text ``focus``. ``data/food_composition.json``
+lists, per 100 g, energy and macronutrients of the foods that appear in
+plans (CREA/USDA values), with their aliases and a standard portion. At
+import it becomes a ``foods x nutrients`` NumPy matrix whose rows are the
+ingredient ids of ingredients.py.
+
+``plan_nutrition`` maps every meal of a plan to ``(food, grams)`` pairs,
+taken from the meal's ``ingredients`` list when the model provided one and
+otherwise from the foods named in its title and description at standard
+portions (such meals are marked ``estimated``). The pairs are scattered
+into a ``meals x foods`` gram matrix, and a single matrix product gives the
+values of all meals; the weekly totals are its column sums. ``annotate``
+attaches the results to ``weekly_plan`` and ``weekly_summary``. Values are
+per portion.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any
+
+import numpy as np
+
+from ingredients import FOODS, find_foods, parse_item
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "food_composition.json"
+)
+
+_GRAMS_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(kg|g|gr|grammi)?\b", re.IGNORECASE)
+
+
+def _load(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    foods = data["foods"]
+    # Values per gram, so a gram matrix times the table gives the nutrients.
+    # Rows follow the ingredient ids of ingredients.py.
+    table = np.array([foods[name]["per_100g"] for name in FOODS], dtype=np.float64) / 100
+    portions = np.array([foods[name]["portion_g"] for name in FOODS], dtype=np.float64)
+    return tuple(data["nutrients"]), table, portions
+
+
+NUTRIENTS, _TABLE, _PORTIONS = _load(DATA_PATH)
+
+
+def parse_grams(value: Any) -> float | None:
+    """Return the grams in ``value`` (a number or a string such as "1,2 kg")."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    match = _GRAMS_RE.search(str(value or ""))
+    if match is None:
+        return None
+    grams = float(match.group(1).replace(",", "."))
+    if (match.group(2) or "").lower() == "kg":
+        grams *= 1000
+    return grams or None
+
+
+def meal_foods(meal: dict) -> tuple[list[tuple[int, float]], bool]:
+    """Return the ``(food row, grams)`` pairs of one portion of ``meal``.
+
+    The second value is True when the grams are standard portions because
+    the meal has no usable ``ingredients`` list.
+    """
+    pairs = []
+    for ingredient in meal.get("ingredients") or []:
+        if not isinstance(ingredient, dict):
+            continue
+        grams = parse_grams(ingredient.get("grams"))
+        food = parse_item(str(ingredient.get("name") or "")).id
+        if grams is not None and food is not None:
+            pairs.append((food, grams))
+    if pairs:
+        return pairs, False
+    text = f"{meal.get('title') or ''} . {meal.get('description') or ''}"
+    return [(index, float(_PORTIONS[index])) for index in find_foods(text)], True
+
+
+def _values(row: np.ndarray) -> dict[str, float]:
+    return {
+        nutrient: round(float(value)) if nutrient == "kcal" else round(float(value), 1)
+        for nutrient, value in zip(NUTRIENTS, row)
+    }
+
+
+def plan_nutrition(weekly_plan: dict) -> tuple[list[tuple[str, str]], np.ndarray, list[bool]]:
+    """Return the meal slots of ``weekly_plan``, their nutrients and estimate flags.
+
+    The nutrients are a ``len(slots) x len(NUTRIENTS)`` array computed with
+    one matrix product.
+    """
+    slots, rows, cols, grams, estimated = [], [], [], [], []
+    for day, meals in (weekly_plan or {}).items():
+        if not isinstance(meals, dict):
+            continue
+        for meal_type, meal in meals.items():
+            if not isinstance(meal, dict):
+                continue
+            pairs, guessed = meal_foods(meal)
+            for food, amount in pairs:
+                rows.append(len(slots))
+                cols.append(food)
+                grams.append(amount)
+            slots.append((day, meal_type))
+            estimated.append(guessed)
+    matrix = np.zeros((len(slots), len(FOODS)))
+    np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), grams)
+    return slots, matrix @ _TABLE, estimated
+
+
+def meal_nutrition(meal: dict) -> dict[str, Any]:
+    """Return the nutrients of one portion of ``meal``."""
+    _, values, estimated = plan_nutrition({"day": {"meal": meal}})
+    return {**_values(values[0]), "estimated": estimated[0]}
+
+
+def annotate(plan_data: dict) -> dict:
+    """Attach per-meal and weekly nutrients to ``plan_data`` in place."""
+    weekly_plan = plan_data.get("weekly_plan")
+    if not isinstance(weekly_plan, dict):
+        return plan_data
+    slots, values, estimated = plan_nutrition(weekly_plan)
+    for (day, meal_type), row, guessed in zip(slots, values, estimated):
+        weekly_plan[day][meal_type]["nutrition"] = {**_values(row), "estimated": guessed}
+    if slots:
+        totals = values.sum(axis=0)
+        days = len({day for day, _ in slots})
+        summary = plan_data.get("weekly_summary")
+        if not isinstance(summary, dict):
+            summary = plan_data["weekly_summary"] = {}
+        summary["nutrition"] = {
+            "weekly": _values(totals),
+            "daily_average": _values(totals / days),
+            "estimated_meals": sum(estimated),
+        }
+    return plan_data
@@ -0,0 +1,89 @@
+"""
+Parser turning plan text back into structured meal data.
+
+Plans stored without JSON (``json_content == "{}"``) only have the text
+produced by ``format_weekly_plan`` or, for very old plans, whatever the AI
+provider returned. ``parse_plan_content`` recovers the ``weekly_plan``
+structure from that text with a single compiled regular expression run over
+the whole document: every line is classified as a day header, a meal line,
+a description or a focus/servings line in one pass, and lines that match
+none of these are skipped by the regex engine itself. Parsing the output of
+``format_weekly_plan`` gives back exactly the data it was rendered from.
+"""
+
+from __future__ import annotations
+
+import re
+
+from rendering import DAYS, MEAL_TYPES
+
+_DAY_NAMES = {}
+for _day_en, _day_it in DAYS:
+    _DAY_NAMES[_day_it.lower()] = _day_en
+    # Accept the unaccented spellings (LUNEDI, LUNEDI') found in older plans.
+    _DAY_NAMES[_day_it.lower().replace("ì", "i")] = _day_en
+
+_MEAL_LABELS = {label.lower(): meal_type for meal_type, label, _, _ in MEAL_TYPES}
+_MEAL_LABELS["merenda"] = "snack"
+
+_DEFAULT_SERVINGS = {meal_type: servings for meal_type, _, _, servings in MEAL_TYPES}
+
+
+def _alternation(words) -> str:
+    # Longest first so that "lunedì" wins over a shorter prefix.
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_SPACE = r"[^\S\n]*"
+_LINE_RE = re.compile(
+    rf"^{_SPACE}(?:"
+    # 📝 description of the current meal
+    rf"(?P<description>📝[^\n]*)"
+    # 🎯 focus, optionally followed by "• N porzioni"
+    rf"|(?P<focus>🎯[^\n]*)"
+    # 🥗 **Pranzo:** title (bold markers optional)
+    rf"|[^\w\n*]*\*{{0,2}}(?P<meal>{_alternation(_MEAL_LABELS)}){_SPACE}:{_SPACE}\*{{0,2}}"
+    rf"{_SPACE}(?P<title>[^\n]*)"
+    # 🗓️ **LUNEDÌ** day header
+    rf"|[^\w\n]*(?P<day>{_alternation(_DAY_NAMES)})\b"
+    rf")",
+    re.MULTILINE | re.IGNORECASE,
+)
+_SERVINGS_RE = re.compile(rf"{_SPACE}•{_SPACE}([^\s•]+){_SPACE}porzioni\Z", re.IGNORECASE)
+
+
+def parse_plan_content(content: str) -> dict:
+    """Parse plan content to extract structured meal data."""
+    structured_plan: dict = {}
+    day = None
+    meal = None
+    for description, focus, label, title, day_name in _LINE_RE.findall(content or ""):
+        if description or focus:
+            if meal is None:
+                continue
+            if description:
+                # Drop the 📝 marker (a single code point) and the padding.
+                meal["description"] = description[1:].strip()
+            else:
+                focus = focus[1:].strip()
+                servings = _SERVINGS_RE.search(focus)
+                if servings:
+                    focus = focus[: servings.start()]
+                    if servings.group(1).isdigit():
+                        meal["servings"] = int(servings.group(1))
+                meal["focus"] = focus
+        elif label:
+            if day is None:
+                continue
+            meal_type = _MEAL_LABELS[label.lower()]
+            meal = {
+                "title": title.rstrip(),
+                "description": "",
+                "focus": "",
+                "servings": _DEFAULT_SERVINGS[meal_type],
+            }
+            day[meal_type] = meal
+        elif day_name:
+            day = structured_plan.setdefault(_DAY_NAMES[day_name.lower()], {})
+            meal = None
+    return structured_plan
@@ -0,0 +1,139 @@
+"""
+Preparation steps of plan meals, looked up in the catalog or generated in one batch.
+
+``/api/meal_details`` used to choose one of five hard-coded step lists by
+looking for words such as "salmone" in the meal title, on every modal open.
+``prepare_plan`` instead fills ``meal["preparation"]`` for all the meals of a
+plan that lack it. Catalog recipes (see recipes.py) are found by slug or,
+for meals written by a provider, by normalized title in ``title_index``;
+the remaining meals are sent to the provider together in a single prompt.
+It runs when the plan is generated (``utils.attach_preparation``), so the
+modal only reads the steps from the plan JSON. Meals the provider gives no
+steps for are not asked for again; the modal shows ``GENERIC_STEPS``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from typing import Callable
+
+from instrumentation import log_event
+from metrics import PREPARATION_STEPS
+from recipes import CatalogRecipe, catalog
+from screening import parse_reply
+from seasonality import normalize
+
+GENERIC_STEPS = "\n".join(
+    [
+        "1. Prepara tutti gli ingredienti necessari",
+        "2. Segui la ricetta tradizionale per questo piatto",
+        "3. Cuoci rispettando i tempi indicati",
+        "4. Servi caldo e gustoso",
+    ]
+)
+# Replies with fewer steps than this are not kept.
+MIN_STEPS = 2
+MAX_STEPS = 10
+
+
+def format_steps(steps: list[str]) -> str:
+    """Return ``steps`` as the numbered lines shown in the meal modal."""
+    return "\n".join(f"{i}. {step}" for i, step in enumerate(steps, 1))
+
+
+_index_lock = threading.Lock()
+_index: tuple[tuple[CatalogRecipe, ...], dict[str, str]] | None = None
+
+
+def title_index() -> dict[str, str]:
+    """Return the catalog steps keyed by recipe slug and normalized title."""
+    global _index
+    recipes = catalog()
+    with _index_lock:
+        if _index is None or _index[0] is not recipes:
+            index: dict[str, str] = {}
+            for recipe in recipes:
+                steps = format_steps(list(recipe.steps))
+                index[recipe.slug] = index[normalize(recipe.title)] = steps
+            _index = (recipes, index)
+        return _index[1]
+
+
+def lookup(meal: dict) -> str | None:
+    """Return the catalog steps of ``meal``, or None when it is not a catalog recipe."""
+    index = title_index()
+    return index.get(str(meal.get("recipe") or "")) or index.get(normalize(str(meal.get("title") or "")))
+
+
+def steps_prompt(meals: dict[tuple[str, str], dict]) -> str:
+    """Return the prompt asking the provider for the steps of all ``meals``."""
+    listed: dict[str, dict] = {}
+    for (day, meal_type), meal in meals.items():
+        listed.setdefault(day, {})[meal_type] = {
+            "title": meal.get("title", ""),
+            "description": meal.get("description", ""),
+            "ingredients": meal.get("ingredients", []),
+            "servings": meal.get("servings"),
+        }
+    return f"""Scrivi le istruzioni di preparazione dei pasti seguenti di un piano settimanale, con passaggi brevi e concreti (da {MIN_STEPS} a {MAX_STEPS} per pasto), indicando temperature e tempi di cottura quando servono:
+
+{json.dumps(listed, ensure_ascii=False, indent=2)}
+
+Rispondi ESCLUSIVAMENTE con un JSON valido in questo formato, con un elenco di passaggi per ogni pasto, senza numerarli:
+{{"preparation": {{"<giorno>": {{"<pasto>": ["...", "..."]}}}}}}"""
+
+
+def _steps(value: object) -> list[str] | None:
+    if not isinstance(value, list):
+        return None
+    steps = [str(step).strip() for step in value if isinstance(step, str) and step.strip()]
+    return steps[:MAX_STEPS] if len(steps) >= MIN_STEPS else None
+
+
+def prepare_plan(
+    weekly_plan: dict,
+    ask: Callable[[str], str] | None = None,
+    use_catalog: bool = True,
+) -> list[tuple[str, str]]:
+    """Fill ``meal["preparation"]`` where missing; return the slots filled.
+
+    ``ask`` sends a prompt to the provider; without it, only catalog recipes
+    get their steps. ``use_catalog=False`` skips the catalog lookup.
+    """
+    filled, missing = [], {}
+    for day, meals in (weekly_plan or {}).items():
+        if not isinstance(meals, dict):
+            continue
+        for meal_type, meal in meals.items():
+            if not isinstance(meal, dict) or meal.get("preparation"):
+                continue
+            steps = lookup(meal) if use_catalog else None
+            if steps:
+                meal["preparation"] = steps
+                filled.append((day, meal_type))
+            else:
+                missing[(day, meal_type)] = meal
+    PREPARATION_STEPS.labels("catalog").inc(len(filled))
+    if missing and ask is not None:
+        reply = parse_reply(ask(steps_prompt(missing))).get("preparation")
+        if not isinstance(reply, dict):
+            reply = {}
+        generated = 0
+        for (day, meal_type), meal in missing.items():
+            day_steps = reply.get(day)
+            steps = _steps(day_steps.get(meal_type)) if isinstance(day_steps, dict) else None
+            if steps:
+                meal["preparation"] = format_steps(steps)
+                filled.append((day, meal_type))
+                generated += 1
+        PREPARATION_STEPS.labels("provider").inc(generated)
+        PREPARATION_STEPS.labels("missing").inc(len(missing) - generated)
+        log_event(
+            "preparation_steps",
+            level=logging.INFO if generated == len(missing) else logging.WARNING,
+            requested=len(missing),
+            generated=generated,
+        )
+    return filled
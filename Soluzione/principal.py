@@ -0,0 +1,166 @@
+"""
+Cached user principals for Flask-Login.
+
+Every authenticated request used to load the whole ``user`` row, API key
+and favorite emails included, just to know who is logged in.
+``load_principal`` instead returns a ``UserPrincipal``: an immutable
+snapshot of the few columns views and templates read, loaded with a single
+narrow query and kept in a per-application LRU cache for
+``PRINCIPAL_CACHE_TTL`` seconds (0 disables the cache).
+
+Any update or deletion of a user row drops its cached principal, so profile
+and preference changes are visible on the next request of the same process.
+Other processes (gunicorn workers) may serve the old snapshot until it
+expires, which is why the TTL is short. Views that need the rest of the row,
+or want to modify it, call ``UserPrincipal.load()``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask import Flask, current_app, g, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from models import db, User
+
+_EXTENSION = "fame_principal_cache"
+_PENDING = "fame_principal_invalidations"
+
+# Columns copied into the principal; everything else stays in the database.
+PRINCIPAL_COLUMNS = (
+    User.id,
+    User.username,
+    User.email,
+    User.region,
+    User.trains,
+    User.training_frequency,
+    User.training_days,
+    User.api_provider,
+    User.household_size,
+    User.household_members,
+)
+
+
+@dataclass(frozen=True)
+class UserPrincipal(UserMixin):
+    """Read-only snapshot of the logged-in user."""
+
+    id: int
+    username: str
+    email: str
+    region: str | None
+    trains: bool | None
+    training_frequency: int | None
+    training_days: str | None
+    api_provider: str | None
+    household_size: int | None = None
+    household_members: str | None = None
+
+    __hash__ = UserMixin.__hash__
+
+    def load(self) -> User:
+        """Return the full ``User`` row, loaded once per request."""
+        users = g.setdefault("principal_users", {})
+        if self.id not in users:
+            users[self.id] = db.session.get(User, self.id)
+        return users[self.id]
+
+
+class PrincipalCache:
+    """Thread-safe LRU of principals whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float, size: int) -> None:
+        self.ttl = ttl
+        self.size = size
+        self._entries: OrderedDict[int, tuple[float, UserPrincipal]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> UserPrincipal | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, principal: UserPrincipal) -> None:
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _cache() -> PrincipalCache | None:
+    if not has_app_context():
+        return None
+    return current_app.extensions.get(_EXTENSION)
+
+
+def load_principal(user_id: int) -> UserPrincipal | None:
+    """Return the principal of ``user_id``, from the cache when possible."""
+    cache = _cache()
+    principal = cache.get(user_id) if cache is not None else None
+    if principal is not None:
+        return principal
+    row = db.session.execute(
+        select(*PRINCIPAL_COLUMNS).where(User.id == user_id)
+    ).one_or_none()
+    if row is None:
+        return None
+    principal = UserPrincipal(**row._mapping)
+    if cache is not None:
+        cache.put(principal)
+    return principal
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate(mapper, connection, user: User) -> None:
+    cache = _cache()
+    if cache is None:
+        return
+    cache.invalidate(user.id)
+    # Drop it again on commit, in case another request cached the old row
+    # in between.
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault(_PENDING, set()).add(user.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    cache = _cache()
+    if pending and cache is not None:
+        for user_id in pending:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_pending(session, previous_transaction) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def init_app(app: Flask) -> None:
+    """Create the principal cache of ``app`` unless ``PRINCIPAL_CACHE_TTL`` is 0."""
+    ttl = app.config.get("PRINCIPAL_CACHE_TTL", 0)
+    if ttl > 0:
+        app.extensions[_EXTENSION] = PrincipalCache(ttl, app.config["PRINCIPAL_CACHE_SIZE"])
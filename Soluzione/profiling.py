@@ -0,0 +1,289 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries the admin token in the ``X-Profile``
+header (``PROFILING_TOKEN``) or is picked by the sampling rate
+(``PROFILING_SAMPLE_RATE``, between 0 and 1). For a profiled request the
+view, template rendering and everything else run under a profiler
+(pyinstrument when it is installed, cProfile otherwise), and every SQL
+statement is recorded with its offset from the start of the request, so the
+time can be split between Python code, Jinja, the database and the provider.
+
+Each profile is stored in ``PROFILING_DIR`` as ``<id>.json`` (request
+metadata, the SQL timeline and a text summary) next to the raw profile
+(``<id>.prof`` for ``pstats``/snakeviz, ``<id>.html`` for pyinstrument).
+Only the newest ``PROFILING_KEEP`` profiles are kept. The id is returned in
+the ``X-Profile-ID`` response header, and profiles can be listed and
+downloaded under ``/admin/profiles`` with ``Authorization: Bearer <token>``.
+
+When neither a token nor a sampling rate is configured no hook is
+installed; otherwise an unprofiled request costs one header lookup and one
+random draw.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Flask, abort, g, has_request_context, jsonify, request, send_from_directory
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from instrumentation import log_event
+
+try:  # Optional dependency, preferred when available.
+    from pyinstrument import Profiler as _Pyinstrument
+except ImportError:  # pragma: no cover - depends on the environment
+    _Pyinstrument = None
+
+PROFILE_HEADER = "X-Profile"
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_STATEMENT_CHARS = 500
+
+# Only one profiler can be attached to the interpreter at a time (cProfile
+# uses the global sys.monitoring slot on Python 3.12+), so concurrent
+# requests are simply not profiled while another one is.
+_active = threading.Lock()
+_sql_listeners_installed = False
+
+
+class _CProfileEngine:
+    name = "cprofile"
+    extension = "prof"
+
+    def __init__(self) -> None:
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def summary(self) -> str:
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(40)
+        return out.getvalue()
+
+    def write(self, path: str) -> None:
+        self._profile.dump_stats(path)
+
+
+class _PyinstrumentEngine:
+    name = "pyinstrument"
+    extension = "html"
+
+    def __init__(self) -> None:
+        self._profiler = _Pyinstrument()
+
+    def start(self) -> None:
+        self._profiler.start()
+
+    def stop(self) -> None:
+        self._profiler.stop()
+
+    def summary(self) -> str:
+        return self._profiler.output_text()
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(self._profiler.output_html())
+
+
+def _new_engine(preference: str):
+    if preference in ("auto", "pyinstrument") and _Pyinstrument is not None:
+        return _PyinstrumentEngine()
+    return _CProfileEngine()
+
+
+def _record_query_start(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "profile" in g:
+        conn.info.setdefault("fame_profile_started", []).append(time.perf_counter())
+
+
+def _record_query_end(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and "profile" in g):
+        return
+    started_stack = conn.info.get("fame_profile_started")
+    if not started_stack:
+        return
+    started = started_stack.pop()
+    profile = g.profile
+    profile["queries"].append(
+        {
+            "offset_ms": round((started - profile["started"]) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "statement": statement[:_STATEMENT_CHARS],
+        }
+    )
+
+
+def _install_sql_listeners() -> None:
+    global _sql_listeners_installed
+    if _sql_listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _record_query_start)
+    event.listen(Engine, "after_cursor_execute", _record_query_end)
+    _sql_listeners_installed = True
+
+
+def _wants_profile(app: Flask) -> str | None:
+    token = app.config.get("PROFILING_TOKEN")
+    header = request.headers.get(PROFILE_HEADER)
+    if token and header and hmac.compare_digest(header, token):
+        return "header"
+    rate = app.config.get("PROFILING_SAMPLE_RATE") or 0.0
+    if rate and random.random() < rate:
+        return "sample"
+    return None
+
+
+def _prune(directory: str, keep: int) -> None:
+    metadata = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in metadata[: max(0, len(metadata) - keep)]:
+        profile_id = entry.name[: -len(".json")]
+        for name in os.listdir(directory):
+            if name.startswith(profile_id):
+                os.remove(os.path.join(directory, name))
+
+
+def _save(app: Flask, profile: dict, status: int) -> str:
+    engine = profile.pop("engine")
+    directory = app.config["PROFILING_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    profile_id = profile["id"]
+    engine.write(os.path.join(directory, f"{profile_id}.{engine.extension}"))
+    queries = profile["queries"]
+    metadata = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": status,
+        "reason": profile["reason"],
+        "engine": engine.name,
+        "file": f"{profile_id}.{engine.extension}",
+        "started_at": profile["started_at"],
+        "duration_ms": round((time.perf_counter() - profile["started"]) * 1000, 3),
+        "sql_count": len(queries),
+        "sql_ms": round(sum(query["duration_ms"] for query in queries), 3),
+        "queries": queries,
+        "summary": engine.summary(),
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w", encoding="utf-8") as handle:
+        json.dump(metadata, handle, ensure_ascii=False)
+    _prune(directory, app.config.get("PROFILING_KEEP", 200))
+    return profile_id
+
+
+def _load_metadata(app: Flask, profile_id: str) -> dict:
+    if not _PROFILE_ID_RE.match(profile_id):
+        abort(404)
+    path = os.path.join(app.config["PROFILING_DIR"], f"{profile_id}.json")
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        abort(404)
+
+
+def _require_admin(app: Flask) -> None:
+    token = app.config.get("PROFILING_TOKEN")
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+
+
+def init_app(app: Flask) -> None:
+    """Register the profiling hooks and the ``/admin/profiles`` routes.
+
+    Should be called before the other ``init_app`` functions so that their
+    request hooks run inside the profiled section.
+    """
+
+    @app.route("/admin/profiles")
+    def list_profiles():
+        _require_admin(app)
+        directory = app.config["PROFILING_DIR"]
+        profiles = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(".json"):
+                    metadata = _load_metadata(app, name[: -len(".json")])
+                    metadata.pop("queries", None)
+                    metadata.pop("summary", None)
+                    profiles.append(metadata)
+        profiles.sort(key=lambda item: item["started_at"], reverse=True)
+        return jsonify(profiles)
+
+    @app.route("/admin/profiles/<profile_id>")
+    def show_profile(profile_id: str):
+        _require_admin(app)
+        return jsonify(_load_metadata(app, profile_id))
+
+    @app.route("/admin/profiles/<profile_id>/download")
+    def download_profile(profile_id: str):
+        _require_admin(app)
+        metadata = _load_metadata(app, profile_id)
+        return send_from_directory(app.config["PROFILING_DIR"], metadata["file"], as_attachment=True)
+
+    if not (app.config.get("PROFILING_TOKEN") or app.config.get("PROFILING_SAMPLE_RATE")):
+        return
+    _install_sql_listeners()
+
+    @app.before_request
+    def _start_profile() -> None:
+        reason = _wants_profile(app)
+        if reason is None or not _active.acquire(blocking=False):
+            return
+        engine = _new_engine(app.config.get("PROFILING_ENGINE", "auto"))
+        g.profile = {
+            "id": uuid.uuid4().hex,
+            "reason": reason,
+            "engine": engine,
+            "queries": [],
+            "started": time.perf_counter(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        }
+        engine.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        try:
+            profile["engine"].stop()
+        finally:
+            _active.release()
+        try:
+            profile_id = _save(app, profile, response.status_code)
+        except OSError as exc:
+            log_event("profile_save_failed", error=str(exc))
+            return response
+        response.headers["X-Profile-ID"] = profile_id
+        log_event("profile_saved", profile_id=profile_id, path=request.path)
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc) -> None:
+        # after_request is skipped when the response could not be built.
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile["engine"].stop()
+            _active.release()
@@ -0,0 +1,168 @@
+"""
+Per-request SQL query counting and N+1 detection.
+
+When ``QUERY_STATS`` is enabled every SQL statement executed while serving a
+request is counted and timed. The totals are returned in the
+``X-DB-Query-Count``, ``X-DB-Query-Time-Ms`` and ``X-DB-Duplicate-Queries``
+response headers and shown in a small toolbar at the bottom of every page.
+A statement is a duplicate when the same SQL text runs more than once in a
+request (bound parameters excluded), the typical shape of an N+1 loop; it
+is logged as ``n_plus_one_suspected`` once it reaches
+``QUERY_STATS_N_PLUS_ONE`` executions.
+
+``count_queries()`` collects the same statistics around any block of code,
+and ``assert_max_queries()`` turns them into a query budget for tests.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from instrumentation import log_event
+
+_collectors: contextvars.ContextVar[tuple["QueryStats", ...]] = contextvars.ContextVar(
+    "query_stats_collectors", default=()
+)
+_listeners_installed = False
+
+
+@dataclass
+class QueryStats:
+    """Number, duration and repetitions of the SQL statements of one scope."""
+
+    count: int = 0
+    seconds: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    @property
+    def duplicates(self) -> int:
+        """Executions of a statement beyond its first one."""
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+    @property
+    def milliseconds(self) -> float:
+        return round(self.seconds * 1000, 3)
+
+    def repeated(self) -> list[tuple[str, int]]:
+        """Statements executed more than once, most repeated first."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n > 1]
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+
+def _active_stats() -> list[QueryStats]:
+    active = list(_collectors.get())
+    if has_request_context() and "query_stats" in g:
+        active.append(g.query_stats)
+    return active
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_stats():
+        conn.info.setdefault("fame_query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active_stats()
+    started_stack = conn.info.get("fame_query_stats_started")
+    if not active or not started_stack:
+        return
+    elapsed = time.perf_counter() - started_stack.pop()
+    for stats in active:
+        stats.record(statement, elapsed)
+
+
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("fame_query_stats_started"):
+        connection.info["fame_query_stats_started"].pop()
+
+
+def install_listeners() -> None:
+    """Listen to the statements of every engine (installed once per process)."""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _listeners_installed = True
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Collect the statements executed inside the block, requests included."""
+    install_listeners()
+    stats = QueryStats()
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def assert_max_queries(budget: int, duplicates: int = 0) -> Iterator[QueryStats]:
+    """Fail when the block runs more than ``budget`` statements.
+
+    ``duplicates`` is the number of repeated executions tolerated.
+    """
+    with count_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > budget:
+        problems.append(f"{stats.count} queries executed, budget is {budget}")
+    if stats.duplicates > duplicates:
+        problems.append(f"{stats.duplicates} duplicate queries, {duplicates} allowed")
+    if problems:
+        listing = "\n".join(f"  {n}x {sql}" for sql, n in stats.statements.most_common())
+        raise AssertionError("; ".join(problems) + "\n" + listing)
+
+
+def init_app(app: Flask) -> None:
+    """Collect per-request statistics when ``QUERY_STATS`` is enabled."""
+
+    @app.context_processor
+    def _query_stats_toolbar() -> dict:
+        return {"query_stats": g.get("query_stats")}
+
+    if not app.config.get("QUERY_STATS"):
+        return
+    install_listeners()
+    threshold = app.config.get("QUERY_STATS_N_PLUS_ONE", 3)
+
+    @app.before_request
+    def _start_query_stats() -> None:
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def _finish_query_stats(response):
+        stats = g.pop("query_stats", None)
+        if stats is None:
+            return response
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Query-Time-Ms"] = f"{stats.milliseconds:.3f}"
+        response.headers["X-DB-Duplicate-Queries"] = str(stats.duplicates)
+        for statement, executions in stats.repeated():
+            if executions >= threshold:
+                log_event(
+                    "n_plus_one_suspected",
+                    level=logging.WARNING,
+                    endpoint=request.endpoint,
+                    executions=executions,
+                    statement=statement,
+                )
+        return response
@@ -0,0 +1,377 @@
+"""
+Local recipe catalog with full-text search, used to build plans without an LLM.
+
+Every plan used to need a provider call, and when providers failed users got
+the same ``get_dummy_response()`` week. The recipes bundled in
+``data/recipes.json`` are loaded into the ``recipe`` table by
+``sync_catalog`` (``python recipes.py`` or ``python database_setup.py``) and indexed
+for full-text search: an FTS5 table on SQLite, a ``tsvector`` GIN index on
+PostgreSQL. ``search_recipes`` ranks recipes against free text.
+
+``assemble_week`` builds a plan in the same JSON format the providers
+return. It keeps only the recipes the user's dislikes screen accepts (see
+screening.py), prefers those whose produce is in season for the region and
+week and those most relevant to the diet text (full-text rank of the foods
+the diet mentions), favors carbohydrates at lunch and proteins at dinner on
+training days, and avoids repeating a recipe or the same main ingredient on
+consecutive meals. It runs in a few milliseconds against an in-process copy
+of the catalog. ``generate_weekly_plan`` uses it as the primary source or as
+the fallback of ``call_ai_api``, depending on ``RECIPE_CATALOG``, and the
+meal details show the steps of catalog recipes.
+
+Usage:
+    python recipes.py [--search "pasta zucchine"]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import func, text
+
+from ingredients import CATEGORIES, FOODS, Item, find_foods, format_item
+from models import db, Recipe
+from nutrition import meal_nutrition
+from rendering import DAYS, MEAL_TYPES
+from screening import compile_screen
+from seasonality import is_in_season, match_produce, normalize, week_months
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "recipes.json"
+)
+FTS_TABLE = "recipe_fts"
+PLAN_MEALS = ("lunch", "dinner")
+_SERVINGS = {key: servings for key, _, _, servings in MEAL_TYPES}
+
+# Score weights used by ``assemble_week``.
+_OUT_OF_SEASON = 2.0
+_REPEATED_RECIPE = 3.0
+_REPEATED_MAIN = 0.8
+_RECENT = 1.5
+_TRAINING = 1.0
+_JITTER = 0.6
+
+
+@dataclass(frozen=True)
+class CatalogRecipe:
+    """In-memory copy of a ``Recipe`` with what the selection needs."""
+
+    id: int
+    slug: str
+    title: str
+    description: str
+    meal_types: tuple[str, ...]
+    focus: str
+    tags: tuple[str, ...]
+    ingredients: tuple[tuple[str, float], ...]
+    steps: tuple[str, ...]
+    kcal: float
+    protein_share: float
+    carbs_share: float
+    produce: tuple[str, ...]
+    main: str
+
+    def meal(self, servings: int) -> dict:
+        """Return the recipe as a meal of the plan JSON."""
+        return {
+            "title": self.title,
+            "description": self.description,
+            "focus": self.focus,
+            "ingredients": [{"name": name, "grams": grams} for name, grams in self.ingredients],
+            "servings": servings,
+            "recipe": self.slug,
+        }
+
+
+def _catalog_recipe(recipe: Recipe) -> CatalogRecipe:
+    ingredients = tuple((item["name"], float(item["grams"])) for item in json.loads(recipe.ingredients))
+    values = meal_nutrition({"ingredients": [{"name": n, "grams": g} for n, g in ingredients]})
+    kcal = values["kcal"] or 1
+    # The main ingredient is the one bringing the most protein.
+    main = max(
+        ingredients,
+        key=lambda item: meal_nutrition({"ingredients": [{"name": item[0], "grams": item[1]}]})["protein_g"],
+    )[0]
+    return CatalogRecipe(
+        id=recipe.id,
+        slug=recipe.slug,
+        title=recipe.title,
+        description=recipe.description,
+        meal_types=tuple(recipe.meal_types.split(",")),
+        focus=recipe.focus or "",
+        tags=tuple(t for t in (recipe.tags or "").split(",") if t),
+        ingredients=ingredients,
+        steps=tuple(json.loads(recipe.steps)),
+        kcal=values["kcal"],
+        protein_share=values["protein_g"] * 4 / kcal,
+        carbs_share=values["carbs_g"] * 4 / kcal,
+        produce=tuple(p for p in (match_produce(n) for n, _ in ingredients) if p),
+        main=main,
+    )
+
+
+def _search_text(entry: dict) -> str:
+    names = " ".join(item["name"] for item in entry["ingredients"])
+    return normalize(" ".join([entry["title"], entry["description"], names, *entry["tags"]]))
+
+
+def _rebuild_index() -> None:
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        db.session.execute(
+            text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "title, search_text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        )
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        db.session.execute(
+            text(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, search_text) "
+                "SELECT id, title, search_text FROM recipe"
+            )
+        )
+    elif dialect == "postgresql":
+        db.session.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_recipe_search_text ON recipe "
+                "USING GIN (to_tsvector('italian', search_text))"
+            )
+        )
+
+
+def sync_catalog(path: str = DATA_PATH) -> int:
+    """Load the recipes of ``path`` into the database and rebuild the index.
+
+    Recipes are matched by slug; those no longer in the file are deleted.
+    Returns the number of recipes in the catalog.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)["recipes"]
+    existing = {recipe.slug: recipe for recipe in Recipe.query.all()}
+    for entry in entries:
+        recipe = existing.pop(entry["slug"], None) or Recipe(slug=entry["slug"])
+        recipe.title = entry["title"]
+        recipe.description = entry["description"]
+        recipe.meal_types = ",".join(entry["meal_types"])
+        recipe.focus = entry["focus"]
+        recipe.tags = ",".join(entry["tags"])
+        recipe.ingredients = json.dumps(entry["ingredients"], ensure_ascii=False)
+        recipe.steps = json.dumps(entry["steps"], ensure_ascii=False)
+        recipe.search_text = _search_text(entry)
+        db.session.add(recipe)
+    for recipe in existing.values():
+        db.session.delete(recipe)
+    db.session.flush()
+    _rebuild_index()
+    db.session.commit()
+    clear_cache()
+    return len(entries)
+
+
+_cache: dict[str, tuple[CatalogRecipe, ...]] = {}
+_cache_lock = threading.Lock()
+
+
+def catalog() -> tuple[CatalogRecipe, ...]:
+    """Return every recipe, loaded once per process and database.
+
+    Returns () while the catalog has not been synced. Requests never sync
+    it: that creates tables and writes every recipe, and concurrent first
+    uses would collide on the slugs.
+    """
+    key = str(db.engine.url)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    recipes = tuple(_catalog_recipe(recipe) for recipe in Recipe.query.order_by(Recipe.id))
+    if recipes:
+        with _cache_lock:
+            _cache[key] = recipes
+    return recipes
+
+
+def clear_cache() -> None:
+    """Forget the in-process catalogs (after a sync, and in tests)."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def search_recipes(query: str, limit: int = 20) -> list[tuple[int, float]]:
+    """Return ``(recipe id, score)`` pairs matching any word of ``query``.
+
+    Higher scores are better. Words shorter than three letters are ignored.
+    """
+    words = sorted({w for w in normalize(query).replace("'", " ").split() if len(w) > 2})
+    if not words:
+        return []
+    if not catalog():
+        # Not synced yet: there is no index to search.
+        return []
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        rows = db.session.execute(
+            text(
+                f"SELECT rowid, -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH :query ORDER BY bm25({FTS_TABLE}) LIMIT :limit"
+            ),
+            {"query": " OR ".join(f'"{w}"' for w in words), "limit": limit},
+        )
+    elif dialect == "postgresql":
+        vector = func.to_tsvector("italian", Recipe.search_text)
+        query_ = func.to_tsquery("italian", " | ".join(words))
+        rank = func.ts_rank(vector, query_)
+        rows = db.session.execute(
+            db.select(Recipe.id, rank).where(vector.op("@@")(query_)).order_by(rank.desc()).limit(limit)
+        )
+    else:
+        score = sum(func.instr(Recipe.search_text, w) > 0 for w in words)
+        rows = db.session.execute(
+            db.select(Recipe.id, score).where(score > 0).order_by(score.desc()).limit(limit)
+        )
+    return [(int(recipe_id), float(score)) for recipe_id, score in rows]
+
+
+def diet_relevance(diet_text: str) -> dict[int, float]:
+    """Return, per recipe id, the full-text rank of the diet's foods (0-1)."""
+    foods = [FOODS[index] for index in find_foods(diet_text or "")]
+    if not foods:
+        return {}
+    ranked = search_recipes(" ".join(foods), limit=len(catalog()))
+    best = max((score for _, score in ranked), default=0) or 1
+    return {recipe_id: score / best for recipe_id, score in ranked}
+
+
+def _training_days(training_days: str | None) -> set[str]:
+    names = {normalize(label): key for key, label in DAYS}
+    names.update({key: key for key, _ in DAYS})
+    return {
+        names[day]
+        for day in (normalize(part) for part in (training_days or "").split(","))
+        if day in names
+    }
+
+
+def _shopping_list(weekly_plan: dict) -> dict[str, list[str]]:
+    grams: dict[str, float] = defaultdict(float)
+    for meals in weekly_plan.values():
+        for meal in meals.values():
+            for item in meal["ingredients"]:
+                grams[item["name"]] += item["grams"] * meal["servings"]
+    shopping_list: dict[str, list[str]] = {
+        "vegetables_fruits": [], "meat_fish_eggs": [], "dairy_cheese": [],
+        "grains_legumes": [], "pantry_condiments": [],
+    }
+    for name, amount in grams.items():
+        food = find_foods(name)[0]
+        shopping_list[CATEGORIES[food]].append(format_item(Item(food, amount, "g", name)))
+    return shopping_list
+
+
+def assemble_week(
+    diet_text: str,
+    preferences: Iterable[str] | None,
+    region: str | None,
+    start_date: date,
+    trains: bool = False,
+    training_days: str | None = None,
+    exclude: Iterable[str] = (),
+) -> dict | None:
+    """Return a weekly plan built from the catalog, or None if it cannot.
+
+    The choice is deterministic for the same inputs, and differs from one
+    week to the next. Recipes titled as in ``exclude`` (recent meals) are
+    avoided.
+    """
+    recipes = catalog()
+    if not recipes:
+        return None
+    screen = compile_screen(preferences or [])
+    allowed = [r for r in recipes if not screen.find(f"{r.title} . {r.description} . {' '.join(n for n, _ in r.ingredients)}")]
+    months = week_months(start_date)
+    in_season = {r.id: all(is_in_season(p, region, months) for p in r.produce) for r in allowed}
+    relevance = diet_relevance(diet_text)
+    training = _training_days(training_days) if trains else set()
+    recent_titles = {normalize(title) for title in exclude}
+    recent = {r.id for r in allowed if normalize(r.title) in recent_titles}
+    digest = hashlib.blake2b(f"{diet_text}|{screen.version}".encode("utf-8"), digest_size=8).hexdigest()
+    rng = random.Random(f"{start_date.isoformat()}|{region}|{digest}")
+
+    weekly_plan: dict[str, dict] = {}
+    used: set[int] = set()
+    previous_main = None
+    for day, _ in DAYS:
+        for meal_type in PLAN_MEALS:
+            candidates = [r for r in allowed if meal_type in r.meal_types]
+            if not candidates:
+                return None
+
+            def score(r: CatalogRecipe) -> float:
+                value = relevance.get(r.id, 0.0) + rng.random() * _JITTER
+                if not in_season[r.id]:
+                    value -= _OUT_OF_SEASON
+                if r.id in used:
+                    value -= _REPEATED_RECIPE
+                if r.id in recent:
+                    value -= _RECENT
+                if r.main == previous_main:
+                    value -= _REPEATED_MAIN
+                if day in training:
+                    value += _TRAINING * (r.carbs_share if meal_type == "lunch" else r.protein_share)
+                return value
+
+            recipe = max(candidates, key=score)
+            used.add(recipe.id)
+            previous_main = recipe.main
+            weekly_plan.setdefault(day, {})[meal_type] = recipe.meal(_SERVINGS[meal_type])
+
+    chosen = {meal["recipe"] for meals in weekly_plan.values() for meal in meals.values()}
+    seasonal = sorted({p for r in allowed if r.slug in chosen for p in r.produce})
+    return {
+        "weekly_plan": weekly_plan,
+        "shopping_list": _shopping_list(weekly_plan),
+        "weekly_summary": {
+            "total_meals": sum(len(meals) for meals in weekly_plan.values()),
+            "dietary_focus": "Piano composto dal ricettario locale in base alla dieta e alle preferenze",
+            "seasonal_highlights": ", ".join(seasonal),
+            "source": "catalog",
+        },
+    }
+
+
+def recipe_steps(slug: str) -> str | None:
+    """Return the numbered preparation steps of the catalog recipe ``slug``."""
+    for recipe in catalog():
+        if recipe.slug == slug:
+            return "\n".join(f"{i}. {step}" for i, step in enumerate(recipe.steps, 1))
+    return None
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--search", help="search the catalog instead of loading it")
+    args = parser.parse_args(argv)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if args.search:
+            titles = {r.id: r.title for r in catalog()}
+            for recipe_id, score in search_recipes(args.search):
+                print(f"{score:6.2f}  {titles[recipe_id]}")
+            return
+        print(f"✅ Ricettario caricato: {sync_catalog()} ricette")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Rendering of the stored plan text and shopping-list HTML.
+
+The weekly plan text and the shopping-list fragment saved on every ``Plan``
+are produced from compiled Jinja templates in ``templates/fragments``. The
+templates are compiled once per process, and rendered fragments are kept in
+a small LRU cache keyed by the plan version (a digest of the structured
+data), so re-rendering an unchanged plan is a dictionary lookup. The
+shopping list, the plain-text list of plans the provider did not write as
+JSON and the digest email are rendered with autoescaping, since their text
+comes straight from the AI provider.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from instrumentation import span
+
+FRAGMENTS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "templates", "fragments"
+)
+
+DAYS = [
+    ("monday", "Lunedì"),
+    ("tuesday", "Martedì"),
+    ("wednesday", "Mercoledì"),
+    ("thursday", "Giovedì"),
+    ("friday", "Venerdì"),
+    ("saturday", "Sabato"),
+    ("sunday", "Domenica"),
+]
+
+# Meal types in display order: (key, Italian label, icon, default servings).
+MEAL_TYPES = [
+    ("breakfast", "Colazione", "☕", 1),
+    ("lunch", "Pranzo", "🥗", 2),
+    ("snack", "Spuntino", "🍎", 1),
+    ("dinner", "Cena", "🍽️", 3),
+]
+
+SHOPPING_CATEGORIES = {
+    "vegetables_fruits": {"name": "VERDURA E FRUTTA", "icon": "🥬", "color": "#28a745"},
+    "meat_fish_eggs": {"name": "CARNE, PESCE E UOVA", "icon": "🥩", "color": "#dc3545"},
+    "dairy_cheese": {"name": "FORMAGGI E LATTICINI", "icon": "🧀", "color": "#ffc107"},
+    "grains_legumes": {"name": "CEREALI E LEGUMI", "icon": "🌾", "color": "#fd7e14"},
+    "pantry_condiments": {"name": "DISPENSA E CONDIMENTI", "icon": "🫙", "color": "#6f42c1"},
+}
+
+_env = Environment(
+    loader=FileSystemLoader(FRAGMENTS_DIR),
+    autoescape=select_autoescape(["html"]),
+    keep_trailing_newline=False,
+)
+
+_CACHE_SIZE = 256
+_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def plan_version(data: Any) -> str:
+    """Return a short digest identifying the content of ``data``."""
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cached(template: str, data: Any, build: Callable[[], str]) -> str:
+    key = (template, plan_version(data))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    with span("render", template=template):
+        rendered = build()
+    with _cache_lock:
+        _cache[key] = rendered
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rendered
+
+
+def clear_cache() -> None:
+    """Drop every cached fragment (used by tests and benchmarks)."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _weekly_plan_context(weekly_plan: Dict[str, Any]) -> dict:
+    days = []
+    for day_en, day_it in DAYS:
+        if day_en not in weekly_plan:
+            continue
+        day_data = weekly_plan[day_en]
+        meals = []
+        for meal_type, label, icon, default_servings in MEAL_TYPES:
+            if meal_type in day_data:
+                meal = day_data[meal_type]
+                meals.append(
+                    {
+                        "label": label,
+                        "icon": icon,
+                        "title": meal.get("title", "N/A"),
+                        "description": meal.get("description", "N/A"),
+                        "focus": meal.get("focus", "N/A"),
+                        "servings": meal.get("servings", default_servings),
+                    }
+                )
+        days.append({"label": day_it.upper(), "meals": meals})
+    return {"days": days}
+
+
+def render_weekly_plan(weekly_plan: Dict[str, Any]) -> str:
+    """Render the weekly plan data into readable text."""
+    if not weekly_plan:
+        return "Piano settimanale non disponibile"
+    return _cached(
+        "weekly_plan.txt",
+        weekly_plan,
+        lambda: _env.get_template("weekly_plan.txt").render(
+            _weekly_plan_context(weekly_plan)
+        ),
+    )
+
+
+def render_shopping_list(shopping_list: Dict[str, List[str]]) -> str:
+    """Render the shopping list data into an escaped HTML fragment."""
+    if not shopping_list:
+        return "<p class='text-muted'>Lista della spesa non disponibile</p>"
+    sections = [
+        dict(SHOPPING_CATEGORIES[category], items=items)
+        for category, items in shopping_list.items()
+        if category in SHOPPING_CATEGORIES and items
+    ]
+    return _cached(
+        "shopping_list.html",
+        shopping_list,
+        lambda: _env.get_template("shopping_list.html").render(sections=sections),
+    )
+
+
+def render_shopping_text(text: str) -> str:
+    """Render a plain-text shopping list (from a non-JSON reply) as an escaped fragment."""
+    return _env.get_template("shopping_text.html").render(text=text)
+
+
+def render_digest_html(username: str, content: str, shopping_list: str) -> str:
+    """Render the HTML body of the digest email.
+
+    ``shopping_list`` is the stored fragment, already escaped when rendered.
+    """
+    return _env.get_template("digest_email.html").render(
+        username=username, content=content, shopping_list=shopping_list
+    )
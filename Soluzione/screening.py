@@ -0,0 +1,396 @@
+"""
+Screening of generated plans against the user's dislikes and allergies.
+
+``Preference.disliked`` is pasted into the prompt, but nothing checked that
+the model actually avoided those foods. ``compile_screen`` expands every
+disliked food through the groups in ``data/food_synonyms.json`` (synonyms,
+derived ingredients and dishes: "lattosio" also covers mozzarella, yogurt,
+besciamella...) and compiles all of them into one Aho-Corasick automaton,
+so every meal title, description and shopping item is scanned in a single
+pass however many terms there are. Matches are whole words, plural and
+singular forms included; "latte di soia" or "pasta senza glutine" are not
+reported. Compiled screens are cached per preference version, so a user's
+dislikes are compiled once per process.
+
+``enforce_preferences`` acts on the violations: the offending meals are sent
+back to the provider, alone, to be rewritten (a replacement is kept only if
+it passes the screen too), and offending shopping items are dropped.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator
+
+from instrumentation import log_event
+from metrics import SCREENING_VIOLATIONS
+from rendering import plan_version
+from seasonality import normalize
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "food_synonyms.json"
+)
+
+# Rounds of slot regeneration before the remaining violations are left as is.
+MAX_ROUNDS = int(os.environ.get("SCREENING_MAX_ROUNDS", 2))
+_CACHE_SIZE = 512
+
+# Phrases that turn a match into an exception: "senza glutine", "gluten free".
+# They cover their own words and the food right before them ("pasta senza
+# glutine"), not the rest of the text.
+_NEGATIONS = ("senza {}", "privo di {}", "priva di {}", "privi di {}", "prive di {}", "{} free")
+_PLURALS = {"o": "i", "a": "e", "e": "i", "i": "oe"}
+
+# Pattern kinds stored in the automaton outputs.
+_HIT, _SAFE, _NEGATE = 0, 1, 2
+
+
+def _load(path: str) -> dict[str, dict[str, list[str]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        groups = json.load(f)["groups"]
+    index = {}
+    for name, group in groups.items():
+        entry = {
+            "names": [normalize(t) for t in [name, *group["aliases"]]],
+            "includes": [normalize(t) for t in group["includes"]],
+            "exceptions": [normalize(t) for t in group["exceptions"]],
+        }
+        for term in entry["names"]:
+            index[term] = entry
+    return index
+
+
+_GROUPS = _load(DATA_PATH)
+
+
+def _forms(term: str) -> set[str]:
+    """Return ``term`` with its last word also in the other number."""
+    forms = {term}
+    head, _, last = term.rpartition(" ")
+    if len(last) > 3:
+        for ending in _PLURALS.get(last[-1], ""):
+            forms.add(f"{head} {last[:-1]}{ending}".strip())
+    return forms
+
+
+def expand(preference: str) -> tuple[set[str], set[str], set[str]]:
+    """Return the terms, exceptions and group names covered by ``preference``."""
+    terms: set[str] = set()
+    exceptions: set[str] = set()
+    names: set[str] = set()
+    pending = [normalize(preference)]
+    seen: set[str] = set()
+    while pending:
+        term = pending.pop()
+        if not term or term in seen:
+            continue
+        seen.add(term)
+        terms.add(term)
+        group = _GROUPS.get(term)
+        if group is None:
+            continue
+        names.update(group["names"])
+        exceptions.update(group["exceptions"])
+        pending.extend(group["names"])
+        pending.extend(group["includes"])
+    if not names:
+        names.add(normalize(preference))
+    return terms, exceptions, names
+
+
+class Automaton:
+    """Aho-Corasick automaton over normalized text, matching whole words."""
+
+    def __init__(self, patterns: Iterable[tuple[str, Any]]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, Any]]] = [[]]
+        for pattern, value in patterns:
+            self._add(f" {pattern} ", value)
+        self._link()
+
+    def _add(self, pattern: str, value: Any) -> None:
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), value))
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def iter(self, text: str) -> Iterator[tuple[int, int, Any]]:
+        """Yield ``(start, end, value)`` for every pattern found in ``text``.
+
+        ``text`` must be normalized; offsets refer to ``f" {text} "``.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(f" {text} ", 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in out[state]:
+                yield end - length, end, value
+
+
+@dataclass(frozen=True)
+class Violation:
+    """A disliked food found in a plan."""
+
+    # ("weekly_plan", day, meal) or ("shopping_list", category, index).
+    location: tuple
+    preference: str
+    match: str
+
+    @property
+    def slot(self) -> tuple[str, str] | None:
+        if self.location[0] != "weekly_plan":
+            return None
+        return self.location[1], self.location[2]
+
+
+class Screen:
+    """Compiled screen for one set of disliked foods."""
+
+    def __init__(self, preferences: Iterable[str]) -> None:
+        self.preferences = tuple(dict.fromkeys(p.strip() for p in preferences if p.strip()))
+        self.version = preference_version(self.preferences)
+        patterns: list[tuple[str, Any]] = []
+        for preference in self.preferences:
+            terms, exceptions, _ = expand(preference)
+            for term in terms:
+                for form in _forms(term):
+                    patterns.append((form, (_HIT, preference)))
+                    patterns.extend((n.format(form), (_NEGATE, preference)) for n in _NEGATIONS)
+            patterns.extend((exception, (_SAFE, preference)) for exception in exceptions)
+        self.automaton = Automaton(patterns)
+
+    def find(self, text: str) -> list[tuple[str, str]]:
+        """Return ``(preference, matched text)`` pairs found in ``text``."""
+        normalized = normalize(text or "")
+        if not normalized:
+            return []
+        hits, safe, negations = [], [], []
+        for start, end, (kind, preference) in self.automaton.iter(normalized):
+            if kind == _HIT:
+                hits.append((start, end, preference))
+            elif kind == _SAFE:
+                safe.append((start, end, preference))
+            else:
+                negations.append((start, end, preference))
+        padded = f" {normalized} "
+        found = {}
+        for start, end, preference in hits:
+            if any(s <= start and end <= e and p == preference for s, e, p in safe):
+                continue
+            # Patterns share the space between words: the food a negation
+            # follows ends one past the negation's start.
+            if any(
+                (s <= start and end <= e or end - 1 == s) and p == preference
+                for s, e, p in negations
+            ):
+                continue
+            found.setdefault((preference, padded[start:end].strip()), None)
+        return list(found)
+
+    def scan(self, plan_data: dict) -> list[Violation]:
+        """Return the violations in the meals and shopping list of ``plan_data``."""
+        violations = []
+        for location, text in _fields(plan_data):
+            for preference, match in self.find(text):
+                violations.append(Violation(location, preference, match))
+        return violations
+
+
+def _fields(plan_data: dict) -> Iterator[tuple[tuple, str]]:
+    weekly_plan = plan_data.get("weekly_plan") or {}
+    for day, meals in weekly_plan.items():
+        if not isinstance(meals, dict):
+            continue
+        for meal_type, meal in meals.items():
+            if isinstance(meal, dict):
+                text = f"{meal.get('title') or ''} . {meal.get('description') or ''}"
+                yield ("weekly_plan", day, meal_type), text
+    shopping_list = plan_data.get("shopping_list") or {}
+    if isinstance(shopping_list, dict):
+        for category, items in shopping_list.items():
+            for index, item in enumerate(items or []):
+                if isinstance(item, str):
+                    yield ("shopping_list", category, index), item
+
+
+def preference_version(preferences: Iterable[str]) -> str:
+    """Return a digest identifying a set of disliked foods."""
+    return plan_version(sorted({normalize(p) for p in preferences}))
+
+
+_cache: OrderedDict[str, Screen] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_screen(preferences: Iterable[str]) -> Screen:
+    """Return the screen for ``preferences``, compiled once per version."""
+    preferences = [p for p in preferences if p and p.strip()]
+    key = preference_version(preferences)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    screen = Screen(preferences)
+    with _cache_lock:
+        _cache[key] = screen
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return screen
+
+
+def clear_cache() -> None:
+    """Drop every compiled screen (used by tests and benchmarks)."""
+    with _cache_lock:
+        _cache.clear()
+
+
+@dataclass
+class ScreenReport:
+    """What ``enforce_preferences`` found and changed."""
+
+    violations: int = 0
+    regenerated: list[tuple[str, str]] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unresolved: list[Violation] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.regenerated or self.removed)
+
+
+def slot_prompt(plan_data: dict, slots: dict[tuple[str, str], set[str]]) -> str:
+    """Return the prompt asking the provider to rewrite only ``slots``."""
+    meals: dict[str, dict] = {}
+    for day, meal_type in slots:
+        meals.setdefault(day, {})[meal_type] = plan_data["weekly_plan"][day][meal_type]
+    avoid = sorted(set().union(*slots.values()))
+    return f"""Alcuni pasti di un piano settimanale contengono alimenti che l'utente non mangia o a cui è allergico: {', '.join(avoid)}.
+Riscrivi SOLO i pasti seguenti senza usare questi alimenti in nessuna forma, nemmeno come derivati o ingredienti secondari, mantenendo lo stesso tipo di pasto, un focus nutrizionale simile e lo stesso numero di porzioni:
+
+{json.dumps({"weekly_plan": meals}, ensure_ascii=False, indent=2)}
+
+Rispondi ESCLUSIVAMENTE con un JSON valido in questo formato, dove shopping_list contiene solo gli ingredienti aggiuntivi necessari per i nuovi pasti:
+{{"weekly_plan": {{"<giorno>": {{"<pasto>": {{"title": "...", "description": "...", "focus": "...", "ingredients": [{{"name": "...", "grams": 80}}], "servings": 2}}}}}},
+ "shopping_list": {{"vegetables_fruits": [], "meat_fish_eggs": [], "dairy_cheese": [], "grains_legumes": [], "pantry_condiments": []}}}}"""
+
+
+def parse_reply(response_text: str) -> dict:
+    """Return the JSON object of a provider reply, or {} when there is none."""
+    text = response_text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _merge(plan_data: dict, reply: dict, slots: Iterable[tuple[str, str]], screen: Screen) -> list[tuple[str, str]]:
+    """Copy the clean replacements of ``slots`` from ``reply``; return those replaced."""
+    replaced = []
+    meals = reply.get("weekly_plan") or {}
+    for day, meal_type in slots:
+        meal = (meals.get(day) or {}).get(meal_type)
+        if not isinstance(meal, dict) or not meal.get("title"):
+            continue
+        if screen.find(f"{meal.get('title')} . {meal.get('description') or ''}"):
+            continue
+        plan_data["weekly_plan"][day][meal_type] = meal
+        replaced.append((day, meal_type))
+    if replaced and isinstance(reply.get("shopping_list"), dict):
+        shopping_list = plan_data.setdefault("shopping_list", {})
+        for category, items in reply["shopping_list"].items():
+            current = shopping_list.setdefault(category, [])
+            current.extend(i for i in items or [] if isinstance(i, str) and i not in current)
+    return replaced
+
+
+def _drop_items(plan_data: dict, violations: list[Violation]) -> list[str]:
+    doomed: dict[str, set[int]] = {}
+    for violation in violations:
+        if violation.location[0] == "shopping_list":
+            doomed.setdefault(violation.location[1], set()).add(violation.location[2])
+    removed = []
+    shopping_list = plan_data.get("shopping_list") or {}
+    for category, indexes in doomed.items():
+        items = shopping_list[category]
+        removed.extend(items[i] for i in sorted(indexes))
+        shopping_list[category] = [item for i, item in enumerate(items) if i not in indexes]
+    return removed
+
+
+def enforce_preferences(
+    plan_data: dict,
+    screen: Screen,
+    ask: Callable[[str], str],
+    max_rounds: int = MAX_ROUNDS,
+) -> ScreenReport:
+    """Fix the violations of ``screen`` in ``plan_data`` in place.
+
+    Violating meals are rewritten by calling ``ask`` with ``slot_prompt``,
+    up to ``max_rounds`` times; violating shopping items are removed,
+    including those the replacements brought in.
+    """
+    report = ScreenReport()
+    violations = screen.scan(plan_data)
+    report.violations = len(violations)
+    for _ in range(max_rounds):
+        slots: dict[tuple[str, str], set[str]] = {}
+        for violation in violations:
+            if violation.slot is not None:
+                slots.setdefault(violation.slot, set()).add(violation.preference)
+        if not slots:
+            break
+        replaced = _merge(plan_data, parse_reply(ask(slot_prompt(plan_data, slots))), slots, screen)
+        report.regenerated.extend(r for r in replaced if r not in report.regenerated)
+        violations = screen.scan(plan_data)
+        if not replaced:
+            break
+    report.removed = _drop_items(plan_data, violations)
+    report.unresolved = [v for v in violations if v.slot is not None]
+
+    SCREENING_VIOLATIONS.labels("regenerated").inc(len(report.regenerated))
+    SCREENING_VIOLATIONS.labels("removed").inc(len(report.removed))
+    SCREENING_VIOLATIONS.labels("unresolved").inc(len(report.unresolved))
+    if report.violations:
+        log_event(
+            "plan_screening",
+            level=logging.WARNING if report.unresolved else logging.INFO,
+            version=screen.version,
+            violations=report.violations,
+            regenerated=["/".join(slot) for slot in report.regenerated],
+            removed=report.removed,
+            unresolved=sorted({f"{v.slot[0]}/{v.slot[1]}: {v.match}" for v in report.unresolved}),
+        )
+    return report
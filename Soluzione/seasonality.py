@@ -0,0 +1,167 @@
+"""
+Bundled index of in-season fruit and vegetables by Italian region and month.
+
+``prompt.txt`` asks the model to use only seasonal produce for the user's
+region, which it had to work out on its own and nobody checked. The
+calendar in ``data/seasonal_produce.json`` lists, for each fruit and
+vegetable, the months it is in season in the north, centre and south of
+Italy; every region maps to one of these areas.
+
+At import the calendar is compiled into one 36-bit integer per produce item
+(bit ``area * 12 + month - 1``) and into a tuple of in-season names per
+``(area, month)``, so both "what is in season?" and "is this in season?" are
+a dictionary lookup and a bit test. ``seasonal_produce`` feeds the short
+list injected into the prompt; ``out_of_season_items`` checks the
+``vegetables_fruits`` of the returned shopping list. Regions outside Italy
+are not covered, and items not in the calendar are never reported.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import unicodedata
+from datetime import date, timedelta
+from typing import Iterable
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "seasonal_produce.json"
+)
+
+MONTHS_IT = [
+    "gennaio", "febbraio", "marzo", "aprile", "maggio", "giugno",
+    "luglio", "agosto", "settembre", "ottobre", "novembre", "dicembre",
+]
+# Pseudo-area used when no Italian region is known: in season anywhere.
+ITALY = "italia"
+_MAX_WORDS = 3
+
+
+def normalize(text: str) -> str:
+    """Lower-case ``text``, drop accents and turn punctuation into spaces."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    ascii_text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z']+", " ", ascii_text).split())
+
+
+def _months(spec: str) -> list[int]:
+    months = []
+    for part in spec.split(","):
+        start, _, end = part.partition("-")
+        first, last = int(start), int(end or start)
+        months.extend(((m - 1) % 12) + 1 for m in range(first, last + 1 if last >= first else last + 13))
+    return months
+
+
+def _load(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    areas = data["areas"]
+    bits: dict[str, int] = {}
+    names: dict[str, str] = {}
+    for name, entry in data["produce"].items():
+        months = entry["months"]
+        mask = 0
+        for index, area in enumerate(areas):
+            spec = months if isinstance(months, str) else months[area]
+            for month in _months(spec):
+                mask |= 1 << (index * 12 + month - 1)
+        bits[name] = mask
+        for alias in [name, *entry["aliases"]]:
+            names[normalize(alias)] = name
+    by_area_month = {
+        (area, month): tuple(
+            name for name, mask in bits.items() if mask >> (index * 12 + month - 1) & 1
+        )
+        for index, area in enumerate(areas)
+        for month in range(1, 13)
+    }
+    for month in range(1, 13):
+        in_season = set().union(*(by_area_month[(area, month)] for area in areas))
+        by_area_month[(ITALY, month)] = tuple(name for name in bits if name in in_season)
+    regions = {normalize(region): area for region, area in data["regions"].items()}
+    return areas, bits, names, by_area_month, regions
+
+
+_AREAS, _BITS, _NAMES, _BY_AREA_MONTH, _REGIONS = _load(DATA_PATH)
+
+
+def area_for_region(region: str | None) -> str | None:
+    """Return the area of an Italian ``region`` such as "Campania, Italy".
+
+    No region (or just "Italia") gives ``ITALY``; regions outside Italy, or
+    not recognized, give ``None``.
+    """
+    if not region:
+        return ITALY
+    parts = [normalize(part) for part in region.split(",")]
+    for part in parts:
+        if part in _REGIONS:
+            return _REGIONS[part]
+    if parts[0] in ("italia", "italy"):
+        return ITALY
+    return None
+
+
+def seasonal_produce(region: str | None, month: int) -> tuple[str, ...]:
+    """Return the produce in season in ``region`` during ``month`` (1-12)."""
+    area = area_for_region(region)
+    if area is None:
+        return ()
+    return _BY_AREA_MONTH[(area, month)]
+
+
+def week_months(start_date: date) -> list[int]:
+    """Return the months spanned by the week starting on ``start_date``."""
+    end = start_date + timedelta(days=6)
+    return sorted({start_date.month, end.month})
+
+
+def produce_for_week(region: str | None, start_date: date) -> tuple[str, ...]:
+    """Return the produce in season in ``region`` at some point of the week."""
+    seen: dict[str, None] = {}
+    for month in week_months(start_date):
+        seen.update(dict.fromkeys(seasonal_produce(region, month)))
+    return tuple(seen)
+
+
+def match_produce(item: str) -> str | None:
+    """Return the calendar name of the produce in a shopping-list ``item``."""
+    words = normalize(item).split()
+    for size in range(min(_MAX_WORDS, len(words)), 0, -1):
+        for start in range(len(words) - size + 1):
+            name = _NAMES.get(" ".join(words[start : start + size]))
+            if name is not None:
+                return name
+    return None
+
+
+def is_in_season(name: str, region: str | None, months: Iterable[int]) -> bool:
+    """Return True if produce ``name`` is in season in any of ``months``."""
+    area = area_for_region(region)
+    mask = _BITS.get(name)
+    if area is None or mask is None:
+        return True
+    indexes = range(len(_AREAS)) if area == ITALY else [_AREAS.index(area)]
+    return any(mask >> (index * 12 + month - 1) & 1 for index in indexes for month in months)
+
+
+def out_of_season_items(items: Iterable[str], region: str | None, start_date: date) -> list[str]:
+    """Return the shopping-list ``items`` that are out of season for the week."""
+    months = week_months(start_date)
+    out = []
+    for item in items:
+        name = match_produce(item)
+        if name is not None and not is_in_season(name, region, months):
+            out.append(item)
+    return out
+
+
+def prompt_section(region: str | None, start_date: date) -> str:
+    """Return the allowed-produce lines for the prompt, or "" if unknown."""
+    produce = produce_for_week(region, start_date)
+    if not produce:
+        return ""
+    months = " / ".join(MONTHS_IT[month - 1] for month in week_months(start_date))
+    return f"FRUTTA E VERDURA DI STAGIONE ({region or 'Italia'}, {months}):\n{', '.join(produce)}\n\n"
@@ -0,0 +1,130 @@
+"""
+Production settings for SQLite databases.
+
+SQLite in its default rollback-journal mode lets a writer block every
+reader while it commits, and two writers racing for the lock can fail with
+"database is locked" before the busy timeout even applies. When
+``SQLITE_TUNING`` is enabled (the default) every new connection to a SQLite
+database is set up with:
+
+* ``journal_mode=WAL``: readers keep reading while a writer commits;
+* ``synchronous=NORMAL``: safe with WAL, and one fsync per checkpoint
+  instead of one per commit;
+* ``mmap_size``, ``cache_size`` and ``busy_timeout`` from the
+  ``SQLITE_MMAP_SIZE``, ``SQLITE_CACHE_SIZE_KIB`` and
+  ``SQLITE_BUSY_TIMEOUT_MS`` settings.
+
+Writers of the same database in one process are also serialized through a
+lock, so they wait in Python instead of spinning on SQLite's file lock
+(waiters get it in no particular order, which is enough here). The lock is taken at a session's first flush or ORM DML statement and
+released when its transaction ends; a writer waits for it at most
+``SQLITE_WRITE_QUEUE_TIMEOUT`` seconds before trying SQLite anyway. Writers
+in other processes (several gunicorn workers) still wait on
+``busy_timeout``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from db_routing import replica_engine
+from instrumentation import log_event
+from models import db
+
+_HELD = "fame_sqlite_write_lock"
+# Database URL -> (writer lock, seconds to wait for it).
+_write_locks: dict[str, tuple[threading.Lock, float]] = {}
+_session_listeners_installed = False
+
+
+def _pragmas(config: dict) -> list[str]:
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        # A negative cache_size is a size in KiB rather than in pages.
+        f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KIB'])}",
+    ]
+
+
+def _url(engine: Any) -> str | None:
+    url = getattr(engine, "url", None)
+    return url.render_as_string(hide_password=False) if url is not None else None
+
+
+def _acquire_write_lock(session: Session) -> None:
+    if _HELD in session.info:
+        return
+    entry = _write_locks.get(_url(session.get_bind()))
+    if entry is None:
+        return
+    lock, timeout = entry
+    if lock.acquire(timeout=timeout):
+        session.info[_HELD] = lock
+    else:
+        # Fall back to SQLite's own busy handling rather than failing here.
+        log_event("sqlite_write_lock_timeout", level=logging.WARNING, timeout_s=timeout)
+
+
+def _before_flush(session, flush_context, instances) -> None:
+    _acquire_write_lock(session)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _acquire_write_lock(orm_execute_state.session)
+
+
+def _after_transaction_end(session, transaction) -> None:
+    if transaction.parent is None and _HELD in session.info:
+        session.info.pop(_HELD).release()
+
+
+def _install_session_listeners() -> None:
+    global _session_listeners_installed
+    if _session_listeners_installed:
+        return
+    event.listen(Session, "before_flush", _before_flush)
+    event.listen(Session, "do_orm_execute", _do_orm_execute)
+    event.listen(Session, "after_transaction_end", _after_transaction_end)
+    _session_listeners_installed = True
+
+
+def tune_engine(engine: Engine, config: dict) -> None:
+    """Apply the pragmas to every new connection of a SQLite ``engine``."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = _pragmas(config)
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    _write_locks.setdefault(
+        _url(engine), (threading.Lock(), float(config["SQLITE_WRITE_QUEUE_TIMEOUT"]))
+    )
+    _install_session_listeners()
+
+
+def init_app(app: Flask) -> None:
+    """Tune the application's SQLite engines when ``SQLITE_TUNING`` is on."""
+    if not app.config.get("SQLITE_TUNING"):
+        return
+    with app.app_context():
+        engines = [db.engine, replica_engine(app)]
+    for engine in engines:
+        if engine is not None:
+            tune_engine(engine, app.config)
@@ -0,0 +1,118 @@
+"""
+Compact, compressed storage for the large text columns.
+
+Diets and plans are the bulk of the database: a plan used to hold its JSON
+pretty-printed with ``indent=2``, plus the plan text and the shopping-list
+HTML rendered from that same JSON. The column types defined here keep one
+compact representation on disk:
+
+* ``CompressedText`` stores text as bytes, compressed with zlib (or zstd when
+  ``STORAGE_COMPRESSION=zstd`` and the ``zstandard`` package is installed)
+  once it is at least ``STORAGE_COMPRESS_MIN_BYTES`` long and compression
+  actually saves space. Short values are stored as plain UTF-8.
+* ``CompactJSONText`` additionally re-serializes valid JSON without
+  indentation or spaces before storing it; anything else is stored as is.
+
+Compressed values start with a one-byte tag (``\\x01`` zlib, ``\\x02`` zstd),
+which never starts plain text. Values written before these types existed
+are read back unchanged, as SQLite returns them as ``str``.
+
+On PostgreSQL the columns stay ``TEXT`` and values are stored uncompressed
+(PostgreSQL already compresses large values itself, with TOAST): no column
+has to be converted before the new code can write, and instances still
+running the previous release keep reading what the new one writes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import zlib
+from typing import Any
+
+from sqlalchemy.types import LargeBinary, Text, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+_ZLIB = b"\x01"
+_ZSTD = b"\x02"
+
+COMPRESSION: str = os.environ.get("STORAGE_COMPRESSION", "zlib").lower()
+COMPRESS_MIN_BYTES: int = int(os.environ.get("STORAGE_COMPRESS_MIN_BYTES", 256))
+
+
+def compress_text(value: str, method: str | None = None) -> bytes:
+    """Encode ``value`` for storage, compressing it when that pays off."""
+    raw = value.encode("utf-8")
+    # Text starting with a tag byte is always compressed, so it is never
+    # mistaken for a compressed value on the way back.
+    if len(raw) < COMPRESS_MIN_BYTES and raw[:1] not in (_ZLIB, _ZSTD):
+        return raw
+    if (method or COMPRESSION) == "zstd" and zstandard is not None:
+        packed = _ZSTD + zstandard.ZstdCompressor(level=9).compress(raw)
+    else:
+        packed = _ZLIB + zlib.compress(raw, 9)
+    return packed if len(packed) < len(raw) or raw[:1] in (_ZLIB, _ZSTD) else raw
+
+
+def decompress_text(value: bytes | memoryview | str) -> str:
+    """Decode a value written by ``compress_text`` (or a legacy text value)."""
+    if isinstance(value, str):
+        return value
+    data = bytes(value)
+    tag = data[:1]
+    if tag == _ZLIB:
+        return zlib.decompress(data[1:]).decode("utf-8")
+    if tag == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed value but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data[1:]).decode("utf-8")
+    return data.decode("utf-8")
+
+
+def compact_json(value: str) -> str:
+    """Return ``value`` re-serialized without whitespace if it is valid JSON."""
+    try:
+        data = json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored as (possibly compressed) bytes; plain ``TEXT`` on PostgreSQL."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return Text()
+        return LargeBinary()
+
+    def _encode(self, value: str, dialect) -> str | bytes:
+        return value if dialect.name == "postgresql" else compress_text(value)
+
+    def process_bind_param(self, value: Any, dialect) -> str | bytes | None:
+        if value is None:
+            return None
+        return self._encode(value, dialect)
+
+    def process_result_value(self, value: Any, dialect) -> str | None:
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+class CompactJSONText(CompressedText):
+    """``CompressedText`` that stores JSON documents in compact form."""
+
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> str | bytes | None:
+        if value is None:
+            return None
+        return self._encode(compact_json(value), dialect)
@@ -0,0 +1,78 @@
+"""
+Tests for the legacy plan JSON backfill job.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from app import create_app, load_structured_plan
+from backfill_plan_json import run_backfill
+from models import db, Plan, User
+from utils import format_weekly_plan, get_dummy_response, parse_plan_response
+
+
+class BackfillPlanJsonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+        self.weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        text = format_weekly_plan(self.weekly_plan)
+        for i in range(5):
+            db.session.add(
+                Plan(user_id=1, start_date=date(2025, 1, 6) + timedelta(weeks=i), content=text,
+                     json_content="{}", shopping_list="")
+            )
+        db.session.add(
+            Plan(user_id=1, start_date=date(2025, 2, 10), content="testo libero",
+                 json_content=None, shopping_list="")
+        )
+        db.session.add(
+            Plan(user_id=1, start_date=date(2025, 2, 17), content=text,
+                 json_content=get_dummy_response(), shopping_list="")
+        )
+        db.session.commit()
+        self.checkpoint = os.path.join(self.tmpdir.name, "checkpoint.json")
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def test_converts_legacy_rows_in_batches(self):
+        report = run_backfill(batch_size=2, checkpoint_path=self.checkpoint)
+        self.assertEqual((report.scanned, report.converted, report.empty), (6, 5, 1))
+        self.assertEqual(report.batches, 3)
+        for plan in Plan.query.all():
+            data = json.loads(plan.json_content)
+            self.assertIn("weekly_plan", data)
+        self.assertEqual(load_structured_plan(db.session.get(Plan, 1)), self.weekly_plan)
+
+    def test_resumes_after_last_checkpointed_id(self):
+        run_backfill(batch_size=2, checkpoint_path=self.checkpoint)
+        db.session.get(Plan, 1).json_content = "{}"
+        db.session.commit()
+        # Id 1 is behind the checkpoint, so a resumed run does not revisit it.
+        report = run_backfill(batch_size=2, checkpoint_path=self.checkpoint)
+        self.assertEqual(report.scanned, 0)
+
+    def test_new_text_plans_are_stored_structured(self):
+        plan_text, _, raw_json = parse_plan_response(format_weekly_plan(self.weekly_plan))
+        self.assertEqual(json.loads(raw_json)["weekly_plan"], self.weekly_plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
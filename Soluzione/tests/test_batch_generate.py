@@ -0,0 +1,121 @@
+"""
+Tests for the offline batch plan generator.
+
+The generator is exercised against a temporary SQLite database with the
+local stub provider, so no network access or API keys are required.
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from app import create_app
+from batch_generate import run_batch, stub_provider
+from models import db, User, Diet, EmailDelivery, IdempotencyKey, Plan, Preference
+
+
+class BatchGenerateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i in range(3):
+            db.session.add(
+                User(username=f"user{i}", email=f"user{i}@example.com", password="x")
+            )
+        db.session.commit()
+        # Only the first two users have a diet; user 0 uploaded twice.
+        db.session.add_all(
+            [
+                Diet(user_id=1, content="old diet"),
+                Diet(user_id=1, content="new diet"),
+                Diet(user_id=2, content="diet"),
+                Preference(user_id=1, disliked="funghi, olive"),
+            ]
+        )
+        db.session.commit()
+        self.start_date = date(2025, 1, 6)
+        self.checkpoint = os.path.join(self.tmpdir.name, "checkpoint.json")
+        self.prompts = []
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def recording_provider(self, prompt, provider, api_key):
+        self.prompts.append(prompt)
+        return stub_provider(prompt, provider, api_key)
+
+    def test_generates_one_plan_per_user_with_diet(self):
+        report = run_batch(
+            self.start_date, self.recording_provider, checkpoint_path=self.checkpoint
+        )
+        self.assertEqual(report.selected, 2)
+        self.assertEqual(report.generated, 2)
+        plans = Plan.query.order_by(Plan.user_id).all()
+        self.assertEqual([p.user_id for p in plans], [1, 2])
+        self.assertTrue(all(p.start_date == self.start_date for p in plans))
+        self.assertIn("new diet", self.prompts[0])
+        self.assertNotIn("old diet", self.prompts[0])
+        self.assertIn("funghi, olive", self.prompts[0])
+        # The sample plan has olives: the meal was sent back alone, and the
+        # olives removed from the shopping list.
+        rewrites = [p for p in self.prompts if p.startswith("Alcuni pasti")]
+        self.assertEqual(len(rewrites), 1)
+        self.assertIn("olive", rewrites[0])
+        self.assertNotIn("olive nere", plans[0].json_content)
+
+    def test_replaced_plans_leave_no_orphans(self):
+        plan = Plan(user_id=1, start_date=self.start_date, content="vecchio", json_content="{}", shopping_list="")
+        db.session.add(plan)
+        db.session.flush()
+        db.session.add(EmailDelivery(plan_id=plan.id, recipient="user0@example.com", status="sent", attempts=1))
+        db.session.add(IdempotencyKey(user_id=1, key="abc", plan_id=plan.id))
+        db.session.commit()
+        run_batch(self.start_date, stub_provider, checkpoint_path=self.checkpoint)
+        db.session.expire_all()
+        self.assertNotEqual(Plan.query.filter_by(user_id=1).one().content, "vecchio")
+        self.assertEqual(EmailDelivery.query.count(), 0)
+        self.assertIsNone(IdempotencyKey.query.one().plan_id)
+        self.assertEqual(Plan.query.count(), 2)
+
+    def test_rerun_resumes_from_checkpoint(self):
+        run_batch(self.start_date, self.recording_provider, checkpoint_path=self.checkpoint)
+        # Two plans and their steps, plus one call rewriting user 0's meals with olives.
+        self.assertEqual(len(self.prompts), 5)
+        report = run_batch(
+            self.start_date, self.recording_provider, checkpoint_path=self.checkpoint
+        )
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual(report.generated, 0)
+        self.assertEqual(len(self.prompts), 5)
+        self.assertEqual(Plan.query.count(), 2)
+
+    def test_failed_users_are_retried(self):
+        def flaky_provider(prompt, provider, api_key):
+            if "new diet" in prompt:
+                raise RuntimeError("provider down")
+            return stub_provider(prompt, provider, api_key)
+
+        report = run_batch(self.start_date, flaky_provider, checkpoint_path=self.checkpoint)
+        self.assertEqual((report.generated, report.failed), (1, 1))
+        report = run_batch(
+            self.start_date, self.recording_provider, checkpoint_path=self.checkpoint
+        )
+        self.assertEqual((report.generated, report.skipped), (1, 1))
+        self.assertEqual(Plan.query.count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
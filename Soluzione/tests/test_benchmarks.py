@@ -0,0 +1,91 @@
+"""
+Tests for the offline benchmark tooling: the fake LLM server and fixtures.
+"""
+
+import json
+import os
+import random
+import unittest
+from io import BytesIO
+from unittest import mock
+
+import requests
+from werkzeug.datastructures import FileStorage
+
+from app import extract_text_from_file
+from benchmarks.bench_scenarios import find_regressions, percentile
+from benchmarks.fake_llm_server import FakeLLMServer
+from benchmarks.fixtures import synthetic_diet_text, synthetic_pdf
+from utils import call_claude_api, call_gemini_api, call_openai_api, get_dummy_response
+
+
+class FakeLLMServerTestCase(unittest.TestCase):
+    def test_every_provider_returns_a_plan(self):
+        with FakeLLMServer(seed=1) as server, mock.patch.dict(os.environ, server.environ()):
+            for call in (call_gemini_api, call_openai_api, call_claude_api):
+                with self.subTest(call=call.__name__):
+                    data = json.loads(call("prompt", "key"))
+                    self.assertEqual(len(data["weekly_plan"]), 7)
+                    self.assertIn("breakfast", data["weekly_plan"]["monday"])
+            self.assertEqual(server.requests, 3)
+
+    def test_injected_errors_fall_back_to_dummy(self):
+        with FakeLLMServer(error_rate=1.0) as server, mock.patch.dict(os.environ, server.environ()):
+            self.assertEqual(call_openai_api("prompt", "key"), get_dummy_response())
+            # Gemini tries each of its four models before giving up.
+            self.assertEqual(call_gemini_api("prompt", "key"), get_dummy_response())
+            self.assertEqual(server.errors, 5)
+
+    def test_same_seed_same_answers(self):
+        answers = []
+        for _ in range(2):
+            with FakeLLMServer(seed=7) as server, mock.patch.dict(os.environ, server.environ()):
+                answers.append([call_claude_api("prompt", "key") for _ in range(3)])
+        self.assertEqual(answers[0], answers[1])
+
+    def test_streaming_chunks_reassemble_the_answer(self):
+        with FakeLLMServer(seed=3, stream_chunks=5) as server:
+            complete = requests.post(
+                f"{server.base_url}/v1/chat/completions", json={}, timeout=5
+            ).json()["choices"][0]["message"]["content"]
+        with FakeLLMServer(seed=3, stream_chunks=5) as server:
+            response = requests.post(
+                f"{server.base_url}/v1/chat/completions", json={"stream": True}, timeout=5
+            )
+        events = [
+            line[len("data: "):]
+            for line in response.text.splitlines()
+            if line.startswith("data: ")
+        ]
+        self.assertEqual(events[-1], "[DONE]")
+        self.assertEqual(len(events), 6)
+        streamed = "".join(
+            json.loads(event)["choices"][0]["delta"]["content"] for event in events[:-1]
+        )
+        self.assertEqual(streamed, complete)
+
+
+class FixturesTestCase(unittest.TestCase):
+    def test_synthetic_pdf_is_extracted(self):
+        text = synthetic_diet_text(random.Random(0), lines=100)
+        pdf = FileStorage(BytesIO(synthetic_pdf(text)), filename="dieta.pdf")
+        extracted = extract_text_from_file(pdf)
+        self.assertIn("Piano alimentare personalizzato", extracted)
+        self.assertIn(text.splitlines()[-1], extracted)
+
+    def test_percentiles_and_regressions(self):
+        values = [i / 100 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 0.5)
+        self.assertEqual(percentile(values, 99), 0.99)
+        self.assertEqual(percentile([], 95), 0.0)
+        regressions = find_regressions(
+            {"view": {"p95_ms": 15.0}, "upload": {"p95_ms": 100.0}},
+            {"view": {"p95_ms": 10.0}, "upload": {"p95_ms": 95.0}},
+            tolerance=0.25,
+        )
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("view"))
+
+
+if __name__ == "__main__":
+    unittest.main()
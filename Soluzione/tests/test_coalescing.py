@@ -0,0 +1,146 @@
+"""
+Tests for single-flight plan generation and idempotency keys.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from app import create_app
+from coalescing import SingleFlight, find_key, store_plan
+from models import db, Diet, IdempotencyKey, Plan, User
+from utils import get_dummy_response, parse_plan_response
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, outcomes = [], []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "piano"
+
+        def caller():
+            outcomes.append(flights.run(("u", 1), work))
+
+        threads = [threading.Thread(target=caller) for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(outcomes), [("piano", False), ("piano", True), ("piano", True)])
+        # Once done, the next call runs again.
+        self.assertEqual(flights.run(("u", 1), lambda: "nuovo"), ("nuovo", False))
+
+    def test_errors_are_raised_and_the_key_freed(self):
+        flights = SingleFlight()
+        with self.assertRaises(ValueError):
+            flights.run("k", lambda: (_ for _ in ()).throw(ValueError("provider")))
+        self.assertEqual(flights.run("k", lambda: 1), (1, False))
+
+
+class GeneratePlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+                "RECIPE_CATALOG": "off",
+            }
+        )
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+            db.session.add(Diet(user_id=1, content="Dieta mediterranea"))
+            db.session.commit()
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def _client(self):
+        client = self.app.test_client()
+        client.get("/login")
+        with client.session_transaction() as session:
+            session["_user_id"] = "1"
+        return client
+
+    def _generate(self, *args):
+        self.calls.append(args)
+        self.release.wait(5)
+        return parse_plan_response(get_dummy_response())
+
+    def test_idempotency_key_replays_the_stored_plan(self):
+        client = self._client()
+        with patch("app.generate_weekly_plan", side_effect=self._generate), redirect_stdout(StringIO()):
+            client.post("/generate_plan", headers={"Idempotency-Key": "abc"})
+            response = client.post("/generate_plan", data={"idempotency_key": "abc"}, follow_redirects=True)
+            self.assertIn("This plan was already generated.", response.get_data(as_text=True))
+            self.assertEqual(len(self.calls), 1)
+            # Another key generates again and replaces the plan.
+            client.post("/generate_plan", headers={"Idempotency-Key": "def"})
+        self.assertEqual(len(self.calls), 2)
+        with self.app.app_context():
+            self.assertEqual(Plan.query.count(), 1)
+            self.assertEqual(IdempotencyKey.query.count(), 2)
+
+    def test_concurrent_requests_share_one_generation(self):
+        self.release.clear()
+        responses = []
+
+        def post(key):
+            responses.append(self._client().post("/generate_plan", data={"idempotency_key": key}))
+
+        with patch("app.generate_weekly_plan", side_effect=self._generate), redirect_stdout(StringIO()):
+            threads = [threading.Thread(target=post, args=(key,)) for key in ("a", "b")]
+            threads[0].start()
+            while not self.calls:
+                time.sleep(0.01)
+            threads[1].start()
+            time.sleep(0.3)
+            self.release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([response.status_code for response in responses], [302, 302])
+        with self.app.app_context():
+            self.assertEqual(Plan.query.count(), 1)
+
+    def test_store_plan(self):
+        result = parse_plan_response(get_dummy_response())
+        with self.app.app_context():
+            db.session.add(
+                IdempotencyKey(user_id=1, key="old", plan_id=None, created_at=datetime.utcnow() - timedelta(days=2))
+            )
+            db.session.commit()
+            self.assertIsNone(find_key(1, "old"))
+            first = store_plan(1, date(2025, 1, 6), result, "old")
+            store_plan(1, date(2025, 1, 6), result)
+            self.assertEqual(Plan.query.count(), 1)
+            # The expired record made way for the new one.
+            self.assertEqual(find_key(1, "old").plan_id, first.id)
+            self.assertEqual(IdempotencyKey.query.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests for read-replica routing, using two SQLite files as primary and replica.
+
+The "replica" is seeded with different plan content than the primary, so the
+responses show which database served each query.
+"""
+
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+
+from sqlalchemy.orm import Session
+
+from app import create_app
+from db_routing import replica_engine
+from models import db, Diet, Plan, User
+
+
+def plan(title: str) -> Plan:
+    return Plan(
+        user_id=1,
+        start_date=date(2025, 1, 6),
+        content=title,
+        json_content='{"weekly_plan": {"monday": {"lunch": {"title": "%s"}}}}' % title,
+        shopping_list="",
+    )
+
+
+def seed(session, title: str) -> None:
+    session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+    session.add(Diet(user_id=1, content="Dieta mediterranea"))
+    session.add(plan(title))
+    session.commit()
+
+
+class DbRoutingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "primary.db"),
+                "REPLICA_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "replica.db"),
+                "REPLICA_STICKY_SECONDS": 60,
+                "RECIPE_CATALOG": "off",
+            }
+        )
+        with self.app.app_context():
+            db.create_all()
+            seed(db.session, "Primaria")
+            replica = replica_engine(self.app)
+            db.metadata.create_all(replica)
+            with Session(replica) as replica_session:
+                seed(replica_session, "Replica")
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        replica_engine(self.app).dispose()
+        self.tmpdir.cleanup()
+
+    def meal_title(self):
+        return self.client.get("/api/meal_details/monday/lunch").get_json()["title"]
+
+    def test_read_only_views_use_the_replica(self):
+        self.assertEqual(self.meal_title(), "Replica")
+        self.assertIn("Replica", self.client.get("/plan").get_data(as_text=True))
+
+    def test_other_views_use_the_primary(self):
+        body = self.client.get("/").get_data(as_text=True)
+        self.assertIn("Primaria", body)
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        with redirect_stdout(StringIO()):
+            self.client.post("/generate_plan")
+        # The new plan only exists on the primary; it must be visible at once.
+        self.assertEqual(self.meal_title(), "Insalata di quinoa mediterranea")
+        with self.app.app_context():
+            self.assertEqual(Plan.query.count(), 2)
+
+    def test_engine_options_are_applied(self):
+        with self.app.app_context():
+            for engine in (db.engine, replica_engine(self.app)):
+                self.assertTrue(engine.pool._pre_ping)
+                self.assertEqual(engine.pool._recycle, 1800)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests for the weekly digest sender, run against the local SMTP sink.
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from app import create_app
+from benchmarks.smtp_sink import SMTPSink
+from email_digest import SMTPConnection, html_to_text, send_digest, smtp_route
+from models import db, EmailDelivery, Plan, User
+from utils import format_shopping_list
+
+
+class EmailDigestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.sink = SMTPSink().__enter__()
+        host, port = self.sink.address
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+                "MAIL_SERVER": host,
+                "MAIL_PORT": port,
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.start_date = date(2025, 1, 6)
+        emails = ["anna@example.com", "reject@example.com", "luca@example.com"]
+        for i, email in enumerate(emails, start=1):
+            db.session.add(User(id=i, username=f"user{i}", email=email, password="x"))
+            db.session.add(
+                Plan(
+                    user_id=i,
+                    start_date=self.start_date,
+                    content="Lunedì: pasta",
+                    shopping_list=format_shopping_list({"dairy_cheese": ["feta 200g"]}),
+                )
+            )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.sink.__exit__(None, None, None)
+        self.tmpdir.cleanup()
+
+    def test_sends_over_persistent_connections_and_tracks_status(self):
+        report = send_digest(self.start_date, connections=1)
+        self.assertEqual(sorted(report.sent), ["anna@example.com", "luca@example.com"])
+        self.assertIn("reject@example.com", report.failed)
+        self.assertEqual(self.sink.messages, 2)
+        self.assertEqual(self.sink.connections, 1)
+        statuses = {d.recipient: d.status for d in EmailDelivery.query}
+        self.assertEqual(statuses["reject@example.com"], "failed")
+        self.assertEqual(statuses["anna@example.com"], "sent")
+
+    def test_rerun_only_retries_failures(self):
+        send_digest(self.start_date, connections=2)
+        report = send_digest(self.start_date, connections=2)
+        self.assertEqual(report.sent, [])
+        self.assertEqual(list(report.failed), ["reject@example.com"])
+        self.assertEqual(self.sink.messages, 2)
+        failed = EmailDelivery.query.filter_by(recipient="reject@example.com").one()
+        self.assertEqual(failed.attempts, 2)
+
+    def test_outcomes_are_recorded_after_each_batch(self):
+        send = SMTPConnection.send
+
+        def crash_on_luca(connection, sender, message):
+            if message.recipient == "luca@example.com":
+                raise RuntimeError("job killed")
+            send(connection, sender, message)
+
+        with patch.object(SMTPConnection, "send", crash_on_luca), self.assertRaises(RuntimeError):
+            send_digest(self.start_date, connections=1, batch_size=1)
+        statuses = {d.recipient: d.status for d in EmailDelivery.query}
+        self.assertEqual(statuses, {"anna@example.com": "sent", "reject@example.com": "failed"})
+        report = send_digest(self.start_date, connections=1, batch_size=1)
+        self.assertEqual(report.sent, ["luca@example.com"])
+        self.assertEqual(self.sink.messages, 2)
+
+    def test_smtp_route_by_domain(self):
+        routes = {"corp.it": "mx.corp.it:2525"}
+        self.assertEqual(smtp_route("a@corp.it", routes, ("smtp", 25)), ("mx.corp.it", 2525))
+        self.assertEqual(smtp_route("a@other.it", routes, ("smtp", 25)), ("smtp", 25))
+
+    def test_html_to_text(self):
+        text = html_to_text(format_shopping_list({"dairy_cheese": ["feta 200g"]}))
+        self.assertIn("feta 200g", text)
+        self.assertNotIn("<", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Tests for the CSV, PDF and ICS exports of a plan.
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from pypdf import PdfReader
+
+import exports
+from app import create_app
+from exports import cached, clear_cache, meals_ics, shopping_csv, shopping_pdf
+from models import db, User, Plan
+from utils import get_dummy_response
+
+
+class ExportFormatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.plan = json.loads(get_dummy_response())
+
+    def test_csv(self):
+        chunks = list(shopping_csv({"grains_legumes": [f"riso {i}g" for i in range(1, 251)]}))
+        self.assertEqual(len(chunks), 3)
+        text = b"".join(shopping_csv(self.plan["shopping_list"])).decode("utf-8-sig")
+        rows = list(csv.reader(io.StringIO(text), delimiter=";"))
+        self.assertEqual(rows[0], ["categoria", "articolo", "quantita", "unita", "alimento"])
+        self.assertIn(["VERDURA E FRUTTA", "pomodorini", "500", "g", "pomodori"], rows)
+        self.assertIn(["VERDURA E FRUTTA", "limoni", "4", "pz", "limoni"], rows)
+
+    def test_pdf(self):
+        title = "Lista della spesa - settimana dal 06/01/2025"
+        reader = PdfReader(io.BytesIO(b"".join(shopping_pdf(title, self.plan["shopping_list"]))))
+        self.assertEqual(len(reader.pages), 1)
+        text = reader.pages[0].extract_text()
+        self.assertIn(title, text)
+        self.assertIn("CARNE, PESCE E UOVA", text)
+        self.assertIn("pomodorini 500g", text)
+        # Long lists continue on more pages.
+        long_list = {"grains_legumes": [f"riso ({i}) {i}g" for i in range(1, 301)]}
+        reader = PdfReader(io.BytesIO(b"".join(shopping_pdf("Più pagine", long_list))))
+        self.assertGreater(len(reader.pages), 1)
+        self.assertIn("Più pagine", reader.pages[0].extract_text())
+        self.assertIn("riso (300) 300g", reader.pages[-1].extract_text())
+
+    def test_ics(self):
+        text = b"".join(meals_ics(7, self.plan["weekly_plan"], date(2025, 1, 6), None)).decode("utf-8")
+        self.assertTrue(text.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(text.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(text.count("BEGIN:VEVENT"), 14)
+        self.assertIn("UID:plan-7-monday-lunch@fame", text)
+        self.assertIn("DTSTART:20250106T130000", text)
+        self.assertIn("DTSTART:20250112T200000", text)
+        self.assertIn("SUMMARY:Cena: Salmone al limone con verdure", text)
+        self.assertTrue(all(len(line.encode("utf-8")) <= 75 for line in text.split("\r\n")))
+
+    def test_cache(self):
+        clear_cache()
+        calls = []
+
+        def build():
+            calls.append(1)
+            yield b"a"
+            yield b"b"
+
+        self.assertEqual(list(cached("csv", "v1", build)), [b"a", b"b"])
+        self.assertEqual(list(cached("csv", "v1", build)), [b"ab"])
+        self.assertEqual(len(calls), 1)
+        with patch.object(exports, "CACHE_MAX_BYTES", 1):
+            self.assertEqual(list(cached("csv", "v2", build)), [b"a", b"b"])
+            list(cached("csv", "v2", build))
+        self.assertEqual(len(calls), 3)
+
+
+class ExportRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        with self.app.app_context():
+            db.session.add(User(username="u", email="u@example.com", password="x"))
+            db.session.add(User(username="v", email="v@example.com", password="x"))
+            db.session.add(
+                Plan(user_id=1, start_date=date(2025, 1, 6), content="", json_content=get_dummy_response(), shopping_list="")
+            )
+            db.session.add(
+                Plan(user_id=1, start_date=date(2024, 12, 30), content="Lunedì: pasta", json_content="{}", shopping_list="<p>pane</p>")
+            )
+            db.session.add(
+                Plan(user_id=2, start_date=date(2025, 1, 6), content="", json_content=get_dummy_response(), shopping_list="")
+            )
+            db.session.commit()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        clear_cache()
+        self.tmpdir.cleanup()
+
+    def test_downloads(self):
+        response = self.client.get("/plans/1/shopping_list.csv")
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn('filename="lista-spesa-2025-01-06.csv"', response.headers["Content-Disposition"])
+        self.assertIn("pomodorini;500;g", response.get_data(as_text=True))
+        response = self.client.get("/plans/1/shopping_list.pdf")
+        self.assertEqual(response.mimetype, "application/pdf")
+        self.assertTrue(response.data.startswith(b"%PDF-1.4"))
+        response = self.client.get("/plans/1/meals.ics")
+        self.assertEqual(response.mimetype, "text/calendar")
+        self.assertEqual(response.get_data(as_text=True).count("BEGIN:VEVENT"), 14)
+
+    def test_etag(self):
+        etag = self.client.get("/plans/1/shopping_list.csv").headers["ETag"]
+        response = self.client.get("/plans/1/shopping_list.csv", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get("/plans/1/shopping_list.pdf").headers["ETag"], etag)
+
+    def test_unavailable_exports(self):
+        # Other users' plans, text-only plans and unknown formats.
+        self.assertEqual(self.client.get("/plans/3/shopping_list.csv").status_code, 302)
+        self.assertEqual(self.client.get("/plans/2/shopping_list.csv").status_code, 302)
+        self.assertEqual(self.client.get("/plans/1/shopping_list.xls").status_code, 302)
+        # The calendar of a text-only plan comes from its parsed text.
+        self.assertEqual(self.client.get("/plans/2/meals.ics").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
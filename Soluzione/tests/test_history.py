@@ -0,0 +1,128 @@
+"""
+Tests for the paginated plan history and the plan retention job.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from archive_plans import count_expired, run_archive
+from history import InvalidCursor, decode_cursor, plan_history_page
+from models import db, ArchivedPlan, EmailDelivery, Plan, User
+from utils import get_dummy_response, parse_plan_response
+
+NOW = datetime(2025, 6, 2, 12, 0)
+
+
+class PlanHistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        plan_text, shopping_list, raw_json = parse_plan_response(get_dummy_response())
+        with self.app.app_context():
+            db.create_all()
+            for user_id in (1, 2):
+                db.session.add(
+                    User(id=user_id, username=f"user{user_id}", email=f"u{user_id}@example.com", password="x")
+                )
+            # User 1 has a plan a week for 30 weeks, the last two created at
+            # the same instant; user 2 has a single old plan.
+            for week in range(30):
+                db.session.add(
+                    Plan(
+                        user_id=1,
+                        start_date=date(2025, 6, 2) - timedelta(weeks=week),
+                        created_at=NOW - timedelta(weeks=max(week, 1)),
+                        content=plan_text,
+                        json_content=raw_json,
+                        shopping_list=shopping_list,
+                    )
+                )
+            db.session.add(
+                Plan(
+                    user_id=2,
+                    start_date=date(2024, 1, 1),
+                    created_at=NOW - timedelta(days=400),
+                    content="piano",
+                    json_content="{}",
+                    shopping_list="",
+                )
+            )
+            db.session.commit()
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_pages_cover_the_history_once_in_order(self):
+        with self.app.app_context():
+            seen, cursor = [], None
+            while True:
+                plans, cursor = plan_history_page(1, 7, cursor)
+                seen.extend((plan.created_at, plan.id) for plan in plans)
+                if cursor is None:
+                    break
+            self.assertEqual(len(seen), 30)
+            self.assertEqual(len(set(seen)), 30)
+            self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not-a-cursor")
+        self.assertEqual(self.client.get("/api/plans?cursor=xyz").status_code, 400)
+
+    def test_api_and_pages(self):
+        data = self.client.get("/api/plans?limit=25").get_json()
+        self.assertEqual(len(data["plans"]), 25)
+        rest = self.client.get(f"/api/plans?limit=25&cursor={data['next_cursor']}").get_json()
+        self.assertEqual(len(rest["plans"]), 5)
+        self.assertIsNone(rest["next_cursor"])
+
+        page = self.client.get("/plans/history").get_data(as_text=True)
+        self.assertIn("Meno recenti", page)
+        detail = self.client.get(data["plans"][0]["url"])
+        self.assertIn("LUNEDÌ", detail.get_data(as_text=True))
+        # Plans of other users are not reachable.
+        with self.app.app_context():
+            other = Plan.query.filter_by(user_id=2).one().id
+        self.assertEqual(self.client.get(f"/plans/{other}").status_code, 302)
+
+    def test_archive_applies_the_retention_policy(self):
+        with self.app.app_context():
+            oldest = Plan.query.filter_by(user_id=1).order_by(Plan.created_at).first()
+            db.session.add(EmailDelivery(plan_id=oldest.id, recipient="a@example.com", status="sent"))
+            db.session.commit()
+            oldest_id, oldest_json = oldest.id, oldest.json_content
+            # 180 days keeps 26 weeks of plans, and user 2's only plan is
+            # kept by keep_latest.
+            self.assertEqual(count_expired(180, 1, now=NOW), 4)
+            report = run_archive(180, 1, batch_size=3, now=NOW)
+            self.assertEqual((report.archived, report.batches), (4, 2))
+            self.assertEqual(Plan.query.filter_by(user_id=1).count(), 26)
+            self.assertEqual(Plan.query.filter_by(user_id=2).count(), 1)
+            self.assertEqual(EmailDelivery.query.count(), 0)
+
+            archived = db.session.get(ArchivedPlan, oldest_id)
+            payload = json.loads(archived.payload)
+            self.assertEqual(json.loads(payload["json_content"]), json.loads(oldest_json))
+            self.assertEqual(run_archive(180, 1, now=NOW).archived, 0)
+
+            report = run_archive(0, 1, archive_retention_days=190, now=NOW)
+            self.assertEqual(report.purged, 2)
+            self.assertEqual(ArchivedPlan.query.count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
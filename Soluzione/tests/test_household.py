@@ -0,0 +1,146 @@
+"""
+Tests for household profiles and the local rescaling of plans.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from sqlalchemy import inspect, text
+
+from app import create_app
+from database_setup import add_missing_columns
+from household import Household, household_of, prompt_section, scale_item, scale_plan
+from models import db, User, Plan
+from principal import UserPrincipal
+from utils import build_plan_prompt, get_dummy_response
+
+
+class HouseholdTestCase(unittest.TestCase):
+    def test_profiles(self):
+        household = Household.from_counts({"adult": 2, "child": 1})
+        self.assertEqual(household.people, 3)
+        self.assertEqual(household.portions, 2.6)
+        self.assertEqual(household.describe(), "3 persone (2 adulti, 1 bambino)")
+        self.assertIsNone(Household.from_counts({"adult": 0}))
+        self.assertEqual(Household.from_counts({"adult": 50}).people, 12)
+
+    def test_household_of(self):
+        user = UserPrincipal(1, "u", "u@example.com", None, False, None, None, None)
+        self.assertIsNone(household_of(user))
+        user = UserPrincipal(1, "u", "u@example.com", None, False, None, None, None, 2, None)
+        self.assertEqual(household_of(user), Household(("adult", "adult")))
+        user = UserPrincipal(1, "u", "u@example.com", None, False, None, None, None, 2, '["senior", "adult"]')
+        self.assertEqual(household_of(user), Household(("adult", "senior")))
+
+    def test_prompt(self):
+        household = Household.from_counts({"adult": 1, "child": 2})
+        self.assertEqual(prompt_section(None), "")
+        prompt = build_plan_prompt("dieta", [], None, date(2025, 1, 6), False, None, None, None, household)
+        self.assertIn("NUCLEO FAMILIARE:\n3 persone (1 adulto, 2 bambini)", prompt)
+        self.assertIn('"servings": 3', prompt)
+
+    def test_scale_item(self):
+        self.assertEqual(scale_item("pomodorini 500g", 0.4), "pomodorini 200g")
+        self.assertEqual(scale_item("zucchine 1kg", 1.3), "zucchine 1.3kg")
+        self.assertEqual(scale_item("limoni 4 pz", 0.4), "limoni 2 pz")
+        # A small excess does not buy one more piece.
+        self.assertEqual(scale_item("uova 6 pz", 1.04), "uova 6 pz")
+        self.assertEqual(scale_item("basilico fresco", 2), "basilico fresco")
+        self.assertEqual(scale_item("pomodorini 500g", 1), "pomodorini 500g")
+
+    def test_scale_plan(self):
+        plan_data = json.loads(get_dummy_response())
+        # The dummy plan serves 2.5 portions per meal on average.
+        self.assertTrue(scale_plan(plan_data, Household(("adult",))))
+        self.assertEqual(plan_data["weekly_plan"]["monday"]["dinner"]["servings"], 1)
+        self.assertIn("salmone 240g", plan_data["shopping_list"]["meat_fish_eggs"])
+        self.assertIn("basilico fresco", plan_data["shopping_list"]["vegetables_fruits"])
+        # Rescaling starts from the list as first written, not the scaled one.
+        household = Household.from_counts({"adult": 2, "child": 1})
+        direct = json.loads(get_dummy_response())
+        scale_plan(direct, household)
+        self.assertTrue(scale_plan(plan_data, household))
+        self.assertEqual(plan_data["shopping_list"], direct["shopping_list"])
+        self.assertIn("salmone 620g", plan_data["shopping_list"]["meat_fish_eggs"])
+        self.assertFalse(scale_plan(plan_data, household))
+        self.assertFalse(scale_plan({"weekly_plan": {}}, household))
+        # Clearing the household restores the plan as first written.
+        self.assertTrue(scale_plan(plan_data, None))
+        self.assertEqual(plan_data, json.loads(get_dummy_response()))
+        self.assertFalse(scale_plan(plan_data, None))
+
+
+class HouseholdPreferencesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        today = date.today()
+        with self.app.app_context():
+            db.session.add(User(username="u", email="u@example.com", password="x"))
+            db.session.add(
+                Plan(user_id=1, start_date=today + timedelta(days=7 - today.weekday()), content="", json_content=get_dummy_response(), shopping_list="")
+            )
+            db.session.add(
+                Plan(user_id=1, start_date=today - timedelta(days=today.weekday() + 7), content="", json_content=get_dummy_response(), shopping_list="")
+            )
+            db.session.commit()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_rescale_on_save(self):
+        self.client.post("/preferences", data={"disliked": "", "household_adult": "1"})
+        with self.app.app_context():
+            user = db.session.get(User, 1)
+            self.assertEqual(user.household_size, 1)
+            self.assertEqual(json.loads(user.household_members), ["adult"])
+            upcoming, past = db.session.get(Plan, 1), db.session.get(Plan, 2)
+            self.assertIn("salmone 240g", json.loads(upcoming.json_content)["shopping_list"]["meat_fish_eggs"])
+            self.assertIn("salmone 240g", upcoming.shopping_list)
+            self.assertEqual(json.loads(past.json_content), json.loads(get_dummy_response()))
+        response = self.client.get("/preferences")
+        self.assertIn('name="household_adult" value="1"', response.get_data(as_text=True))
+
+    def test_clearing_the_household_restores_plans(self):
+        self.client.post("/preferences", data={"disliked": "", "household_adult": "1"})
+        self.client.post("/preferences", data={"disliked": "", "household_adult": "0", "household_child": ""})
+        with self.app.app_context():
+            user = db.session.get(User, 1)
+            self.assertIsNone(household_of(user))
+            upcoming = db.session.get(Plan, 1)
+            self.assertEqual(json.loads(upcoming.json_content), json.loads(get_dummy_response()))
+            self.assertIn("salmone 600g", upcoming.shopping_list)
+
+    def test_form_without_household_fields_keeps_it(self):
+        self.client.post("/preferences", data={"disliked": "", "household_adult": "1"})
+        self.client.post("/preferences", data={"disliked": "olive"})
+        with self.app.app_context():
+            self.assertEqual(household_of(db.session.get(User, 1)), Household(("adult",)))
+            self.assertIn("salmone 240g", db.session.get(Plan, 1).shopping_list)
+
+    def test_add_missing_columns(self):
+        with self.app.app_context():
+            db.session.execute(text('ALTER TABLE "user" DROP COLUMN "household_members"'))
+            db.session.commit()
+            self.assertEqual(add_missing_columns(), ["user.household_members"])
+            columns = {column["name"] for column in inspect(db.engine).get_columns("user")}
+            self.assertIn("household_members", columns)
+            self.assertEqual(add_missing_columns(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Tests for the ingredient lexicon and the shopping-item parser.
+"""
+
+import json
+import unittest
+
+from ingredients import FOODS, Item, find_foods, format_item, merge_items, parse_item
+from utils import get_dummy_response, merge_shopping_list, parse_plan_response
+
+
+def _parsed(text):
+    item = parse_item(text)
+    return (FOODS[item.id] if item.id is not None else None, item.quantity, item.unit)
+
+
+class ParseItemTestCase(unittest.TestCase):
+    def test_items(self):
+        self.assertEqual(_parsed("pomodorini 500g"), ("pomodori", 500.0, "g"))
+        self.assertEqual(_parsed("limoni 4 pz"), ("limoni", 4.0, "pz"))
+        self.assertEqual(_parsed("olio extravergine"), ("olio extravergine", None, None))
+        self.assertEqual(_parsed("tonno in scatola 2 pz"), ("tonno in scatola", 2.0, "pz"))
+        self.assertEqual(_parsed("riso 1,5 kg"), ("riso", 1500.0, "g"))
+        self.assertEqual(_parsed("latte 1 l"), ("latte", 1000.0, "ml"))
+        self.assertEqual(_parsed("ceci (300g)"), ("ceci", 300.0, "g"))
+        self.assertEqual(_parsed("aglio 2 spicchi"), ("aglio", 2.0, "spicchi"))
+        self.assertEqual(_parsed("1/2 cavolfiore"), ("cavolfiore", 0.5, "pz"))
+        self.assertEqual(_parsed("uova 6"), ("uova", 6.0, "pz"))
+        self.assertEqual(_parsed("farina 00 1 kg")[1:], (1000.0, "g"))
+        self.assertEqual(parse_item("sale q.b.").name, "sale")
+        self.assertEqual(_parsed("ingrediente misterioso 2 kg"), (None, 2000.0, "g"))
+
+    def test_plurals_and_synonyms(self):
+        self.assertEqual(_parsed("limone"), _parsed("limoni"))
+        self.assertEqual(_parsed("2 cavolfiori"), ("cavolfiore", 2.0, "pz"))
+        self.assertEqual(_parsed("penne 500g")[0], "pasta")
+        self.assertEqual([FOODS[i] for i in find_foods("Petti di pollo e zucchina grigliata")], ["pollo", "zucchine"])
+
+    def test_cached_per_string(self):
+        self.assertIs(parse_item("zucchine 600g"), parse_item("zucchine 600g"))
+
+    def test_format_item(self):
+        self.assertEqual(format_item(Item(0, 1200.0, "g", "riso")), "riso 1.2kg")
+        self.assertEqual(format_item(Item(0, 250.0, "ml", "latte")), "latte 250ml")
+        self.assertEqual(format_item(Item(0, 3.0, "pz", "limoni")), "limoni 3 pz")
+        self.assertEqual(format_item(Item(None, None, None, "sale")), "sale")
+
+
+class MergeTestCase(unittest.TestCase):
+    def test_repeated_items_are_added_up(self):
+        shopping_list = {
+            "vegetables_fruits": ["pomodori 300g", "limoni 2", "basilico"],
+            "grains_legumes": ["riso 500g", "pasta 500g", "riso 1 kg"],
+            "pantry_condiments": ["pomodorini 200g", "limone 1 pz", "basilico", "olio extravergine"],
+        }
+        self.assertEqual(merge_items(shopping_list), 3)
+        self.assertEqual(
+            shopping_list,
+            {
+                "vegetables_fruits": ["pomodori 500g", "limoni 3 pz", "basilico"],
+                "grains_legumes": ["riso 1.5kg", "pasta 500g"],
+                # Unknown foods are never merged.
+                "pantry_condiments": ["basilico", "olio extravergine"],
+            },
+        )
+
+    def test_merge_shopping_list(self):
+        result = parse_plan_response(get_dummy_response())
+        self.assertIs(merge_shopping_list(result), result)
+        plan = json.loads(get_dummy_response())
+        plan["shopping_list"]["grains_legumes"].append("quinoa 100g")
+        plan_text, shopping_list, raw_json = merge_shopping_list(parse_plan_response(json.dumps(plan)))
+        items = json.loads(raw_json)["shopping_list"]["grains_legumes"]
+        self.assertEqual(len([item for item in items if item.startswith("quinoa")]), 1)
+        self.assertIn(next(item for item in items if item.startswith("quinoa")), shopping_list)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for structured logging, correlation ids and timing spans.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from app import create_app
+from instrumentation import JsonFormatter, logger, span
+from models import db
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        with self.app.app_context():
+            db.create_all()
+        self.capture = _Capture()
+        logger.addHandler(self.capture)
+
+    def tearDown(self):
+        logger.removeHandler(self.capture)
+        self.tmpdir.cleanup()
+
+    def events(self, name):
+        return [r for r in self.capture.records if r.getMessage() == name]
+
+    def test_request_gets_correlation_id(self):
+        response = self.app.test_client().get("/", headers={"X-Request-ID": "abc123"})
+        self.assertEqual(response.headers["X-Request-ID"], "abc123")
+        (record,) = self.events("request")
+        payload = json.loads(JsonFormatter().format(record))
+        self.assertEqual(payload["correlation_id"], "abc123")
+        self.assertEqual(payload["status"], 200)
+        self.assertIn("duration_ms", payload)
+
+    def test_generated_correlation_id(self):
+        response = self.app.test_client().get("/")
+        self.assertEqual(len(response.headers["X-Request-ID"]), 32)
+
+    def test_span_logs_duration_and_late_attributes(self):
+        with span("provider_call", provider="stub") as info:
+            info["status_code"] = 200
+        with self.assertRaises(ValueError):
+            with span("json_parse"):
+                raise ValueError("bad json")
+        first, second = self.events("span")
+        self.assertEqual(first.fields["provider"], "stub")
+        self.assertEqual(first.fields["status_code"], 200)
+        self.assertGreaterEqual(first.fields["duration_ms"], 0)
+        self.assertEqual(second.fields["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
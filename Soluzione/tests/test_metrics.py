@@ -0,0 +1,62 @@
+"""
+Tests for the Prometheus metrics endpoint and hot-path collectors.
+"""
+
+import os
+import tempfile
+import unittest
+
+from prometheus_client import REGISTRY
+
+from app import create_app
+from models import db
+from utils import call_ai_api, parse_plan_response
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_metrics_endpoint_exposes_db_timings_per_route(self):
+        client = self.app.test_client()
+        client.get("/login")
+        body = client.get("/metrics").get_data(as_text=True)
+        self.assertIn("fame_provider_request_seconds", body)
+        self.assertIn('fame_db_query_seconds_count{route="login"}', body)
+
+    def test_metrics_token(self):
+        self.app.config["METRICS_TOKEN"] = "secret"
+        client = self.app.test_client()
+        self.assertEqual(client.get("/metrics").status_code, 401)
+        response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_dummy_and_parse_counters(self):
+        before = sample("fame_dummy_responses_total", provider="gemini", reason="missing_key")
+        call_ai_api("prompt", "gemini", None)
+        after = sample("fame_dummy_responses_total", provider="gemini", reason="missing_key")
+        self.assertEqual(after - before, 1)
+
+        before = sample("fame_plan_parse_total", outcome="text_fallback")
+        parse_plan_response("not json")
+        self.assertEqual(sample("fame_plan_parse_total", outcome="text_fallback") - before, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Tests for the nutrition engine and its use in plans and meal details.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from app import create_app
+from models import db, User, Plan
+from nutrition import (
+    FOODS,
+    NUTRIENTS,
+    annotate,
+    find_foods,
+    meal_nutrition,
+    parse_grams,
+    plan_nutrition,
+)
+from utils import attach_nutrition, get_dummy_response, parse_plan_response
+
+
+def _foods(text):
+    return [FOODS[index] for index in find_foods(text)]
+
+
+class NutritionTestCase(unittest.TestCase):
+    def test_find_foods_prefers_longest_names(self):
+        self.assertEqual(_foods("Penne integrali con zucchine"), ["pasta integrale", "zucchine"])
+        self.assertEqual(_foods("Tonno in scatola e pomodorini"), ["tonno in scatola", "pomodori"])
+        self.assertEqual(_foods("Pasta al pomodoro e pasta"), ["pasta", "pomodori"])
+        self.assertEqual(_foods("Qualcosa di sconosciuto"), [])
+
+    def test_parse_grams(self):
+        self.assertEqual(parse_grams(80), 80.0)
+        self.assertEqual(parse_grams("120 g"), 120.0)
+        self.assertEqual(parse_grams("1,5 kg"), 1500.0)
+        self.assertIsNone(parse_grams("q.b."))
+        self.assertIsNone(parse_grams(0))
+        self.assertIsNone(parse_grams(True))
+
+    def test_ingredients_take_precedence(self):
+        meal = {
+            "title": "Pasta al pomodoro",
+            "ingredients": [
+                {"name": "spaghetti", "grams": 100},
+                {"name": "olio extravergine d'oliva", "grams": "10 g"},
+                {"name": "ingrediente ignoto", "grams": 50},
+            ],
+        }
+        nutrition = meal_nutrition(meal)
+        self.assertFalse(nutrition["estimated"])
+        # 100 g of pasta (353 kcal) and 10 g of oil (89.9 kcal).
+        self.assertEqual(nutrition["kcal"], 443)
+        self.assertEqual(nutrition["fat_g"], 11.4)
+        self.assertEqual(set(nutrition), {*NUTRIENTS, "estimated"})
+
+    def test_standard_portions_without_ingredients(self):
+        nutrition = meal_nutrition({"title": "Pollo con patate", "description": ""})
+        self.assertTrue(nutrition["estimated"])
+        # 100 g of chicken (100 kcal) and 200 g of potatoes (170 kcal).
+        self.assertEqual(nutrition["kcal"], 270)
+        self.assertEqual(meal_nutrition({"title": "Sorpresa"})["kcal"], 0)
+
+    def test_plan_matches_meal_by_meal(self):
+        weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        slots, values, estimated = plan_nutrition(weekly_plan)
+        self.assertEqual(values.shape, (14, len(NUTRIENTS)))
+        self.assertTrue(all(estimated))
+        for (day, meal_type), row in zip(slots, values):
+            self.assertEqual(meal_nutrition(weekly_plan[day][meal_type])["kcal"], round(row[0]))
+
+    def test_annotate(self):
+        plan = annotate(json.loads(get_dummy_response()))
+        meals = [m for day in plan["weekly_plan"].values() for m in day.values()]
+        self.assertTrue(all(m["nutrition"]["kcal"] > 0 for m in meals))
+        summary = plan["weekly_summary"]["nutrition"]
+        self.assertAlmostEqual(summary["weekly"]["kcal"], sum(m["nutrition"]["kcal"] for m in meals), delta=14)
+        self.assertAlmostEqual(summary["daily_average"]["kcal"], summary["weekly"]["kcal"] / 7, delta=1)
+        self.assertEqual(summary["estimated_meals"], 14)
+        # Plans without meals are left alone.
+        self.assertEqual(annotate({"weekly_plan": {}}), {"weekly_plan": {}})
+
+    def test_attach_nutrition_to_parsed_plan(self):
+        result = attach_nutrition(parse_plan_response("```json\n" + get_dummy_response() + "\n```"))
+        self.assertIn("nutrition", json.loads(result[2])["weekly_summary"])
+        text_plan = parse_plan_response("Nessun piano")
+        self.assertIs(attach_nutrition(text_plan), text_plan)
+
+
+class MealDetailsNutritionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        with self.app.app_context():
+            db.session.add(User(username="u", email="u@example.com", password="x"))
+            db.session.commit()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def _add_plan(self, plan_data):
+        with self.app.app_context():
+            db.session.add(
+                Plan(
+                    user_id=1,
+                    start_date=date(2025, 1, 6),
+                    content="",
+                    json_content=json.dumps(plan_data),
+                    shopping_list="",
+                )
+            )
+            db.session.commit()
+
+    def test_stored_values_are_returned(self):
+        plan = annotate(json.loads(get_dummy_response()))
+        self._add_plan(plan)
+        meal = self.client.get("/api/meal_details/tuesday/dinner").get_json()
+        self.assertEqual(meal["nutrition"], plan["weekly_plan"]["tuesday"]["dinner"]["nutrition"])
+
+    def test_legacy_plans_are_computed_on_the_fly(self):
+        self._add_plan(json.loads(get_dummy_response()))
+        meal = self.client.get("/api/meal_details/tuesday/dinner").get_json()
+        self.assertEqual(meal["nutrition"]["kcal"], 270)
+        self.assertTrue(meal["nutrition"]["estimated"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests for the single-pass plan text parser.
+
+Besides a few hand-written cases, the round-trip properties are checked on
+randomly generated plans (seeded, so failures are reproducible): parsing
+the output of ``format_weekly_plan`` must give back the original data, and
+formatting the parsed data must give back the original text.
+"""
+
+import json
+import random
+import unittest
+
+from plan_parser import parse_plan_content
+from rendering import DAYS, MEAL_TYPES
+from utils import format_weekly_plan, get_dummy_response
+
+# Includes the characters the text format itself uses as markers.
+ALPHABET = "abcdefghijklmnopqrstuvwxyzàèéìòù ABCÌ0123456789•*:.,'-()🍝📝🎯🗓️"
+
+
+def random_text(rng, max_len=40):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_len))).strip()
+
+
+def random_plan(rng):
+    plan = {}
+    for day, _ in DAYS:
+        if rng.random() < 0.2:
+            continue
+        meals = {}
+        for meal_type, _, _, _ in MEAL_TYPES:
+            if rng.random() < 0.7:
+                meals[meal_type] = {
+                    "title": random_text(rng),
+                    "description": random_text(rng, 120),
+                    "focus": random_text(rng),
+                    "servings": rng.randint(1, 12),
+                }
+        plan[day] = meals
+    return plan
+
+
+class PlanParserTestCase(unittest.TestCase):
+    def test_round_trip_sample_plan(self):
+        weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        self.assertEqual(parse_plan_content(format_weekly_plan(weekly_plan)), weekly_plan)
+
+    def test_round_trip_property(self):
+        rng = random.Random(1234)
+        for _ in range(300):
+            plan = random_plan(rng)
+            if not plan:
+                continue
+            text = format_weekly_plan(plan)
+            self.assertEqual(parse_plan_content(text), plan, text)
+            self.assertEqual(format_weekly_plan(parse_plan_content(text)), text)
+
+    def test_legacy_free_text(self):
+        text = (
+            "Ecco il piano:\n"
+            "LUNEDI'\n"
+            "- Colazione: Yogurt e frutta\n"
+            "- **Pranzo:** Pasta al pomodoro\n"
+            "📝 Classica\n"
+            "🎯 Energia • 4 porzioni\n"
+            "Merenda: Mela\n"
+            "Martedì\n"
+            "Cena: Zuppa\n"
+        )
+        plan = parse_plan_content(text)
+        self.assertEqual(set(plan), {"monday", "tuesday"})
+        self.assertEqual(set(plan["monday"]), {"breakfast", "lunch", "snack"})
+        self.assertEqual(plan["monday"]["lunch"]["servings"], 4)
+        self.assertEqual(plan["monday"]["lunch"]["focus"], "Energia")
+        self.assertEqual(plan["tuesday"]["dinner"]["servings"], 3)
+
+    def test_ignores_meals_before_first_day_and_empty_input(self):
+        self.assertEqual(parse_plan_content("**Pranzo:** Pasta\n📝 x"), {})
+        self.assertEqual(parse_plan_content(""), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
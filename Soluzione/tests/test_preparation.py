@@ -0,0 +1,176 @@
+"""
+Tests for the preparation steps of plan meals.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from app import create_app
+from models import db, User, Plan
+from preparation import GENERIC_STEPS, lookup, prepare_plan
+from recipes import catalog, clear_cache, sync_catalog
+from utils import attach_preparation, generate_weekly_plan, get_dummy_response
+
+
+def _reply(weekly_plan, steps=("Primo passo", "Secondo passo")):
+    return "```json\n" + json.dumps(
+        {"preparation": {day: {meal_type: list(steps) for meal_type in meals} for day, meals in weekly_plan.items()}}
+    ) + "\n```"
+
+
+class PreparationTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        sync_catalog()
+        self.prompts = []
+
+    def tearDown(self):
+        self.ctx.pop()
+        with self.app.app_context():
+            db.engine.dispose()
+        clear_cache()
+        self.tmpdir.cleanup()
+
+    def test_lookup_by_slug_and_title(self):
+        recipe = catalog()[0]
+        steps = lookup({"recipe": recipe.slug})
+        self.assertEqual(steps.splitlines()[0], f"1. {recipe.steps[0]}")
+        self.assertEqual(lookup({"title": f"  {recipe.title.upper()} "}), steps)
+        self.assertIsNone(lookup({"title": "Piatto sconosciuto"}))
+
+    def test_missing_meals_are_asked_in_one_prompt(self):
+        recipe = catalog()[0]
+        weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        weekly_plan["monday"]["lunch"] = recipe.meal(2)
+
+        def ask(prompt):
+            self.prompts.append(prompt)
+            reply = json.loads(_reply(weekly_plan).strip("`").removeprefix("json"))
+            if len(self.prompts) == 1:
+                reply["preparation"]["sunday"]["dinner"] = ["Un solo passo"]
+            return json.dumps(reply)
+
+        filled = prepare_plan(weekly_plan, ask)
+        self.assertEqual(len(self.prompts), 1)
+        self.assertNotIn(recipe.title, self.prompts[0])
+        self.assertIn(weekly_plan["tuesday"]["dinner"]["title"], self.prompts[0])
+        self.assertEqual(len(filled), 13)
+        self.assertEqual(weekly_plan["tuesday"]["dinner"]["preparation"], "1. Primo passo\n2. Secondo passo")
+        self.assertEqual(weekly_plan["monday"]["lunch"]["preparation"], lookup({"recipe": recipe.slug}))
+        # Replies with too few steps are not kept.
+        self.assertNotIn("preparation", weekly_plan["sunday"]["dinner"])
+
+        # Only the meals still missing steps are asked for again.
+        self.assertEqual(prepare_plan(weekly_plan, ask), [("sunday", "dinner")])
+        self.assertEqual(prepare_plan(weekly_plan, ask), [])
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_unusable_replies(self):
+        weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        self.assertEqual(prepare_plan(weekly_plan, lambda prompt: "non è JSON"), [])
+        self.assertEqual(prepare_plan(weekly_plan, lambda prompt: '{"preparation": []}'), [])
+        self.assertEqual(prepare_plan(weekly_plan), [])
+
+
+class MealDetailsPreparationTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        self.weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        with self.app.app_context():
+            db.session.add(User(username="u", email="u@example.com", password="x", api_key="key"))
+            db.session.add(
+                Plan(
+                    user_id=1,
+                    start_date=date(2025, 1, 6),
+                    content="",
+                    json_content=json.dumps({"weekly_plan": self.weekly_plan}),
+                    shopping_list="",
+                )
+            )
+            db.session.commit()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        clear_cache()
+        self.tmpdir.cleanup()
+
+    def test_meal_details_never_call_the_provider(self):
+        with patch("utils.call_ai_api") as call:
+            meal = self.client.get("/api/meal_details/monday/lunch").get_json()
+            self.client.get("/api/meal_details/monday/lunch")
+        call.assert_not_called()
+        self.assertEqual(meal["preparation"], GENERIC_STEPS)
+        with self.app.app_context():
+            self.assertEqual(json.loads(Plan.query.one().json_content), {"weekly_plan": self.weekly_plan})
+
+
+class GenerationPreparationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.weekly_plan = json.loads(get_dummy_response())["weekly_plan"]
+        self.prompts = []
+
+    def _generate(self, answer):
+        def provider(prompt, provider, api_key, fallback=None):
+            self.prompts.append(prompt)
+            if prompt.startswith("Scrivi le istruzioni"):
+                return answer if answer is not None else fallback()
+            return get_dummy_response()
+
+        with patch("utils.call_ai_api", side_effect=provider):
+            _, _, raw_json = generate_weekly_plan(
+                "Dieta equilibrata", [], "Lazio", date(2025, 3, 3), False, None, None, "gemini", "key"
+            )
+        return json.loads(raw_json)
+
+    def test_steps_are_added_at_generation(self):
+        plan_data = self._generate(_reply(self.weekly_plan))
+        self.assertEqual(len(self.prompts), 2)
+        self.assertTrue(plan_data["preparation_requested"])
+        meals = [meal for day in plan_data["weekly_plan"].values() for meal in day.values()]
+        self.assertTrue(all(meal["preparation"] == "1. Primo passo\n2. Secondo passo" for meal in meals))
+
+    def test_failed_steps_are_not_asked_again(self):
+        plan_data = self._generate(None)
+        self.assertNotIn("preparation", plan_data["weekly_plan"]["monday"]["lunch"])
+        result = ("", "", json.dumps(plan_data))
+        ask = lambda prompt: self.fail("asked again")
+        self.assertEqual(json.loads(attach_preparation(result, ask, use_catalog=False)[2]), plan_data)
+
+    def test_failed_provider_is_not_asked_for_steps(self):
+        def provider(prompt, provider, api_key, fallback=None):
+            self.prompts.append(prompt)
+            return fallback() or get_dummy_response()
+
+        with patch("utils.call_ai_api", side_effect=provider):
+            generate_weekly_plan("Dieta", [], None, date(2025, 3, 3), False, None, None, "gemini", "key")
+        self.assertEqual(len(self.prompts), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
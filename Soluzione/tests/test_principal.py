@@ -0,0 +1,96 @@
+"""
+Tests for the cached user principal used by Flask-Login.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from app import create_app
+from models import db, User
+from principal import PrincipalCache, UserPrincipal, load_principal
+from query_stats import count_queries
+
+
+class PrincipalTestCase(unittest.TestCase):
+    def make_app(self, **config):
+        app = create_app(
+            dict(
+                {
+                    "TESTING": True,
+                    "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                    + os.path.join(self.tmpdir.name, "test.db"),
+                },
+                **config,
+            )
+        )
+        with app.app_context():
+            db.create_all()
+            if not db.session.get(User, 1):
+                db.session.add(
+                    User(id=1, username="anna", email="anna@example.com", password="x",
+                         api_key="segreta", favorite_emails='["bob@example.com"]')
+                )
+                db.session.commit()
+        client = app.test_client()
+        client.get("/login")
+        with client.session_transaction() as session:
+            session["_user_id"] = "1"
+        return app, client
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_principal_is_a_narrow_snapshot(self):
+        app, _ = self.make_app()
+        with app.app_context():
+            principal = load_principal(1)
+            self.assertEqual((principal.id, principal.username), (1, "anna"))
+            self.assertTrue(principal.is_authenticated)
+            self.assertFalse(hasattr(principal, "api_key"))
+            self.assertEqual(principal.load().api_key, "segreta")
+            self.assertIsNone(load_principal(99))
+
+    def test_cached_requests_skip_the_user_query(self):
+        app, client = self.make_app()
+        client.get("/diet")
+        with count_queries() as stats:
+            client.get("/diet")
+        self.assertEqual(stats.count, 1)  # just the diet
+
+        app, client = self.make_app(PRINCIPAL_CACHE_TTL=0)
+        with count_queries() as stats:
+            client.get("/diet")
+        self.assertEqual(stats.count, 2)
+
+    def test_profile_changes_invalidate_the_cache(self):
+        app, client = self.make_app()
+        checked = 'name="trains" checked'
+        self.assertNotIn(checked, client.get("/preferences").get_data(as_text=True))
+        response = client.post(
+            "/preferences",
+            data={"disliked": "funghi", "trains": "on", "training_frequency": "3"},
+        )
+        self.assertIn(checked, response.get_data(as_text=True))
+        self.assertIn(checked, client.get("/preferences").get_data(as_text=True))
+        with app.app_context():
+            self.assertTrue(load_principal(1).trains)
+        self.assertEqual(client.get("/api/favorite_emails").get_json(), {"emails": ["bob@example.com"]})
+
+    def test_cache_expiry_and_size(self):
+        cache = PrincipalCache(ttl=0.05, size=2)
+        principals = [UserPrincipal(i, f"u{i}", f"u{i}@example.com", None, False, None, None, None) for i in range(3)]
+        for principal in principals:
+            cache.put(principal)
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(2), principals[2])
+        time.sleep(0.06)
+        self.assertIsNone(cache.get(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
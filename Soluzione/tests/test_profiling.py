@@ -0,0 +1,93 @@
+"""
+Tests for the opt-in per-request profiler.
+"""
+
+import os
+import pstats
+import tempfile
+import unittest
+
+from app import create_app
+from models import db
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def make_app(self, **config):
+        app = create_app(
+            dict(
+                {
+                    "TESTING": True,
+                    "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                    + os.path.join(self.tmpdir.name, "test.db"),
+                    "PROFILING_DIR": os.path.join(self.tmpdir.name, "profiles"),
+                    "PROFILING_ENGINE": "cprofile",
+                },
+                **config,
+            )
+        )
+        with app.app_context():
+            db.create_all()
+        return app
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_disabled_by_default(self):
+        client = self.make_app().test_client()
+        response = client.get("/login", headers={"X-Profile": "anything"})
+        self.assertNotIn("X-Profile-ID", response.headers)
+        self.assertEqual(client.get("/admin/profiles").status_code, 404)
+
+    def test_header_profiles_request_with_sql_timeline(self):
+        client = self.make_app(PROFILING_TOKEN="secret").test_client()
+        self.assertNotIn("X-Profile-ID", client.get("/login").headers)
+        self.assertNotIn(
+            "X-Profile-ID", client.get("/login", headers={"X-Profile": "wrong"}).headers
+        )
+
+        response = client.post(
+            "/register",
+            data={"username": "anna", "email": "anna@example.com", "password": "pw", "api_key": "k"},
+            headers={"X-Profile": "secret"},
+        )
+        profile_id = response.headers["X-Profile-ID"]
+
+        auth = {"Authorization": "Bearer secret"}
+        self.assertEqual(client.get(f"/admin/profiles/{profile_id}").status_code, 401)
+        metadata = client.get(f"/admin/profiles/{profile_id}", headers=auth).get_json()
+        self.assertEqual(metadata["endpoint"], "register")
+        self.assertEqual(metadata["reason"], "header")
+        self.assertEqual(metadata["sql_count"], len(metadata["queries"]))
+        self.assertGreater(metadata["sql_count"], 0)
+        self.assertIn("generate_password_hash", metadata["summary"])
+
+        listing = client.get("/admin/profiles", headers=auth).get_json()
+        self.assertEqual([item["id"] for item in listing], [profile_id])
+
+        download = client.get(f"/admin/profiles/{profile_id}/download", headers=auth)
+        path = os.path.join(self.tmpdir.name, "download.prof")
+        with open(path, "wb") as handle:
+            handle.write(download.data)
+        self.assertGreater(pstats.Stats(path).total_tt, 0)
+
+    def test_sampling_and_retention(self):
+        client = self.make_app(
+            PROFILING_TOKEN="secret", PROFILING_SAMPLE_RATE=1.0, PROFILING_KEEP=2
+        ).test_client()
+        ids = [client.get("/login").headers["X-Profile-ID"] for _ in range(3)]
+        files = os.listdir(os.path.join(self.tmpdir.name, "profiles"))
+        self.assertEqual(len(files), 4)
+        self.assertFalse(any(name.startswith(ids[0]) for name in files))
+
+    def test_unknown_profile_id(self):
+        client = self.make_app(PROFILING_TOKEN="secret").test_client()
+        auth = {"Authorization": "Bearer secret"}
+        self.assertEqual(client.get("/admin/profiles/../config", headers=auth).status_code, 404)
+        self.assertEqual(client.get("/admin/profiles/" + "0" * 32, headers=auth).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests for per-request query counting, and query budgets for the routes.
+
+Each route has a budget of SQL statements (user loading included). A change
+adding round trips to a route makes the matching test fail; raise the budget
+only when the extra query is intended.
+"""
+
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+
+from app import create_app
+from models import db, Diet, Plan, Preference, User
+from query_stats import assert_max_queries, count_queries
+from utils import get_dummy_response, parse_plan_response
+
+# (method, path) -> maximum number of SQL statements.
+ROUTE_BUDGETS = {
+    ("GET", "/"): 3,
+    ("GET", "/diet"): 2,
+    ("GET", "/preferences"): 2,
+    ("GET", "/plan"): 2,
+    ("GET", "/api/meal_details/monday/lunch"): 2,
+    ("GET", "/plans/history"): 2,
+    ("GET", "/api/plans"): 2,
+    ("GET", "/plans/1"): 2,
+    ("GET", "/api/favorite_emails"): 1,
+    ("GET", "/upload_diet"): 1,
+    # user, diet, preference, recent plans, existing plan, its deliveries,
+    # insert, delete
+    ("POST", "/generate_plan"): 8,
+}
+
+
+class QueryStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+                "QUERY_STATS": True,
+                # Budgets are for provider plans, not for loading the catalog.
+                "RECIPE_CATALOG": "off",
+            }
+        )
+        # Requests must run without a pushed app context: Flask-Login caches
+        # the current user on ``g``, which would then be shared by requests.
+        with self.app.app_context():
+            db.create_all()
+            plan_text, shopping_list, raw_json = parse_plan_response(get_dummy_response())
+            db.session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+            db.session.add(Diet(user_id=1, content="Dieta mediterranea"))
+            db.session.add(Preference(user_id=1, disliked="funghi"))
+            db.session.add(
+                Plan(
+                    user_id=1,
+                    start_date=date(2025, 1, 6),
+                    content=plan_text,
+                    json_content=raw_json,
+                    shopping_list=shopping_list,
+                )
+            )
+            db.session.commit()
+        self.client = self.app.test_client()
+        # The first request creates the tables; keep it out of the budgets.
+        self.client.get("/login")
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_route_budgets(self):
+        for (method, path), budget in ROUTE_BUDGETS.items():
+            with self.subTest(route=f"{method} {path}"), redirect_stdout(StringIO()):
+                with assert_max_queries(budget):
+                    response = self.client.open(path, method=method)
+                self.assertLess(response.status_code, 400)
+                self.assertNotIn("/login", response.headers.get("Location", ""))
+
+    def test_response_headers(self):
+        response = self.client.get("/plan")
+        self.assertEqual(response.headers["X-DB-Query-Count"], "2")
+        self.assertEqual(response.headers["X-DB-Duplicate-Queries"], "0")
+        self.assertGreater(float(response.headers["X-DB-Query-Time-Ms"]), 0)
+        self.assertIn("2 query", response.get_data(as_text=True))
+
+    def test_generate_plan_replaces_plan_in_one_transaction(self):
+        with redirect_stdout(StringIO()), count_queries() as stats:
+            self.client.post("/generate_plan")
+            self.client.post("/generate_plan")
+        with self.app.app_context():
+            self.assertEqual(Plan.query.filter(Plan.start_date != date(2025, 1, 6)).count(), 1)
+        statements = [sql.split()[0] for sql in stats.statements.elements()]
+        self.assertEqual(statements.count("INSERT"), 2)
+        self.assertEqual(statements.count("DELETE"), 1)
+
+    def test_duplicates_are_detected(self):
+        with self.app.app_context(), count_queries() as stats:
+            for user_id in (1, 1, 1):
+                db.session.execute(db.select(User).where(User.id == user_id)).all()
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.duplicates, 2)
+        with self.assertRaises(AssertionError) as raised:
+            with self.app.app_context(), assert_max_queries(5):
+                for user_id in (1, 2):
+                    db.session.execute(db.select(User).where(User.id == user_id)).all()
+        self.assertIn("1 duplicate queries", str(raised.exception))
+
+    def test_disabled_by_default(self):
+        app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        response = app.test_client().get("/login")
+        self.assertNotIn("X-DB-Query-Count", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
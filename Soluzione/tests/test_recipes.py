@@ -0,0 +1,184 @@
+"""
+Tests for the local recipe catalog and its use as a plan source.
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from app import create_app
+from models import db, User, Diet, Plan, Recipe
+from recipes import assemble_week, catalog, clear_cache, recipe_steps, search_recipes, sync_catalog
+from screening import compile_screen
+from seasonality import is_in_season
+from utils import generate_weekly_plan
+
+
+class CatalogTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        sync_catalog()
+
+    def tearDown(self):
+        self.ctx.pop()
+        with self.app.app_context():
+            db.engine.dispose()
+        clear_cache()
+        self.tmpdir.cleanup()
+
+    def _titles(self, ranked):
+        titles = {r.id: r.title for r in catalog()}
+        return [titles[recipe_id] for recipe_id, _ in ranked]
+
+    def test_sync_catalog(self):
+        recipes = catalog()
+        self.assertEqual(Recipe.query.count(), len(recipes))
+        self.assertGreater(len(recipes), 40)
+        # A second sync updates in place.
+        self.assertEqual(sync_catalog(), len(recipes))
+        self.assertEqual(Recipe.query.count(), len(recipes))
+
+    def test_unsynced_catalog_is_not_loaded_by_requests(self):
+        Recipe.query.delete()
+        db.session.commit()
+        clear_cache()
+        self.assertEqual(catalog(), ())
+        self.assertEqual(search_recipes("zucchine"), [])
+        self.assertIsNone(assemble_week("Dieta equilibrata", [], "Lazio", date(2025, 3, 3)))
+        self.assertEqual(Recipe.query.count(), 0)
+        # The fallback then is the dummy plan.
+        args = ("Dieta equilibrata", [], "Lazio", date(2025, 3, 3), False, None, None)
+        _, _, raw_json = generate_weekly_plan(*args, "gemini", None, "fallback")
+        self.assertNotIn("source", json.loads(raw_json)["weekly_summary"])
+
+    def test_search(self):
+        titles = self._titles(search_recipes("zucchine menta"))
+        self.assertIn("Pasta con zucchine e menta", titles[0])
+        # Accents and case are ignored.
+        self.assertTrue(search_recipes("CAVOLFIORE"))
+        self.assertEqual(search_recipes("di e"), [])
+        self.assertEqual(search_recipes("xyzzy"), [])
+
+    def test_week_respects_dislikes_and_season(self):
+        start = date(2025, 7, 7)
+        started = time.perf_counter()
+        plan = assemble_week("Dieta mediterranea con pesce e legumi", ["pesce", "lattosio"], "Lombardia", start)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        meals = [m for day in plan["weekly_plan"].values() for m in day.values()]
+        self.assertEqual(len(meals), 14)
+        self.assertEqual(plan["weekly_summary"]["source"], "catalog")
+        screen = compile_screen(["pesce", "lattosio"])
+        for meal in meals:
+            names = " ".join(i["name"] for i in meal["ingredients"])
+            self.assertEqual(screen.find(f"{meal['title']} {names}"), [], meal["title"])
+        self.assertEqual(len({m["recipe"] for m in meals}), 14)
+        by_slug = {r.slug: r for r in catalog()}
+        out_of_season = [
+            p for m in meals for p in by_slug[m["recipe"]].produce if not is_in_season(p, "Lombardia", [7])
+        ]
+        self.assertEqual(out_of_season, [])
+        self.assertEqual(screen.scan({"shopping_list": plan["shopping_list"]}), [])
+
+    def test_week_is_deterministic_and_changes_weekly(self):
+        args = ("Dieta equilibrata", [], "Lazio")
+        first = assemble_week(*args, date(2025, 3, 3))
+        self.assertEqual(first, assemble_week(*args, date(2025, 3, 3)))
+        self.assertNotEqual(first["weekly_plan"], assemble_week(*args, date(2025, 3, 10))["weekly_plan"])
+
+    def test_recent_meals_are_avoided(self):
+        args = ("Dieta equilibrata", [], "Lazio", date(2025, 3, 10))
+        recent = [m["title"] for day in assemble_week(*args)["weekly_plan"].values() for m in day.values()]
+        week = assemble_week(*args, exclude=recent)["weekly_plan"]
+        repeated = [m["title"] for day in week.values() for m in day.values() if m["title"] in recent]
+        self.assertLess(len(repeated), len(recent) // 2)
+
+    def test_training_days_favor_carbs_and_protein(self):
+        by_slug = {r.slug: r for r in catalog()}
+        args = ("Dieta equilibrata", [], "Lazio", date(2025, 3, 3))
+        rest = assemble_week(*args)["weekly_plan"]["monday"]
+        training = assemble_week(*args, True, "Lunedì")["weekly_plan"]["monday"]
+        self.assertGreaterEqual(
+            by_slug[training["dinner"]["recipe"]].protein_share,
+            by_slug[rest["dinner"]["recipe"]].protein_share,
+        )
+
+    def test_no_week_when_nothing_is_allowed(self):
+        self.assertIsNone(assemble_week("", ["glutine", "riso", "patate", "farro", "orzo", "quinoa", "cereali"], "Lazio", date(2025, 3, 3)))
+
+    def test_recipe_steps(self):
+        steps = recipe_steps("pasta-zucchine-menta")
+        self.assertTrue(steps.startswith("1. "))
+        self.assertIsNone(recipe_steps("ricetta-inesistente"))
+
+    def test_generate_plan_falls_back_to_catalog(self):
+        args = ("Dieta equilibrata", ["pesce"], "Lazio", date(2025, 3, 3), False, None, None)
+        plan_text, shopping_list, raw_json = generate_weekly_plan(*args, "gemini", None, "fallback")
+        self.assertEqual(json.loads(raw_json)["weekly_summary"]["source"], "catalog")
+        self.assertIn("nutrition", json.loads(raw_json)["weekly_summary"])
+        _, _, raw_json = generate_weekly_plan(*args, "gemini", None, "off")
+        self.assertNotIn("source", json.loads(raw_json)["weekly_summary"])
+
+    def test_primary_mode_skips_the_provider(self):
+        with patch("utils.call_ai_api") as call:
+            _, _, raw_json = generate_weekly_plan(
+                "Dieta equilibrata", [], "Lazio", date(2025, 3, 3), False, None, None, "gemini", "key", "primary"
+            )
+        call.assert_not_called()
+        self.assertEqual(json.loads(raw_json)["weekly_summary"]["source"], "catalog")
+
+
+class MealDetailsStepsTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+                "RECIPE_CATALOG": "primary",
+            }
+        )
+        self.client = self.app.test_client()
+        self.client.get("/login")
+        with self.app.app_context():
+            db.session.add(User(username="u", email="u@example.com", password="x", region="Lazio"))
+            db.session.add(Diet(user_id=1, content="Dieta equilibrata"))
+            db.session.commit()
+            sync_catalog()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = "1"
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        clear_cache()
+        self.tmpdir.cleanup()
+
+    def test_catalog_plan_shows_recipe_steps(self):
+        with patch("utils.call_ai_api") as call:
+            self.client.post("/generate_plan", data={"start_date": "2025-03-03"})
+        call.assert_not_called()
+        with self.app.app_context():
+            plan = json.loads(Plan.query.one().json_content)
+        slug = plan["weekly_plan"]["monday"]["lunch"]["recipe"]
+        meal = self.client.get("/api/meal_details/monday/lunch").get_json()
+        with self.app.app_context():
+            self.assertEqual(meal["preparation"], recipe_steps(slug))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests for the compiled plan and shopping-list fragments.
+"""
+
+import json
+import unittest
+
+import rendering
+from utils import format_shopping_list, format_weekly_plan, get_dummy_response, parse_plan_response
+
+
+class RenderingTestCase(unittest.TestCase):
+    def setUp(self):
+        rendering.clear_cache()
+        self.data = json.loads(get_dummy_response())
+
+    def test_weekly_plan_text_layout(self):
+        text = format_weekly_plan(self.data["weekly_plan"])
+        lines = text.split("\n")
+        self.assertEqual(lines[0], "")
+        self.assertEqual(lines[1], "🗓️ **LUNEDÌ**")
+        self.assertEqual(lines[2], "🥗 **Pranzo:** Insalata di quinoa mediterranea")
+        self.assertEqual(lines[4], "   🎯 Proteico e saziante • 2 porzioni")
+        self.assertIn("\n\n🗓️ **MARTEDÌ**\n", text)
+        self.assertFalse(text.endswith("\n"))
+
+    def test_empty_inputs(self):
+        self.assertEqual(format_weekly_plan({}), "Piano settimanale non disponibile")
+        self.assertIn("non disponibile", format_shopping_list({}))
+
+    def test_shopping_items_are_escaped(self):
+        html = format_shopping_list({"pantry_condiments": ["<script>alert(1)</script>"]})
+        self.assertNotIn("<script>", html)
+        self.assertIn("&lt;script&gt;", html)
+        self.assertIn('<span class="badge bg-light text-dark ms-2">1</span>', html)
+
+    def test_text_fallback_shopping_list_is_escaped(self):
+        reply = "Lunedì\nPranzo: pasta\nShopping List:\npane <img src=x onerror=alert(1)>"
+        _, shopping_list, _ = parse_plan_response(reply)
+        self.assertNotIn("<img", shopping_list)
+        self.assertEqual(shopping_list, '<pre class="shopping-list-text">pane &lt;img src=x onerror=alert(1)&gt;</pre>')
+
+    def test_digest_html_is_escaped(self):
+        html = rendering.render_digest_html("<b>anna</b>", "riga 1\n<script>x</script>", "<div>lista</div>")
+        self.assertIn("Hello &lt;b&gt;anna&lt;/b&gt;,", html)
+        self.assertIn("riga 1<br>&lt;script&gt;x&lt;/script&gt;", html)
+        self.assertIn("<h3>Shopping List</h3><div>lista</div>", html)
+
+    def test_cache_is_keyed_by_content(self):
+        first = format_shopping_list({"dairy_cheese": ["feta 200g"]})
+        second = format_shopping_list({"dairy_cheese": ["mozzarella 250g"]})
+        self.assertIn("feta", first)
+        self.assertIn("mozzarella", second)
+        self.assertEqual(format_shopping_list({"dairy_cheese": ["feta 200g"]}), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
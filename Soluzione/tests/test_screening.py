@@ -0,0 +1,164 @@
+"""
+Tests for the dislike and allergen screening of generated plans.
+"""
+
+import json
+import unittest
+
+from prometheus_client import REGISTRY
+
+from screening import (
+    Automaton,
+    compile_screen,
+    clear_cache,
+    enforce_preferences,
+    expand,
+)
+from utils import ask_provider, get_dummy_response, parse_plan_response, screen_plan
+
+
+def _meal(title, description=""):
+    return {"title": title, "description": description, "focus": "", "servings": 2}
+
+
+class AutomatonTestCase(unittest.TestCase):
+    def test_whole_words_and_overlaps(self):
+        automaton = Automaton([("pasta", 1), ("pasta di mandorle", 2), ("pane", 3)])
+        found = sorted(value for _, _, value in automaton.iter("pasta di mandorle e pane"))
+        self.assertEqual(found, [1, 2, 3])
+        self.assertEqual(list(automaton.iter("pastasciutta e panettone")), [])
+
+
+class ScreenTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_expansion_through_groups(self):
+        terms, exceptions, names = expand("Lattosio")
+        self.assertIn("mozzarella", terms)
+        self.assertIn("latte", names)
+        self.assertIn("latte di soia", exceptions)
+        # Nested groups: seafood covers shellfish and molluscs.
+        terms, _, _ = expand("frutti di mare")
+        self.assertTrue({"gamberi", "cozze"} <= terms)
+        # Unknown foods only cover themselves.
+        self.assertEqual(expand("Broccoli")[0], {"broccoli"})
+
+    def test_find(self):
+        screen = compile_screen(["lattosio", "glutine", "noci", "broccoli"])
+        self.assertEqual(screen.find("Frittata con formaggio"), [("lattosio", "formaggio")])
+        self.assertEqual(screen.find("Crema di broccolo"), [("broccoli", "broccolo")])
+        self.assertEqual(screen.find("Torta di noce"), [("noci", "noce")])
+        self.assertEqual(screen.find("Pasta senza glutine al pomodoro"), [])
+        self.assertEqual(screen.find("Porridge con latte di soia"), [])
+        self.assertEqual(screen.find("Lasagne gluten-free"), [])
+        self.assertEqual(screen.find("Pasti leggeri e panettone"), [])
+
+    def test_negation_covers_only_its_own_span(self):
+        self.assertEqual(
+            compile_screen(["lattosio"]).find("Risotto cremoso senza lattosio mantecato con parmigiano e burro"),
+            [("lattosio", "parmigiano"), ("lattosio", "burro")],
+        )
+        self.assertEqual(
+            compile_screen(["glutine"]).find("Zuppa senza glutine . servita con crostini di pane e orzo"),
+            [("glutine", "pane"), ("glutine", "orzo")],
+        )
+
+    def test_exceptions_are_per_preference(self):
+        screen = compile_screen(["latte", "soia"])
+        self.assertEqual({p for p, _ in screen.find("Latte di soia")}, {"soia"})
+
+    def test_cached_per_preference_version(self):
+        screen = compile_screen(["Noci", "lattosio"])
+        self.assertIs(compile_screen(["lattosio ", "noci"]), screen)
+        self.assertIsNot(compile_screen(["lattosio"]), screen)
+
+    def test_scan_dummy_plan(self):
+        plan = json.loads(get_dummy_response())
+        violations = compile_screen(["pesce"]).scan(plan)
+        slots = {v.slot for v in violations if v.slot}
+        self.assertEqual(
+            slots,
+            {("monday", "dinner"), ("wednesday", "dinner"), ("friday", "lunch"), ("sunday", "dinner")},
+        )
+        items = {v.match for v in violations if v.slot is None}
+        self.assertEqual(items, {"salmone", "orata", "tonno", "branzino"})
+
+
+class EnforceTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+        self.plan = {
+            "weekly_plan": {
+                "monday": {"lunch": _meal("Pasta al pesto", "Trofie con pesto e patate"), "dinner": _meal("Pollo al forno")},
+                "tuesday": {"lunch": _meal("Insalata di ceci"), "dinner": _meal("Vellutata", "con crostini di pane")},
+            },
+            "shopping_list": {"grains_legumes": ["pasta 500g", "ceci 300g", "pane integrale"]},
+        }
+        self.prompts = []
+
+    def test_only_violating_slots_are_regenerated(self):
+        def ask(prompt):
+            self.prompts.append(prompt)
+            return "```json\n" + json.dumps(
+                {
+                    "weekly_plan": {
+                        "monday": {"lunch": _meal("Riso con zucchine"), "dinner": _meal("Pizza")},
+                        "tuesday": {"dinner": _meal("Vellutata di zucca", "con semi di zucca")},
+                    },
+                    "shopping_list": {"grains_legumes": ["riso 300g"]},
+                }
+            ) + "\n```"
+
+        report = enforce_preferences(self.plan, compile_screen(["glutine"]), ask)
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn('"lunch"', self.prompts[0])
+        self.assertNotIn("Pollo al forno", self.prompts[0])
+        self.assertEqual(report.regenerated, [("monday", "lunch"), ("tuesday", "dinner")])
+        week = self.plan["weekly_plan"]
+        self.assertEqual(week["monday"]["lunch"]["title"], "Riso con zucchine")
+        # Slots that were not asked for are left alone.
+        self.assertEqual(week["monday"]["dinner"]["title"], "Pollo al forno")
+        self.assertEqual(
+            self.plan["shopping_list"]["grains_legumes"], ["ceci 300g", "riso 300g"]
+        )
+        self.assertEqual(report.removed, ["pasta 500g", "pane integrale"])
+        self.assertEqual(report.unresolved, [])
+
+    def test_unclean_replacements_are_rejected(self):
+        def ask(prompt):
+            self.prompts.append(prompt)
+            return json.dumps({"weekly_plan": {"monday": {"lunch": _meal("Lasagne")}}})
+
+        report = enforce_preferences(self.plan, compile_screen(["glutine"]), ask, max_rounds=3)
+        # Nothing replaced in the first round: no point asking again.
+        self.assertEqual(len(self.prompts), 1)
+        self.assertEqual(self.plan["weekly_plan"]["monday"]["lunch"]["title"], "Pasta al pesto")
+        self.assertEqual({v.slot for v in report.unresolved}, {("monday", "lunch"), ("tuesday", "dinner")})
+
+    def test_screen_plan_rerenders_changed_plans(self):
+        result = parse_plan_response(get_dummy_response())
+        self.assertIs(screen_plan(result, [], lambda prompt: ""), result)
+        self.assertIs(screen_plan(result, ["broccoli"], lambda prompt: ""), result)
+
+        plan_text, shopping_list, raw_json = screen_plan(result, ["pesce"], lambda prompt: "not json")
+        self.assertNotIn("salmone", shopping_list)
+        self.assertIn("Salmone", plan_text)  # unresolved meals are kept
+        self.assertNotIn("salmone 600g", json.loads(raw_json)["shopping_list"]["meat_fish_eggs"])
+
+
+    def test_failed_provider_is_no_rewrite(self):
+        labels = {"provider": "gemini", "reason": "missing_key"}
+        before = REGISTRY.get_sample_value("fame_dummy_responses_total", labels) or 0.0
+        self.assertEqual(ask_provider("Riscrivi", "gemini", None), "")
+        self.assertEqual(REGISTRY.get_sample_value("fame_dummy_responses_total", labels) or 0.0, before)
+        # The sample week's meal of the same slot is not taken as the rewrite.
+        plan_data = json.loads(get_dummy_response())
+        plan_data["weekly_plan"]["monday"]["lunch"]["title"] = "Pollo al curry"
+        result = parse_plan_response(json.dumps(plan_data))
+        _, _, raw_json = screen_plan(result, ["curry"], lambda prompt: ask_provider(prompt, "gemini", None))
+        self.assertEqual(json.loads(raw_json)["weekly_plan"]["monday"]["lunch"]["title"], "Pollo al curry")
+
+
+if __name__ == "__main__":
+    unittest.main()
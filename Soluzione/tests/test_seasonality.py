@@ -0,0 +1,79 @@
+"""
+Tests for the seasonal-produce index and its use in prompts and plans.
+"""
+
+import json
+import unittest
+from datetime import date
+from unittest import mock
+
+from seasonality import (
+    ITALY,
+    area_for_region,
+    is_in_season,
+    match_produce,
+    out_of_season_items,
+    prompt_section,
+    seasonal_produce,
+    week_months,
+)
+from utils import build_plan_prompt, check_seasonality
+
+
+class SeasonalityTestCase(unittest.TestCase):
+    def test_regions(self):
+        self.assertEqual(area_for_region("Campania, Italy"), "sud")
+        self.assertEqual(area_for_region("Lombardy"), "nord")
+        self.assertEqual(area_for_region("Valle d'Aosta"), "nord")
+        self.assertEqual(area_for_region(None), ITALY)
+        self.assertEqual(area_for_region("Italia"), ITALY)
+        self.assertIsNone(area_for_region("Bavaria, Germany"))
+
+    def test_lookup(self):
+        self.assertIn("zucchine", seasonal_produce("Sicilia", 4))
+        self.assertNotIn("zucchine", seasonal_produce("Piemonte", 4))
+        self.assertIn("arance", seasonal_produce("Sicilia", 1))
+        self.assertNotIn("arance", seasonal_produce("Sicilia", 7))
+        # Wrapping ranges such as October-February.
+        self.assertIn("cavolini di bruxelles", seasonal_produce("Veneto", 1))
+        self.assertEqual(seasonal_produce("Bavaria, Germany", 1), ())
+        # Without a region, anything in season somewhere in Italy is allowed.
+        self.assertIn("zucchine", seasonal_produce(None, 4))
+
+    def test_match_produce(self):
+        self.assertEqual(match_produce("Pomodorini ciliegino 500g"), "pomodori")
+        self.assertEqual(match_produce("cime di rapa 1kg"), "cime di rapa")
+        self.assertEqual(match_produce("cavolo nero 300g"), "cavolo nero")
+        self.assertEqual(match_produce("Limoni 3 pz"), "limoni")
+        self.assertIsNone(match_produce("banane 1kg"))
+
+    def test_weeks_across_two_months(self):
+        self.assertEqual(week_months(date(2025, 6, 30)), [6, 7])
+        # Peaches start in June, which the week of 26 May reaches.
+        self.assertTrue(is_in_season("pesche", "Lazio", week_months(date(2025, 5, 26))))
+        self.assertFalse(is_in_season("pesche", "Lazio", week_months(date(2025, 5, 5))))
+
+    def test_out_of_season_items(self):
+        items = ["pomodori 1kg", "zucchine 500g", "arance 2kg", "banane 1kg", "limoni 3 pz"]
+        self.assertEqual(
+            out_of_season_items(items, "Lombardia, Italy", date(2025, 1, 13)),
+            ["pomodori 1kg", "zucchine 500g"],
+        )
+        self.assertEqual(out_of_season_items(items, "Bavaria, Germany", date(2025, 1, 13)), [])
+
+    def test_prompt_contains_the_allowed_list(self):
+        prompt = build_plan_prompt("dieta", None, "Puglia, Italy", date(2025, 1, 13), False, None, None)
+        self.assertIn("FRUTTA E VERDURA DI STAGIONE (Puglia, Italy, gennaio):", prompt)
+        self.assertIn("cime di rapa", prompt)
+        self.assertEqual(prompt_section("Bavaria, Germany", date(2025, 1, 13)), "")
+
+    def test_check_seasonality_logs_violations(self):
+        raw = json.dumps({"shopping_list": {"vegetables_fruits": ["fragole 500g", "mele 1kg"]}})
+        with mock.patch("utils.log_event") as log_event:
+            self.assertEqual(check_seasonality(raw, "Toscana", date(2025, 11, 3)), ["fragole 500g"])
+        self.assertEqual(log_event.call_args.kwargs["items"], ["fragole 500g"])
+        self.assertEqual(check_seasonality("non json", "Toscana", date(2025, 11, 3)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Tests for the SQLite production mode: pragmas and serialized writers.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app import create_app
+from models import db, Plan, User
+
+
+class SqliteTuningTestCase(unittest.TestCase):
+    def make_app(self, **config):
+        return create_app(
+            dict(
+                {
+                    "TESTING": True,
+                    "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                    + os.path.join(self.tmpdir.name, "test.db"),
+                },
+                **config,
+            )
+        )
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def pragma(self, name):
+        return db.session.execute(text(f"PRAGMA {name}")).scalar()
+
+    def test_pragmas_applied_on_connect(self):
+        app = self.make_app(SQLITE_BUSY_TIMEOUT_MS=1234, SQLITE_CACHE_SIZE_KIB=4096)
+        with app.app_context():
+            self.assertEqual(self.pragma("journal_mode"), "wal")
+            self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+            self.assertEqual(self.pragma("busy_timeout"), 1234)
+            self.assertEqual(self.pragma("cache_size"), -4096)
+            self.assertGreater(self.pragma("mmap_size"), 0)
+
+    def test_disabled(self):
+        app = self.make_app(SQLITE_TUNING=False)
+        with app.app_context():
+            self.assertEqual(self.pragma("journal_mode"), "delete")
+
+    def test_concurrent_writers_do_not_hit_locked_errors(self):
+        # A 1ms busy timeout makes SQLite give up almost at once, so every
+        # write must get through the in-process writer queue.
+        app = self.make_app(SQLITE_BUSY_TIMEOUT_MS=1)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(
+                User(id=i, username=f"user{i}", email=f"user{i}@example.com", password="x")
+                for i in range(1, 9)
+            )
+            db.session.commit()
+        errors = []
+
+        def writer(user_id):
+            for week in range(15):
+                with app.app_context():
+                    try:
+                        db.session.add(
+                            Plan(
+                                user_id=user_id,
+                                start_date=date(2025, 1, 6) + timedelta(weeks=week),
+                                content="piano",
+                                json_content="{}",
+                                shopping_list="",
+                            )
+                        )
+                        db.session.commit()
+                    except Exception as exc:  # noqa: BLE001 - collected for the assertion
+                        errors.append(exc)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with app.app_context():
+            self.assertEqual(Plan.query.count(), 8 * 15)
+
+    def test_lock_released_on_rollback(self):
+        app = self.make_app(SQLITE_BUSY_TIMEOUT_MS=500)
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+            db.session.flush()
+            db.session.rollback()
+            db.session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+            # Would wait for the lock (and log a timeout) if it had leaked.
+            db.session.commit()
+            self.assertEqual(User.query.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
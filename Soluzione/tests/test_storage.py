@@ -0,0 +1,172 @@
+"""
+Tests for the compact storage types and the plan text derived from JSON.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from unittest.mock import patch
+
+from sqlalchemy import column, insert, select, table, text
+from sqlalchemy.dialects import postgresql
+
+from app import create_app
+from compress_storage import run_compress
+from models import db, Diet, Plan, User
+from storage import CompactJSONText, CompressedText, compact_json, compress_text, decompress_text
+from utils import get_dummy_response, parse_plan_response
+
+
+class CompressTextTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        for value in ["", "breve", "Pasta al pomodoro " * 200, "\x01inizia con un tag"]:
+            with self.subTest(value=value[:20]):
+                self.assertEqual(decompress_text(compress_text(value)), value)
+
+    def test_large_values_are_compressed(self):
+        value = "Pasta al pomodoro " * 200
+        self.assertLess(len(compress_text(value)), len(value) // 10)
+        self.assertEqual(compress_text("breve"), b"breve")
+
+    def test_legacy_values_are_read_unchanged(self):
+        self.assertEqual(decompress_text("testo"), "testo")
+        self.assertEqual(decompress_text(memoryview("testo".encode())), "testo")
+
+    def test_postgresql_keeps_text_columns(self):
+        dialect = postgresql.dialect()
+        self.assertEqual(CompressedText().compile(dialect=dialect), "TEXT")
+        value = '{\n  "a": "' + "pasta " * 100 + '"\n}'
+        self.assertEqual(CompactJSONText().process_bind_param(value, dialect), compact_json(value))
+        self.assertEqual(CompressedText().process_result_value("testo", dialect), "testo")
+
+    def test_compact_json(self):
+        self.assertEqual(compact_json('{\n  "a": [1, 2],\n  "b": "è"\n}'), '{"a":[1,2],"b":"è"}')
+        self.assertEqual(compact_json("non è json"), "non è json")
+
+
+class PlanStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+        db.session.commit()
+        self.plan_text, self.shopping_list, self.raw_json = parse_plan_response(
+            get_dummy_response()
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def stored(self, plan_id):
+        return db.session.execute(
+            text("SELECT content, json_content, shopping_list FROM plan WHERE id = :id"),
+            {"id": plan_id},
+        ).one()
+
+    def add_plan(self, **values):
+        plan = Plan(user_id=1, start_date=date(2025, 1, 6), **values)
+        db.session.add(plan)
+        db.session.commit()
+        plan_id = plan.id
+        db.session.expunge_all()
+        return plan_id
+
+    def test_derived_text_is_stored_compressed(self):
+        plan_id = self.add_plan(
+            content=self.plan_text, json_content=self.raw_json, shopping_list=self.shopping_list
+        )
+        content, json_content, shopping_list = self.stored(plan_id)
+        self.assertEqual(decompress_text(content), self.plan_text)
+        self.assertLess(len(shopping_list), len(self.shopping_list) // 2)
+        self.assertNotIn(b"\n  ", json_content)
+        plan = db.session.get(Plan, plan_id)
+        with patch("rendering.render_weekly_plan") as render:
+            self.assertEqual(plan.content, self.plan_text)
+            self.assertEqual(plan.shopping_list, self.shopping_list)
+        render.assert_not_called()
+        self.assertEqual(json.loads(plan.json_content), json.loads(self.raw_json))
+
+    def test_text_stored_empty_is_rendered(self):
+        plan_id = self.add_plan(content="", json_content=self.raw_json, shopping_list="")
+        plan = db.session.get(Plan, plan_id)
+        self.assertEqual(plan.content, self.plan_text)
+        self.assertEqual(plan.shopping_list, self.shopping_list)
+        db.session.expunge_all()
+        run_compress()
+        content, _, shopping_list = self.stored(plan_id)
+        self.assertEqual(decompress_text(content), self.plan_text)
+        self.assertEqual(decompress_text(shopping_list), self.shopping_list)
+
+    def test_text_that_differs_is_kept(self):
+        plan_id = self.add_plan(
+            content="Piano scritto a mano", json_content="{}", shopping_list="Pane, latte"
+        )
+        plan = db.session.get(Plan, plan_id)
+        self.assertEqual(plan.content, "Piano scritto a mano")
+        plan.shopping_list += " (modificata)"
+        db.session.commit()
+        db.session.expunge_all()
+        self.assertEqual(db.session.get(Plan, plan_id).shopping_list, "Pane, latte (modificata)")
+
+    def test_compress_rewrites_legacy_rows(self):
+        pretty = json.dumps(json.loads(self.raw_json), ensure_ascii=False, indent=2)
+        diet_text = "Colazione: yogurt e frutta\n" * 100
+        db.session.execute(
+            insert(table("diet", column("user_id"), column("content"))),
+            {"user_id": 1, "content": diet_text},
+        )
+        db.session.execute(
+            insert(
+                table(
+                    "plan",
+                    column("user_id"),
+                    column("start_date"),
+                    column("content"),
+                    column("json_content"),
+                    column("shopping_list"),
+                )
+            ),
+            {
+                "user_id": 1,
+                "start_date": date(2025, 1, 6),
+                "content": self.plan_text,
+                "json_content": pretty,
+                "shopping_list": self.shopping_list,
+            },
+        )
+        db.session.commit()
+        # Legacy rows are readable before the rewrite...
+        plan = Plan.query.one()
+        self.assertEqual(plan.content, self.plan_text)
+        db.session.expunge_all()
+
+        report = run_compress(batch_size=1)
+        self.assertEqual((report.diets, report.plans), (1, 1))
+        content, json_content, shopping_list = self.stored(plan.id)
+        self.assertLess(len(content), len(self.plan_text) // 2)
+        self.assertLess(len(json_content), len(pretty) // 2)
+        # ...and unchanged after it.
+        plan = Plan.query.one()
+        self.assertEqual(plan.content, self.plan_text)
+        self.assertEqual(plan.shopping_list, self.shopping_list)
+        self.assertEqual(Diet.query.one().content, diet_text)
+        stored_diet = db.session.execute(select(text("content")).select_from(table("diet"))).scalar()
+        self.assertLess(len(stored_diet), len(diet_text) // 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,52 +2,55 @@
 Unit tests for the utility functions in the Fame application.
 
 These tests verify that the stubbed Gemini API returns a sensible plan when
-no API key is provided, that the weekly plan generator returns both plan
-and shopping list text, and that the email sender prints messages when
-mail settings are not configured. The tests use Python's built‑in
-unittest framework so they can run without additional dependencies.
+no API key is provided, that the weekly plan generator returns the plan
+text, the shopping list and the raw JSON, and that the email sender prints
+messages when mail settings are not configured. The tests use Python's
+built‑in unittest framework so they can run without additional dependencies.
 """
 
+import json
 import os
 import unittest
 from datetime import date
 from io import StringIO
 import sys
 
-from fame_app.utils import call_gemini_api, generate_weekly_plan, send_email
+from utils import call_gemini_api, generate_weekly_plan, get_dummy_response, parse_plan_outcome, send_email
 
 
 class UtilsTestCase(unittest.TestCase):
-    def setUp(self):
-        # Ensure GEMINI_API_KEY is not set to force dummy response
-        self.original_api_key = os.environ.pop("GEMINI_API_KEY", None)
-
-    def tearDown(self):
-        # Restore any original API key
-        if self.original_api_key is not None:
-            os.environ["GEMINI_API_KEY"] = self.original_api_key
-
     def test_call_gemini_api_dummy(self):
         prompt = "Generate a weekly plan"
-        response = call_gemini_api(prompt)
-        # The dummy response should include seven lines (one per day)
-        lines = response.strip().split("\n")
-        self.assertEqual(len(lines), 7)
-        # Ensure each line contains both lunch and dinner
-        for line in lines:
-            self.assertIn("lunch", line.lower())
-            self.assertIn("dinner", line.lower())
+        # Without an API key the dummy plan is returned instead of calling Gemini
+        response = call_gemini_api(prompt, None)
+        weekly_plan = json.loads(response)["weekly_plan"]
+        # The dummy response should include all seven days
+        self.assertEqual(len(weekly_plan), 7)
+        # Ensure each day contains both lunch and dinner
+        for meals in weekly_plan.values():
+            self.assertIn("lunch", meals)
+            self.assertIn("dinner", meals)
 
     def test_generate_weekly_plan(self):
         diet_text = "Balanced diet"
         preferences = ["tomatoes"]
         region = "Campania, Italy"
         start_date = date.today()
-        plan_text, shopping = generate_weekly_plan(diet_text, preferences, region, start_date)
-        self.assertTrue(plan_text)
-        self.assertTrue(shopping)
-        # The shopping list should be a comma-separated string
-        self.assertIn(",", shopping)
+        plan_text, shopping, raw_json = generate_weekly_plan(
+            diet_text, preferences, region, start_date, False, None, None, "gemini", None
+        )
+        self.assertIn("LUNEDÌ", plan_text)
+        # The shopping list is an HTML fragment grouped by category
+        self.assertIn("VERDURA E FRUTTA", shopping)
+        self.assertIn("shopping_list", json.loads(raw_json))
+
+    def test_parse_plan_outcome(self):
+        _, outcome = parse_plan_outcome(get_dummy_response())
+        self.assertEqual(outcome, "json")
+        # The text fallback also yields JSON, but is reported as such.
+        (_, _, raw_json), outcome = parse_plan_outcome("Lunedì\nPranzo: pasta al pomodoro")
+        self.assertEqual(outcome, "text_fallback")
+        self.assertIn("weekly_plan", json.loads(raw_json))
 
     def test_send_email_print(self):
         # Ensure no mail server configured
@@ -70,4 +73,4 @@ class UtilsTestCase(unittest.TestCase):
 
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Tests for the near-duplicate detection of plan meals.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from app import create_app
+from models import db, Plan
+from utils import build_plan_prompt, check_variety, get_dummy_response
+from variety import HistoryIndex, embed, find_duplicates, history_index, history_indexes
+
+
+def _meal(title, description=""):
+    return {"title": title, "description": description}
+
+
+def _plan(user_id, start_date, titles):
+    weekly_plan = {"monday": {f"meal{i}": _meal(title) for i, title in enumerate(titles)}}
+    return Plan(
+        user_id=user_id,
+        start_date=start_date,
+        content="",
+        json_content=json.dumps({"weekly_plan": weekly_plan}),
+        shopping_list="",
+    )
+
+
+class EmbeddingTestCase(unittest.TestCase):
+    def test_similarity(self):
+        vectors = embed(
+            [
+                _meal("Pollo al limone"),
+                _meal("Petto di pollo al limone"),
+                _meal("Pasta al pomodoro"),
+                _meal(""),
+            ]
+        )
+        self.assertEqual(vectors.shape[0], 4)
+        self.assertGreater(float(vectors[0] @ vectors[1]), 0.6)
+        self.assertLess(float(vectors[0] @ vectors[2]), 0.2)
+        self.assertEqual(float(vectors[3] @ vectors[3]), 0.0)
+        self.assertAlmostEqual(float(vectors[0] @ vectors[0]), 1.0, places=5)
+        self.assertEqual(embed([]).shape[0], 0)
+
+    def test_duplicates_within_a_plan(self):
+        weekly_plan = {
+            "monday": {"lunch": _meal("Pollo al limone"), "dinner": _meal("Zuppa di ceci")},
+            "tuesday": {"lunch": _meal("Petti di pollo al limone"), "dinner": _meal("Orata al forno")},
+        }
+        duplicates = find_duplicates(weekly_plan)
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0].slot, ("tuesday", "lunch"))
+        self.assertEqual(duplicates[0].other_slot, ("monday", "lunch"))
+        self.assertIsNone(duplicates[0].other_week)
+        self.assertEqual(find_duplicates(json.loads(get_dummy_response())["weekly_plan"]), [])
+        self.assertEqual(find_duplicates({}), [])
+
+    def test_duplicates_against_history(self):
+        history = HistoryIndex(
+            ["Salmone al forno con patate", "Risotto ai funghi"],
+            [date(2025, 1, 6), date(2025, 1, 6)],
+            embed([_meal("Salmone al forno con patate"), _meal("Risotto ai funghi")]),
+        )
+        duplicates = find_duplicates({"monday": {"dinner": _meal("Salmone al forno con verdure")}}, history)
+        self.assertEqual([(d.other_title, d.other_week) for d in duplicates], [("Salmone al forno con patate", date(2025, 1, 6))])
+        self.assertEqual(check_variety(json.dumps({"weekly_plan": {"monday": {"dinner": _meal("Risotto ai funghi")}}}), history)[0].similarity, 1.0)
+
+
+class HistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            }
+        )
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add_all(
+            [
+                _plan(1, date(2025, 1, 6), ["Pollo al limone", "Zuppa di ceci"]),
+                _plan(1, date(2025, 1, 13), ["Petto di pollo al limone", "Orata al forno"]),
+                _plan(1, date(2024, 11, 4), ["Lasagne"]),
+                _plan(1, date(2025, 1, 20), ["Pizza"]),
+                _plan(2, date(2025, 1, 13), ["Frittata di zucchine"]),
+            ]
+        )
+        db.session.commit()
+
+    def tearDown(self):
+        self.ctx.pop()
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_recent_weeks_newest_first(self):
+        history = history_index(1, date(2025, 1, 20))
+        self.assertEqual(
+            history.titles, ["Petto di pollo al limone", "Orata al forno", "Pollo al limone", "Zuppa di ceci"]
+        )
+        # Near-duplicates are listed once, under their newest title.
+        self.assertEqual(history.exclusions(), ["Petto di pollo al limone", "Orata al forno", "Zuppa di ceci"])
+        self.assertEqual(history.exclusions(limit=1), ["Petto di pollo al limone"])
+        self.assertEqual(history_index(1, date(2025, 1, 20), weeks=1).titles, ["Petto di pollo al limone", "Orata al forno"])
+
+    def test_many_users_and_prompt(self):
+        histories = history_indexes([1, 2, 3], date(2025, 1, 20))
+        self.assertEqual(histories[2].titles, ["Frittata di zucchine"])
+        self.assertEqual(histories[3].titles, [])
+        prompt = build_plan_prompt("Dieta", [], "Lazio", date(2025, 1, 20), False, None, None, histories[2])
+        self.assertIn("PIATTI GIÀ PROPOSTI NELLE ULTIME SETTIMANE", prompt)
+        self.assertIn("Frittata di zucchine", prompt)
+        self.assertNotIn("PIATTI GIÀ PROPOSTI", build_plan_prompt("Dieta", [], "Lazio", date(2025, 1, 20), False, None, None, histories[3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
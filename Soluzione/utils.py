@@ -15,15 +15,37 @@ send_email will print the message to stdout instead of attempting to send.
 from __future__ import annotations
 
 import json
+import logging
 import os
 import smtplib
 import ssl
 from datetime import date, timedelta
 from email.mime.text import MIMEText
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable
 
 import requests
 
+from ingredients import merge_items
+from instrumentation import log_event, span
+from metrics import (
+    CATALOG_PLANS,
+    DUMMY_RESPONSES,
+    OUT_OF_SEASON_ITEMS,
+    PLAN_PARSE,
+    PROVIDER_FALLBACK_DEPTH,
+    VARIETY_DUPLICATES,
+    track_provider_call,
+)
+from nutrition import annotate
+from preparation import prepare_plan
+from household import Household, prompt_section as household_section, scale_plan
+from plan_parser import parse_plan_content
+from recipes import assemble_week
+from rendering import render_shopping_list, render_shopping_text, render_weekly_plan
+from screening import compile_screen, enforce_preferences
+from seasonality import out_of_season_items, prompt_section
+from variety import Duplicate, HistoryIndex, find_duplicates, prompt_section as variety_section
+
 
 def load_prompt_template() -> str:
     """Load the prompt template from prompt.txt file."""
@@ -91,27 +113,78 @@ def get_dummy_response() -> str:
     return json.dumps(dummy_response, ensure_ascii=False, indent=2)
 
 
-def call_ai_api(prompt: str, provider: str, api_key: str) -> str:
-    """Call the appropriate AI API based on provider."""
+# Base URLs of the provider APIs. They can be overridden through the
+# environment, e.g. to point at the fake server used by the benchmarks.
+API_BASES = {
+    "gemini": ("GEMINI_API_BASE", "https://generativelanguage.googleapis.com"),
+    "openai": ("OPENAI_API_BASE", "https://api.openai.com"),
+    "claude": ("ANTHROPIC_API_BASE", "https://api.anthropic.com"),
+}
+
+
+def api_base(provider: str) -> str:
+    """Return the base URL used to reach ``provider``."""
+    env_var, default = API_BASES[provider]
+    return (os.getenv(env_var) or default).rstrip("/")
+
+
+# Returns the answer to use when a provider cannot, or None for the dummy plan.
+Fallback = Callable[[], str | None]
+
+
+def fallback_response(provider: str, reason: str, fallback: Fallback | None = None) -> str:
+    """Return the fallback answer, counting why a provider could not be used.
+
+    ``fallback`` (e.g. a plan from the local recipe catalog) is tried first;
+    the dummy plan is used when there is none or it returns None.
+    """
+    if fallback is no_answer:
+        return ""
+    if fallback is not None:
+        response_text = fallback()
+        if response_text is not None:
+            CATALOG_PLANS.labels(reason).inc()
+            return response_text
+    DUMMY_RESPONSES.labels(provider, reason).inc()
+    return get_dummy_response()
+
+
+def no_answer() -> str | None:
+    """Fallback of ``ask_provider``: an empty answer instead of the dummy plan."""
+    return ""
+
+
+def ask_provider(prompt: str, provider: str, api_key: str) -> str:
+    """Send a follow-up prompt (meal rewrites, preparation steps) to the provider.
+
+    Returns "" when the provider cannot answer: unlike ``call_ai_api`` it never
+    falls back to the dummy plan, whose meals would be taken for an answer.
+    """
+    return call_ai_api(prompt, provider, api_key, no_answer)
+
+
+def call_ai_api(prompt: str, provider: str, api_key: str, fallback: Fallback | None = None) -> str:
+    """Call the appropriate AI API based on provider.
+
+    When the provider cannot answer, the result of ``fallback`` is returned
+    instead, or the dummy plan (see ``fallback_response``).
+    """
     if provider == "gemini":
-        return call_gemini_api(prompt, api_key)
+        return call_gemini_api(prompt, api_key, fallback)
     elif provider == "openai":
-        return call_openai_api(prompt, api_key)
+        return call_openai_api(prompt, api_key, fallback)
     elif provider == "claude":
-        return call_claude_api(prompt, api_key)
+        return call_claude_api(prompt, api_key, fallback)
     else:
-        print(f"❌ Provider non supportato: {provider}")
-        return get_dummy_response()
+        log_event("provider_unsupported", level=logging.WARNING, provider=provider)
+        return fallback_response(str(provider), "unsupported_provider", fallback)
 
 
-def call_gemini_api(prompt: str, api_key: str) -> str:
+def call_gemini_api(prompt: str, api_key: str, fallback: Fallback | None = None) -> str:
     """Send a prompt to Google's Gemini API and return its response text."""
     if not api_key:
-        print("❌ Nessuna API key Gemini fornita")
-        return get_dummy_response()
-    
-    print(f"🔄 Tentativo con Gemini API...")
-    print(f"📝 Lunghezza prompt: {len(prompt)} caratteri")
+        log_event("provider_missing_key", level=logging.WARNING, provider="gemini")
+        return fallback_response("gemini", "missing_key", fallback)
     
     # Prepare the request payload
     headers = {"Content-Type": "application/json"}
@@ -135,20 +208,20 @@ def call_gemini_api(prompt: str, api_key: str) -> str:
         "gemini-1.5-pro-002",        # Versione alternativa di 1.5 Pro
     ]
     
-    for model in models_to_try:
+    for depth, model in enumerate(models_to_try):
         url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+            f"{api_base('gemini')}/v1beta/models/{model}:generateContent"
             f"?key={api_key}"
         )
-        print(f"🔄 Tentativo con modello: {model}")
         
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            print(f"📡 Risposta ricevuta - Status: {response.status_code}")
+            with span("provider_call", provider="gemini", model=model, prompt_chars=len(prompt)) as info, \
+                    track_provider_call("gemini", model) as call:
+                response = requests.post(url, json=payload, headers=headers, timeout=30)
+                info["status_code"] = call["status"] = response.status_code
             
             if response.status_code == 200:
                 data = response.json()
-                print(f"✅ Risposta JSON valida ricevuta con {model}")
                 
                 response_text = (
                     data.get("candidates", [{}])[0]
@@ -157,32 +230,32 @@ def call_gemini_api(prompt: str, api_key: str) -> str:
                     .get("text", "")
                 )
                 
-                print(f"📄 Prime 300 caratteri: {response_text[:300]}...")
+                log_event("provider_response", provider="gemini", model=model, response_chars=len(response_text))
+                PROVIDER_FALLBACK_DEPTH.labels("gemini").observe(depth)
                 return response_text
             elif response.status_code == 404:
-                print(f"❌ Modello {model} non disponibile, provo il prossimo...")
+                # Model not available, try the next one
                 continue
             else:
-                print(f"⚠️ Error from Gemini API ({model}): {response.status_code}")
+                log_event("provider_error", level=logging.WARNING, provider="gemini", model=model, status_code=response.status_code)
                 continue
                 
         except Exception as exc:
-            print(f"💥 Exception calling Gemini API ({model}): {exc}")
+            log_event("provider_exception", level=logging.WARNING, provider="gemini", model=model, error=str(exc))
             continue
     
-    print("❌ Tutti i modelli Gemini hanno fallito")
-    return get_dummy_response()
+    log_event("provider_exhausted", level=logging.ERROR, provider="gemini", models=len(models_to_try))
+    PROVIDER_FALLBACK_DEPTH.labels("gemini").observe(len(models_to_try))
+    return fallback_response("gemini", "all_models_failed", fallback)
 
 
-def call_openai_api(prompt: str, api_key: str) -> str:
+def call_openai_api(prompt: str, api_key: str, fallback: Fallback | None = None) -> str:
     """Call OpenAI API."""
     if not api_key:
-        print("❌ Nessuna API key OpenAI fornita")
-        return get_dummy_response()
+        log_event("provider_missing_key", level=logging.WARNING, provider="openai")
+        return fallback_response("openai", "missing_key", fallback)
 
-    print(f"🔄 Tentativo con OpenAI API...")
-    
-    url = "https://api.openai.com/v1/chat/completions"
+    url = f"{api_base('openai')}/v1/chat/completions"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
@@ -201,33 +274,32 @@ def call_openai_api(prompt: str, api_key: str) -> str:
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        print(f"📡 Risposta ricevuta - Status: {response.status_code}")
+        with span("provider_call", provider="openai", model=payload["model"], prompt_chars=len(prompt)) as info, \
+                track_provider_call("openai", payload["model"]) as call:
+            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            info["status_code"] = call["status"] = response.status_code
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Risposta JSON valida ricevuta da OpenAI")
             
             response_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            print(f"📄 Prime 300 caratteri: {response_text[:300]}...")
+            log_event("provider_response", provider="openai", model=payload["model"], response_chars=len(response_text))
             return response_text
         else:
-            print(f"❌ Error from OpenAI API: {response.status_code}")
-            return get_dummy_response()
+            log_event("provider_error", level=logging.WARNING, provider="openai", model=payload["model"], status_code=response.status_code)
+            return fallback_response("openai", "http_error", fallback)
     except Exception as exc:
-        print(f"💥 Exception calling OpenAI API: {exc}")
-        return get_dummy_response()
+        log_event("provider_exception", level=logging.WARNING, provider="openai", model=payload["model"], error=str(exc))
+        return fallback_response("openai", "exception", fallback)
 
 
-def call_claude_api(prompt: str, api_key: str) -> str:
+def call_claude_api(prompt: str, api_key: str, fallback: Fallback | None = None) -> str:
     """Call Anthropic Claude API."""
     if not api_key:
-        print("❌ Nessuna API key Claude fornita")
-        return get_dummy_response()
+        log_event("provider_missing_key", level=logging.WARNING, provider="claude")
+        return fallback_response("claude", "missing_key", fallback)
     
-    print(f"🔄 Tentativo con Claude API...")
-    
-    url = "https://api.anthropic.com/v1/messages"
+    url = f"{api_base('claude')}/v1/messages"
     headers = {
         "Content-Type": "application/json",
         "x-api-key": api_key,
@@ -246,25 +318,35 @@ def call_claude_api(prompt: str, api_key: str) -> str:
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        print(f"📡 Risposta ricevuta - Status: {response.status_code}")
+        with span("provider_call", provider="claude", model=payload["model"], prompt_chars=len(prompt)) as info, \
+                track_provider_call("claude", payload["model"]) as call:
+            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            info["status_code"] = call["status"] = response.status_code
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Risposta JSON valida ricevuta da Claude")
             
             response_text = data.get("content", [{}])[0].get("text", "")
-            print(f"📄 Prime 300 caratteri: {response_text[:300]}...")
+            log_event("provider_response", provider="claude", model=payload["model"], response_chars=len(response_text))
             return response_text
         else:
-            print(f"❌ Error from Claude API: {response.status_code}")
-            return get_dummy_response()
+            log_event("provider_error", level=logging.WARNING, provider="claude", model=payload["model"], status_code=response.status_code)
+            return fallback_response("claude", "http_error", fallback)
     except Exception as exc:
-        print(f"💥 Exception calling Claude API: {exc}")
-        return get_dummy_response()
+        log_event("provider_exception", level=logging.WARNING, provider="claude", model=payload["model"], error=str(exc))
+        return fallback_response("claude", "exception", fallback)
 
 
-def generate_weekly_plan(
+def next_plan_start_date(today: date | None = None) -> date:
+    """Return the Monday of the week following ``today``."""
+    today = today or date.today()
+    days_ahead = -today.weekday() + 7
+    if days_ahead <= 0:
+        days_ahead += 7
+    return today + timedelta(days=days_ahead)
+
+
+def build_plan_prompt(
     diet_text: str,
     preferences: list[str] | None,
     region: str | None,
@@ -272,10 +354,14 @@ def generate_weekly_plan(
     trains: bool,
     training_frequency: int | None,
     training_days: str | None,
-    user_api_provider: str = "gemini",
-    user_api_key: str = None,
-) -> tuple[str, str, str]:
-    """Generate a weekly meal plan and shopping list using AI API."""
+    history: HistoryIndex | None = None,
+    household: Household | None = None,
+) -> str:
+    """Compose the full prompt sent to the AI provider for a weekly plan.
+
+    ``history`` (the user's recent meals, see variety.py) adds the dishes
+    not to repeat; ``household`` (see household.py) the people to cook for.
+    """
     # Load the prompt template
     prompt_template = load_prompt_template()
     
@@ -291,7 +377,7 @@ def generate_weekly_plan(
         region=region_str
     )
 
-    context_prompt = f"""
+    return f"""
 DIETA BASE FORNITA DAL NUTRIZIONISTA:
 {diet_text}
 
@@ -301,15 +387,29 @@ PREFERENZE ALIMENTARI (da evitare):
 REGIONE GEOGRAFICA:
 {region_str}
 
-DATA DI INIZIO SETTIMANA:
+{household_section(household)}{prompt_section(region, start_date)}{variety_section(history)}DATA DI INIZIO SETTIMANA:
 {start_date.isoformat()} (Lunedì)
 
 {prompt_with_context}
 """
-    
-    # Call AI API with user's provider and key
-    response_text = call_ai_api(context_prompt, user_api_provider, user_api_key)
-    
+
+
+def parse_plan_response(response_text: str) -> tuple[str, str, str]:
+    """Turn a raw provider response into plan text, shopping list and JSON.
+
+    Returns:
+        A ``(plan_text, shopping_list_text, raw_json)`` tuple. When the
+        response is not valid JSON, ``raw_json`` holds the weekly plan parsed
+        back from the plain text.
+    """
+    return parse_plan_outcome(response_text)[0]
+
+
+def parse_plan_outcome(response_text: str) -> tuple[tuple[str, str, str], str]:
+    """Return what ``parse_plan_response`` returns and how the response was read.
+
+    The outcome is "json" or "text_fallback", as in the ``PLAN_PARSE`` metric.
+    """
     # Try to parse JSON response
     try:
         # Clean the response in case there's extra text
@@ -318,6 +418,7 @@ DATA DI INIZIO SETTIMANA:
             response_text_cleaned = response_text_cleaned.replace('```json', '').replace('```', '').strip()
         
         plan_data = json.loads(response_text_cleaned)
+        PLAN_PARSE.labels("json").inc()
         
         # Format the plan text
         plan_text = format_weekly_plan(plan_data.get("weekly_plan", {}))
@@ -325,102 +426,263 @@ DATA DI INIZIO SETTIMANA:
         # Format the shopping list
         shopping_list_text = format_shopping_list(plan_data.get("shopping_list", {}))
         
-        return plan_text, shopping_list_text, response_text # Return raw JSON as well
+        return (plan_text, shopping_list_text, response_text), "json" # Return raw JSON as well
         
     except json.JSONDecodeError:
+        PLAN_PARSE.labels("text_fallback").inc()
         # Fallback: treat as plain text (old format)
         plan_text = response_text
         shopping_list_text = ""
         if "Shopping List:" in response_text:
             parts = response_text.split("Shopping List:", 1)
             plan_text = parts[0].strip()
-            shopping_list_text = parts[1].strip()
+            # Stored as HTML and shown unescaped, like the rendered lists.
+            shopping_list_text = render_shopping_text(parts[1].strip())
         else:
             # Simple fallback shopping list
             shopping_list_text = "Lista della spesa non disponibile - utilizzare il piano per creare manualmente"
         
-        return plan_text, shopping_list_text, "{}" # Return empty JSON on failure
+        # Parse the text once here so views never need the text fallback.
+        structured = {"weekly_plan": parse_plan_content(plan_text)}
+        return (plan_text, shopping_list_text, json.dumps(structured, ensure_ascii=False)), "text_fallback"
+
+
+def generate_weekly_plan(
+    diet_text: str,
+    preferences: list[str] | None,
+    region: str | None,
+    start_date: date,
+    trains: bool,
+    training_frequency: int | None,
+    training_days: str | None,
+    user_api_provider: str = "gemini",
+    user_api_key: str = None,
+    catalog_mode: str = "off",
+    history: HistoryIndex | None = None,
+    household: Household | None = None,
+) -> tuple[str, str, str]:
+    """Generate a weekly meal plan and shopping list using AI API.
+
+    ``catalog_mode`` says how the local recipe catalog (see recipes.py) is
+    used: "primary" builds the plan from it without calling the provider,
+    "fallback" uses it instead of the dummy plan when the provider fails,
+    "off" never uses it. Both need an application context. ``history``
+    holds the user's recent meals, which the new plan should not repeat;
+    ``household`` the people it is for, whom servings and quantities are
+    scaled to. The preparation steps of the meals are added here too, so
+    the meal modal never has to ask the provider.
+    """
+    def from_catalog() -> str | None:
+        with span("catalog_plan"):
+            plan_data = assemble_week(
+                diet_text,
+                preferences,
+                region,
+                start_date,
+                trains,
+                training_days,
+                history.titles if history is not None else (),
+            )
+        return json.dumps(plan_data, ensure_ascii=False) if plan_data else None
+
+    response_text = None
+    provider_failed = False
+    if catalog_mode == "primary":
+        response_text = from_catalog()
+        if response_text is not None:
+            CATALOG_PLANS.labels("primary").inc()
+    if response_text is None:
+        with span("prompt_build"):
+            context_prompt = build_plan_prompt(
+                diet_text,
+                preferences,
+                region,
+                start_date,
+                trains,
+                training_frequency,
+                training_days,
+                history,
+                household,
+            )
+
+        # Call AI API with user's provider and key
+        def fallback() -> str | None:
+            nonlocal provider_failed
+            provider_failed = True
+            return from_catalog() if catalog_mode == "fallback" else None
+
+        with span("provider_request", provider=user_api_provider):
+            response_text = call_ai_api(context_prompt, user_api_provider, user_api_key, fallback)
+
+    with span("json_parse") as info:
+        result, outcome = parse_plan_outcome(response_text)
+        info["structured"] = outcome == "json"
+    with span("screening"):
+        result = screen_plan(
+            result,
+            preferences,
+            lambda prompt: ask_provider(prompt, user_api_provider, user_api_key),
+        )
+    with span("shopping_list"):
+        result = merge_shopping_list(result)
+        result = scale_to_household(result, household)
+    with span("nutrition"):
+        result = attach_nutrition(result)
+    with span("preparation"):
+        # A provider that just failed is not asked again for the steps.
+        result = attach_preparation(
+            result,
+            None if provider_failed else lambda prompt: ask_provider(prompt, user_api_provider, user_api_key),
+            catalog_mode != "off",
+        )
+    check_seasonality(result[2], region, start_date)
+    check_variety(result[2], history)
+    return result
+
+
+def _plan_data(raw_json: str) -> dict:
+    """Return the parsed plan JSON, ignoring a Markdown code fence."""
+    text = raw_json.strip()
+    if text.startswith("```json"):
+        text = text.replace("```json", "").replace("```", "").strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def screen_plan(
+    result: tuple[str, str, str],
+    preferences: list[str] | None,
+    ask: Callable[[str], str],
+) -> tuple[str, str, str]:
+    """Remove the user's disliked foods from a parsed plan (see screening.py).
+
+    ``ask`` sends a prompt to the user's provider and returns its answer; it
+    is used to rewrite the offending meals. Returns ``result`` unchanged when
+    nothing had to be fixed.
+    """
+    if not preferences:
+        return result
+    plan_data = _plan_data(result[2])
+    if not plan_data:
+        return result
+    report = enforce_preferences(plan_data, compile_screen(preferences), ask)
+    if not report.changed:
+        return result
+    shopping_list_text = result[1]
+    if "shopping_list" in plan_data:
+        shopping_list_text = format_shopping_list(plan_data["shopping_list"])
+    return (
+        format_weekly_plan(plan_data.get("weekly_plan", {})),
+        shopping_list_text,
+        json.dumps(plan_data, ensure_ascii=False),
+    )
+
+
+def merge_shopping_list(result: tuple[str, str, str]) -> tuple[str, str, str]:
+    """Add up the repeated items of a parsed plan's shopping list (see ingredients.py)."""
+    plan_data = _plan_data(result[2])
+    shopping_list = plan_data.get("shopping_list")
+    if not isinstance(shopping_list, dict) or not merge_items(shopping_list):
+        return result
+    return result[0], format_shopping_list(shopping_list), json.dumps(plan_data, ensure_ascii=False)
+
+
+def scale_to_household(result: tuple[str, str, str], household: Household | None) -> tuple[str, str, str]:
+    """Fit the servings and shopping quantities of a parsed plan to ``household``."""
+    if household is None:
+        return result
+    plan_data = _plan_data(result[2])
+    if not scale_plan(plan_data, household):
+        return result
+    shopping_list_text = result[1]
+    if "shopping_list" in plan_data:
+        shopping_list_text = format_shopping_list(plan_data["shopping_list"])
+    return (
+        format_weekly_plan(plan_data.get("weekly_plan", {})),
+        shopping_list_text,
+        json.dumps(plan_data, ensure_ascii=False),
+    )
+
+
+def attach_nutrition(result: tuple[str, str, str]) -> tuple[str, str, str]:
+    """Add the computed nutritional values to a parsed plan (see nutrition.py)."""
+    plan_data = _plan_data(result[2])
+    if not plan_data.get("weekly_plan"):
+        return result
+    return result[0], result[1], json.dumps(annotate(plan_data), ensure_ascii=False)
+
+
+def attach_preparation(
+    result: tuple[str, str, str],
+    ask: Callable[[str], str] | None,
+    use_catalog: bool = True,
+) -> tuple[str, str, str]:
+    """Add the preparation steps of the meals to a parsed plan (see preparation.py).
+
+    The provider is asked at most once per plan: the plan records that it
+    was (``preparation_requested``), so meals it gave no steps for keep the
+    generic ones instead of being asked for again.
+    """
+    plan_data = _plan_data(result[2])
+    weekly_plan = plan_data.get("weekly_plan")
+    if not isinstance(weekly_plan, dict) or not weekly_plan:
+        return result
+    if plan_data.get("preparation_requested"):
+        ask = None
+    prepare_plan(weekly_plan, ask, use_catalog)
+    if ask is not None:
+        plan_data["preparation_requested"] = True
+    return result[0], result[1], json.dumps(plan_data, ensure_ascii=False)
+
+
+def check_seasonality(raw_json: str, region: str | None, start_date: date) -> list[str]:
+    """Log and count the out-of-season produce in a plan's shopping list."""
+    shopping_list = _plan_data(raw_json).get("shopping_list") or {}
+    try:
+        items = shopping_list.get("vegetables_fruits") or []
+    except AttributeError:
+        return []
+    out = out_of_season_items(items, region, start_date)
+    if out:
+        OUT_OF_SEASON_ITEMS.inc(len(out))
+        log_event(
+            "out_of_season_produce",
+            level=logging.WARNING,
+            region=region,
+            start_date=start_date.isoformat(),
+            items=out,
+        )
+    return out
+
+
+def check_variety(raw_json: str, history: HistoryIndex | None = None) -> list[Duplicate]:
+    """Log and count the near-duplicate meals of a plan."""
+    with span("variety"):
+        duplicates = find_duplicates(_plan_data(raw_json).get("weekly_plan"), history)
+    for scope in ("plan", "history"):
+        found = [d for d in duplicates if (d.other_week is None) == (scope == "plan")]
+        if found:
+            VARIETY_DUPLICATES.labels(scope).inc(len(found))
+    if duplicates:
+        log_event(
+            "repeated_meals",
+            level=logging.WARNING,
+            meals=[f"{d.title} ~ {d.other_title} ({d.similarity})" for d in duplicates],
+        )
+    return duplicates
 
 
 def format_weekly_plan(weekly_plan: Dict[str, Any]) -> str:
     """Format the weekly plan data into readable text."""
-    if not weekly_plan:
-        return "Piano settimanale non disponibile"
-    
-    days_map = {
-        "monday": "Lunedì",
-        "tuesday": "Martedì", 
-        "wednesday": "Mercoledì",
-        "thursday": "Giovedì",
-        "friday": "Venerdì",
-        "saturday": "Sabato",
-        "sunday": "Domenica"
-    }
-    
-    formatted_lines = []
-    
-    for day_en, day_it in days_map.items():
-        if day_en in weekly_plan:
-            day_data = weekly_plan[day_en]
-            formatted_lines.append(f"\n🗓️ **{day_it.upper()}**")
-            
-            if "lunch" in day_data:
-                lunch = day_data["lunch"]
-                formatted_lines.append(f"🥗 **Pranzo:** {lunch.get('title', 'N/A')}")
-                formatted_lines.append(f"   📝 {lunch.get('description', 'N/A')}")
-                formatted_lines.append(f"   🎯 {lunch.get('focus', 'N/A')} • {lunch.get('servings', 2)} porzioni")
-            
-            if "dinner" in day_data:
-                dinner = day_data["dinner"]
-                formatted_lines.append(f"🍽️ **Cena:** {dinner.get('title', 'N/A')}")
-                formatted_lines.append(f"   📝 {dinner.get('description', 'N/A')}")
-                formatted_lines.append(f"   🎯 {dinner.get('focus', 'N/A')} • {dinner.get('servings', 3)} porzioni")
-    
-    return "\n".join(formatted_lines)
+    return render_weekly_plan(weekly_plan)
 
 
 def format_shopping_list(shopping_list: Dict[str, List[str]]) -> str:
     """Format the shopping list data into readable HTML text."""
-    if not shopping_list:
-        return "<p class='text-muted'>Lista della spesa non disponibile</p>"
-    
-    categories_map = {
-        "vegetables_fruits": {"name": "VERDURA E FRUTTA", "icon": "🥬", "color": "#28a745"},
-        "meat_fish_eggs": {"name": "CARNE, PESCE E UOVA", "icon": "🥩", "color": "#dc3545"}, 
-        "dairy_cheese": {"name": "FORMAGGI E LATTICINI", "icon": "🧀", "color": "#ffc107"},
-        "grains_legumes": {"name": "CEREALI E LEGUMI", "icon": "🌾", "color": "#fd7e14"},
-        "pantry_condiments": {"name": "DISPENSA E CONDIMENTI", "icon": "🫙", "color": "#6f42c1"}
-    }
-    
-    formatted_sections = []
-    
-    for category, items in shopping_list.items():
-        if category in categories_map and items:
-            cat_info = categories_map[category]
-            
-            # Crea la sezione HTML senza spazi extra
-            section_html = f"""<div class="shopping-category mb-4">
-                <h6 class="category-header" style="color: {cat_info['color']};">
-                    <span class="category-icon">{cat_info['icon']}</span>
-                    {cat_info['name']}
-                    <span class="badge bg-light text-dark ms-2">{len(items)}</span>
-                </h6>
-                <div class="category-items">"""
-            
-            for item in items:
-                section_html += f"""
-                    <div class="shopping-item">
-                        <span class="item-bullet" style="color: {cat_info['color']};">•</span>
-                        <span class="item-text">{item}</span>
-                    </div>"""
-            
-            section_html += """
-                </div>
-            </div>"""
-            
-            formatted_sections.append(section_html)
-    
-    return "".join(formatted_sections)
+    return render_shopping_list(shopping_list)
 
 
 def send_email(to_address: str, subject: str, body: str) -> None:
@@ -445,11 +707,12 @@ def send_email(to_address: str, subject: str, body: str) -> None:
 
     context = ssl.create_default_context()
     try:
-        with smtplib.SMTP(mail_server, mail_port) as server:
-            if mail_use_tls:
-                server.starttls(context=context)
-            if mail_username and mail_password:
-                server.login(mail_username, mail_password)
-            server.sendmail(message["From"], [to_address], message.as_string())
+        with span("email_send", server=mail_server):
+            with smtplib.SMTP(mail_server, mail_port) as server:
+                if mail_use_tls:
+                    server.starttls(context=context)
+                if mail_username and mail_password:
+                    server.login(mail_username, mail_password)
+                server.sendmail(message["From"], [to_address], message.as_string())
     except Exception as exc:
-        print(f"Failed to send email: {exc}")
+        log_event("email_failed", level=logging.ERROR, server=mail_server, error=str(exc))
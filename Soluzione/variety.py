@@ -0,0 +1,187 @@
+"""
+Near-duplicate meals within a plan and against the user's recent weeks.
+
+``prompt.txt`` asks for variety, yet plans often repeat the same dish on
+different days ("Pollo al limone" and "Petto di pollo al limone") or bring
+back last week's meals. Meals are embedded locally with a hashing
+vectorizer: the stems of the words of their title (counted twice) and
+description, plus adjacent stem pairs, are hashed with signed CRC32 into
+``DIM`` buckets and L2-normalized, so cosine similarity is a dot product.
+No model file is needed and a week of meals embeds in about a
+millisecond.
+
+``history_index`` embeds the meals of a user's plans of the last
+``HISTORY_WEEKS`` weeks. Its ``exclusions`` (recent titles, one per group of
+near-duplicates) are put in the next generation prompt, and
+``find_duplicates`` reports the meals of a new plan whose similarity with
+another meal of the same plan or of the history reaches ``THRESHOLD``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+
+from models import Plan
+from seasonality import normalize
+
+DIM = 1 << 12
+HISTORY_WEEKS = int(os.environ.get("VARIETY_HISTORY_WEEKS", 4))
+THRESHOLD = float(os.environ.get("VARIETY_THRESHOLD", 0.6))
+# At most this many recent titles are put in the prompt.
+MAX_EXCLUSIONS = 40
+
+_STOPWORDS = frozenset(
+    "al alla alle allo agli ai all con da dal dalla dei del della delle di e ed in "
+    "il la le lo gli i un una uno per su sul sulla tra fra".split()
+)
+
+
+def _stems(text: str) -> list[str]:
+    words = normalize(text or "").replace("'", " ").split()
+    # Dropping the final vowel folds singular and plural forms together.
+    return [w[:-1] if len(w) > 3 and w[-1] in "aeio" else w for w in words if w not in _STOPWORDS and len(w) > 1]
+
+
+def _features(meal: dict) -> list[str]:
+    title = _stems(str(meal.get("title") or ""))
+    stems = title * 2 + _stems(str(meal.get("description") or ""))
+    return stems + [f"{a} {b}" for a, b in zip(title, title[1:])]
+
+
+def embed(meals: Iterable[dict]) -> np.ndarray:
+    """Return the L2-normalized ``len(meals) x DIM`` embeddings of ``meals``."""
+    rows, cols, signs = [], [], []
+    count = 0
+    for count, meal in enumerate(meals, 1):
+        for feature in _features(meal):
+            h = zlib.crc32(feature.encode("utf-8"))
+            rows.append(count - 1)
+            cols.append(h % DIM)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+    vectors = np.zeros((count, DIM), dtype=np.float32)
+    np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), signs)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def plan_meals(weekly_plan: dict) -> list[tuple[tuple[str, str], dict]]:
+    """Return the ``((day, meal type), meal)`` pairs of ``weekly_plan``."""
+    return [
+        ((day, meal_type), meal)
+        for day, meals in (weekly_plan or {}).items()
+        if isinstance(meals, dict)
+        for meal_type, meal in meals.items()
+        if isinstance(meal, dict) and meal.get("title")
+    ]
+
+
+@dataclass
+class HistoryIndex:
+    """Embedded meals of a user's recent plans, newest first."""
+
+    titles: list[str] = field(default_factory=list)
+    weeks: list[date] = field(default_factory=list)
+    vectors: np.ndarray = field(default_factory=lambda: np.zeros((0, DIM), dtype=np.float32))
+
+    @classmethod
+    def from_plans(cls, plans: Iterable[Plan]) -> HistoryIndex:
+        titles, weeks, meals = [], [], []
+        for plan in sorted(plans, key=lambda p: p.start_date, reverse=True):
+            try:
+                weekly_plan = json.loads(plan.json_content or "{}").get("weekly_plan")
+            except (json.JSONDecodeError, AttributeError):
+                continue
+            for _, meal in plan_meals(weekly_plan if isinstance(weekly_plan, dict) else {}):
+                titles.append(str(meal["title"]))
+                weeks.append(plan.start_date)
+                meals.append(meal)
+        return cls(titles, weeks, embed(meals))
+
+    def exclusions(self, limit: int = MAX_EXCLUSIONS) -> list[str]:
+        """Return recent titles, skipping those too similar to one already listed."""
+        kept: list[int] = []
+        for i in range(len(self.titles)):
+            if len(kept) == limit:
+                break
+            if not kept or float((self.vectors[kept] @ self.vectors[i]).max()) < THRESHOLD:
+                kept.append(i)
+        return [self.titles[i] for i in kept]
+
+
+def history_indexes(user_ids: Iterable[int], before: date, weeks: int = HISTORY_WEEKS) -> dict[int, HistoryIndex]:
+    """Return the history of each user's plans in the ``weeks`` before ``before``, in one query."""
+    user_ids = list(user_ids)
+    plans: dict[int, list[Plan]] = {user_id: [] for user_id in user_ids}
+    if user_ids and weeks > 0:
+        for plan in Plan.query.filter(
+            Plan.user_id.in_(user_ids),
+            Plan.start_date >= before - timedelta(weeks=weeks),
+            Plan.start_date < before,
+        ):
+            plans[plan.user_id].append(plan)
+    return {user_id: HistoryIndex.from_plans(rows) for user_id, rows in plans.items()}
+
+
+def history_index(user_id: int, before: date, weeks: int = HISTORY_WEEKS) -> HistoryIndex:
+    """Return the history of one user (see ``history_indexes``)."""
+    return history_indexes([user_id], before, weeks)[user_id]
+
+
+@dataclass(frozen=True)
+class Duplicate:
+    """A meal of a new plan too similar to another meal."""
+
+    slot: tuple[str, str]
+    title: str
+    # The similar meal: a slot of the same plan or the Monday of a past week.
+    other_slot: tuple[str, str] | None
+    other_week: date | None
+    other_title: str
+    similarity: float
+
+
+def find_duplicates(
+    weekly_plan: dict, history: HistoryIndex | None = None, threshold: float = THRESHOLD
+) -> list[Duplicate]:
+    """Return the near-duplicate meals of ``weekly_plan``.
+
+    Each pair within the plan is reported once, on its later meal; each meal
+    is reported at most once against the history, for its closest match.
+    """
+    meals = plan_meals(weekly_plan)
+    if not meals:
+        return []
+    vectors = embed(meal for _, meal in meals)
+    duplicates = []
+    similarity = np.triu(vectors @ vectors.T, k=1)
+    for i, j in zip(*np.nonzero(similarity >= threshold)):
+        (slot, meal), (other_slot, other) = meals[j], meals[i]
+        duplicates.append(
+            Duplicate(slot, meal["title"], other_slot, None, other["title"], round(float(similarity[i, j]), 3))
+        )
+    if history is not None and history.titles:
+        scores = vectors @ history.vectors.T
+        best = scores.argmax(axis=1)
+        for (slot, meal), index, row in zip(meals, best, scores):
+            if row[index] >= threshold:
+                duplicates.append(
+                    Duplicate(
+                        slot, meal["title"], None, history.weeks[index], history.titles[index], round(float(row[index]), 3)
+                    )
+                )
+    return duplicates
+
+
+def prompt_section(history: HistoryIndex | None) -> str:
+    """Return the recent-meals lines for the prompt, or "" without history."""
+    titles = history.exclusions() if history is not None else []
+    if not titles:
+        return ""
+    return f"PIATTI GIÀ PROPOSTI NELLE ULTIME SETTIMANE (da non ripetere, nemmeno con piccole varianti):\n{', '.join(titles)}\n\n"